@@ -2,6 +2,7 @@
 Configuration file for Resource Monitoring job
 """
 from lib.utils.env_data import get_env_var
+from config.jobs.monitor_resources.kinds import RESOURCE_KINDS
 
 
 def get_env_namespace():
@@ -28,10 +29,86 @@ def get_env_namespace():
     return 'Invalid namespace entered'
 
 
+def get_collection_settings():
+    """
+    Reads the optional parallel collection settings from the environment.
+
+    Returns:
+        tuple: Number of concurrent API calls (1 means serial collection) and per-call timeout in seconds.
+    """
+    workers = get_env_var('RESMON_WORKERS') or ResMonConfig.COLLECT_WORKERS
+    timeout = get_env_var('RESMON_CALL_TIMEOUT') or ResMonConfig.CALL_TIMEOUT
+    return int(workers), float(timeout)
+
+
+def get_sampling_settings():
+    """
+    Reads the optional usage sampling window from the environment.
+
+    Returns:
+        tuple: Sampling duration in seconds (0 disables sampling) and interval in seconds.
+    """
+    duration = get_env_var('RESMON_SAMPLE_DURATION') or 0
+    interval = get_env_var('RESMON_SAMPLE_INTERVAL') or ResMonConfig.SAMPLE_INTERVAL
+    return float(duration), float(interval)
+
+
+def get_targets():
+    """
+    Parses the multi-cluster targets from the RESMON_TARGETS environment variable,
+    a comma separated list of 'context:namespace:profile' entries where profile is
+    the baseline namespace profile (cm or evnfm).
+
+    Returns:
+        list: Target dictionaries with context, namespace and profile keys, empty when not set.
+    """
+    targets = get_env_var('RESMON_TARGETS')
+    if not targets:
+        return []
+
+    parsed = []
+    for entry in [target.strip() for target in targets.split(',') if target.strip()]:
+        # Contexts may contain ':' (e.g. EKS ARNs), so split namespace and profile from the right
+        context, namespace, profile = [part.strip() for part in entry.rsplit(':', 2)]
+        parsed.append({'context': context, 'namespace': namespace, 'profile': profile})
+    return parsed
+
+
 class ResMonConfig:
     """Configuration class for resource monitoring."""
-    RESOURCE_TYPES = ['deployments', 'statefulsets', 'cronjobs', 'daemonsets', 'pvc']
+    # Collected and compared kinds, declared in kinds.py
+    RESOURCE_KINDS = RESOURCE_KINDS
+    RESOURCE_TYPES = list(RESOURCE_KINDS)
     DIFF_TABLE_HEADERS = ['RESOURCE_TYPE', 'NAMESPACE', 'RESOURCE_NAME', 'IN_BASELINE']
     DIFFERING_DETAILS = 'differing_resource_details.xlsx'
     BASELINE_FILE = 'config/jobs/monitor_resources/eo_resources_details_baseline.json'
+    # Compiled baseline copies keyed by the baseline file hash, None disables caching
+    BASELINE_CACHE_DIR = get_env_var('RESMON_CACHE_DIR') or '.resmon_cache'
+    # Allowed relative deviation from the baseline per resource, e.g. 0.05 accepts 5 %
+    TOLERANCES = {'cpu': 0.0, 'memory': 0.0, 'ephemeral-storage': 0.0, 'storage': 0.0}
     RESOURCE_DIFF_FILE = 'resource_differences.txt'
+    # Parallel collection: 1 keeps the serial namespace x resource type walk
+    COLLECT_WORKERS = 1
+    CALL_TIMEOUT = 300
+    SLOW_CALL_THRESHOLD = 10
+    # Items requested per list call, and optional server side label selector
+    PAGE_SIZE = 250
+    LABEL_SELECTOR = get_env_var('RESMON_LABEL_SELECTOR')
+    # Processes used to collect multi-cluster targets concurrently
+    TARGET_WORKERS = int(get_env_var('RESMON_TARGET_WORKERS') or 4)
+    FLEET_RESOURCES_FILE = 'Fleet_Resources.xlsx'
+    # Usage sampling through metrics.k8s.io: default interval and series limit of the sample buffer
+    SAMPLE_INTERVAL = 15
+    SAMPLE_MAX_SERIES = 4096
+    # Report backend: xlsx, csv, jsonl, parquet or pandas
+    REPORT_FORMAT = get_env_var('REPORT_FORMAT') or 'xlsx'
+    # SQLite run store enabling incremental comparison and the drift trend, None keeps full comparisons
+    RUN_STORE = get_env_var('RESMON_RUN_STORE')
+    RUN_LABEL = get_env_var('RESMON_RUN_LABEL') or ''
+    # Runs kept in the run store, older runs are deleted when a run is recorded
+    RUN_KEEP = int(get_env_var('RESMON_RUN_KEEP') or 100)
+    DRIFT_REPORT = 'Resource_Drift.xlsx'
+    # Requests and limits x replicas per workload, namespace and cluster against node allocatable
+    CAPACITY_REPORT = 'Resource_Capacity.xlsx'
+    # <namespace>/<kind>/<name> whose change history resource_drift_trend prints
+    DRIFT_RESOURCE = get_env_var('RESMON_DRIFT_RESOURCE')
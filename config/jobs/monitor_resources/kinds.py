@@ -0,0 +1,50 @@
+"""
+Resource kinds compared against the baseline
+
+Each kind declares how its collected rows are matched with the baseline and which
+columns are compared. Adding a kind, including a custom resource, only needs an
+entry in RESOURCE_KINDS:
+
+    label:      resource type reported for deployed objects missing from the baseline
+    api:        group, version and plural of a custom resource, listed through the
+                custom objects API; built-in kinds are listed by their key
+    columns:    row column -> dotted path into a custom object
+    key_column: row column matched with the keys of key_path, e.g. container names
+    key_path:   baseline mapping under a resource whose keys are matched with key_column
+    groups:     compared fields, reported together per group:
+                path    baseline mapping of the group, below the key when the kind has one
+                scalar  report single values instead of per field mappings
+                fields  column of the row, name in the baseline, quantity used for numeric
+                        comparison (None compares strings) and optional fields that are
+                        only compared when the baseline sets them
+"""
+# Container resources reported and compared, and their column label
+RESOURCE_NAMES = {'cpu': 'CPU', 'memory': 'Memory', 'ephemeral-storage': 'Ephemeral-storage'}
+
+CONTAINER_GROUPS = {
+    limit_type: {
+        'path': limit_type,
+        'fields': [
+            {'column': f'{label} {limit_type.capitalize()}', 'name': resource, 'quantity': resource,
+             'optional': resource == 'ephemeral-storage'}
+            for resource, label in RESOURCE_NAMES.items()
+        ],
+    }
+    for limit_type in ('limits', 'requests')
+}
+
+WORKLOAD = {'key_column': 'Container Name', 'key_path': 'data', 'groups': CONTAINER_GROUPS}
+
+RESOURCE_KINDS = {
+    'deployments': {**WORKLOAD, 'label': 'deployments'},
+    'statefulsets': {**WORKLOAD, 'label': 'statefulsets'},
+    'cronjobs': {**WORKLOAD, 'label': 'cronjobs'},
+    'daemonsets': {**WORKLOAD, 'label': 'daemonsets'},
+    'pvc': {
+        'label': 'PersistentVolumeClaim',
+        'groups': {
+            'Capacity': {'path': '', 'scalar': True,
+                         'fields': [{'column': 'Capacity', 'name': 'capacity', 'quantity': 'storage'}]},
+        },
+    },
+}
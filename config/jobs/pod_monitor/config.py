@@ -3,6 +3,29 @@ Configuration file for Pod Monitoring job
 """
 
 
+from lib.utils.env_data import get_env_var
+
+
 class PodMonConfig:
     # prefix for pod data file
     file_prefix = "pod_data"
+    # items requested per list call
+    page_size = 250
+    # optional selectors evaluated by the API server
+    label_selector = get_env_var('POD_LABEL_SELECTOR')
+    field_selector = get_env_var('POD_FIELD_SELECTOR')
+    # fail the job on pods recreated under a new name, they are only reported by default
+    fail_on_recreated = (get_env_var('POD_FAIL_ON_RECREATED') or '').lower() in ('1', 'true', 'yes')
+    # watch mode: prefix for the timeline file, default duration in seconds and flush policy
+    timeline_prefix = "pod_timeline"
+    watch_duration = 3600
+    flush_every = 50
+    flush_interval = 30
+    # soak mode: seconds between appended snapshots
+    snapshot_interval = 60
+    # restarts: prefix for the events and previous logs file, lines and bytes per log, concurrent reads
+    context_prefix = "restart_context"
+    log_tail_lines = 200
+    log_limit_bytes = 64 * 1024
+    log_workers = 8
+    log_timeout = 30
@@ -2,7 +2,10 @@
 Start module
 """
 import argparse
-from lib.jobs import JOBS
+import os
+import sys
+import time
+from src.jobs.registry import STARTUP_BUDGET, job_names, load_job
 
 
 def main():
@@ -11,12 +14,39 @@ def main():
     """
     parser = argparse.ArgumentParser(description='Python CLI option parser')
     parser.add_argument('job', type=str, help='Option to execute a function')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Print an import time breakdown of the job start-up')
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET,
+                        help='Start-up time budget in seconds used with --profile-startup')
 
     args = parser.parse_args()
-    func = JOBS.get(args.job)
+    started = time.time()
+    # The optional helpers are imported only when configured, so they are not part of every start-up
+    # pylint: disable=import-outside-toplevel
+    if os.getenv('LOG_JSON_FILE'):
+        from src.utils.log_payload import enable_json_lines_log
+        enable_json_lines_log()
+    metrics = os.getenv('METRICS_TEXTFILE') or os.getenv('METRICS_JSON')
+    if metrics:
+        from src.utils.instrumentation import enable_instrumentation
+        enable_instrumentation()
+    if args.profile_startup:
+        from src.utils.startup_profile import ImportProfiler
+        with ImportProfiler() as profiler:
+            func = load_job(args.job)
+        print(profiler.report(budget=args.startup_budget))
+        if not profiler.within(args.startup_budget):
+            sys.exit(1)
+    else:
+        func = load_job(args.job)
 
-    if args.job in JOBS:
-        func()
+    if func:
+        try:
+            func()
+        finally:
+            if metrics:
+                from src.utils.instrumentation import export_metrics
+                export_metrics(args.job, started)
     else:
         helper()
         list_jobs()
@@ -28,7 +58,7 @@ def helper():
     """
     print("---------------------------------------------")
     print("Automation script for non functional tests")
-    print("Usage: python main.py 'job_name'")
+    print("Usage: python main.py 'job_name' [--profile-startup]")
     print("")
     print("---------------------------------------------")
 
@@ -38,7 +68,7 @@ def list_jobs():
     List all available operations
     """
     print("Available jobs:")
-    for job in JOBS:
+    for job in job_names():
         print(job)
 
 
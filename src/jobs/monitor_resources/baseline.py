@@ -0,0 +1,272 @@
+"""
+Compile the resource baseline into a normalized index and compare deployed rows against it
+
+The compared fields of every kind are declared in config/jobs/monitor_resources/kinds.py.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+from config.jobs.monitor_resources.kinds import RESOURCE_KINDS
+from src.utils.k8s_resources import NOT_SPECIFIED
+from src.utils.quantity import canonical, within_tolerance
+
+# Bump when the compiled layout changes so stale cache files are ignored
+COMPILED_VERSION = 2
+# Baseline fields that are not set differ from any deployed value, also from 'Not specified'
+MISSING = (None, None)
+FILLED = (NOT_SPECIFIED, None)
+
+
+class Field:
+    """A compared column of a kind."""
+    __slots__ = ('column', 'name', 'quantity', 'optional')
+
+    def __init__(self, column, name, quantity=None, optional=False):
+        self.column = column
+        self.name = name
+        self.quantity = quantity
+        self.optional = optional
+
+
+class Group:
+    """Fields of a kind reported together, e.g. the limits of a container."""
+    __slots__ = ('name', 'path', 'scalar', 'fields')
+
+    def __init__(self, name, path='', scalar=False, fields=()):
+        self.name = name
+        self.path = [part for part in path.split('.') if part]
+        self.scalar = scalar
+        self.fields = [Field(**field) for field in fields]
+
+
+class KindSchema:
+    """Row matching and comparison rules of a resource kind, see RESOURCE_KINDS."""
+
+    def __init__(self, name, label=None, key_column=None, key_path='', groups=None, **_):
+        self.name = name
+        self.label = label or name
+        self.key_column = key_column
+        self.key_path = [part for part in key_path.split('.') if part]
+        self.groups = [Group(group_name, **group) for group_name, group in (groups or {}).items()]
+
+    def row_key(self, row):
+        """Return the (name, key) a deployed row is matched on."""
+        return row.get('Name', ''), row.get(self.key_column, '') if self.key_column else ''
+
+    def baseline_entries(self, details):
+        """
+        Yield the compared values of a baseline resource
+        :param details: baseline entry of a resource
+        :type details: dict
+        :return: generator over (key, {column: (raw value, canonical value)})
+        :rtype: generator
+        """
+        if self.key_column:
+            keyed = _lookup(details, self.key_path)
+            # Some categories list member names instead of per key details
+            entries = keyed.items() if isinstance(keyed, dict) else []
+        else:
+            entries = [('', details)]
+        for key, entry in entries:
+            values = {}
+            for group in self.groups:
+                mapping = _lookup(entry, group.path)
+                if not isinstance(mapping, dict):
+                    continue
+                for field in group.fields:
+                    if field.name in mapping:
+                        raw = mapping[field.name]
+                        values[field.column] = (raw, canonical(field.quantity, raw) if field.quantity else None)
+            yield key, values
+
+
+def _lookup(mapping, path):
+    for part in path:
+        if not isinstance(mapping, dict):
+            return None
+        mapping = mapping.get(part)
+    return mapping
+
+
+def kind_schemas(kinds=None):
+    """
+    Build the schemas of the declared kinds
+    :param kinds: name -> declaration, defaults to RESOURCE_KINDS
+    :type kinds: dict
+    :return: name -> KindSchema
+    :rtype: dict
+    """
+    return {name: KindSchema(name, **declaration) for name, declaration in (kinds or RESOURCE_KINDS).items()}
+
+
+class CompiledBaseline:
+    """
+    Baseline indexed for merged comparison
+
+    resources: (category, namespace, resource) -> {'replica_count': str}
+    entries: (category, namespace) -> list of ((resource, key), {column: (raw value, canonical int or None)})
+             sorted by (resource, key); key is e.g. the container name, '' for kinds without keys
+    """
+
+    def __init__(self, categories, resources, entries):
+        self.categories = categories
+        self.resources = resources
+        self.entries = entries
+
+    @classmethod
+    def compile(cls, baseline, kinds=None):
+        """
+        Build the index from the raw baseline dictionary
+        :param baseline: category -> namespace -> resource -> details
+        :type baseline: dict
+        :param kinds: name -> declaration, defaults to RESOURCE_KINDS
+        :type kinds: dict
+        :return:
+        :rtype: CompiledBaseline
+        """
+        schemas = kind_schemas(kinds)
+        resources = {}
+        entries = {}
+        for category, namespaces in baseline.items():
+            schema = schemas.get(category) or KindSchema(category)
+            for namespace, items in namespaces.items():
+                compiled = []
+                for name, details in items.items():
+                    resources[(category, namespace, name)] = {'replica_count': details.get('replica_count', '')}
+                    compiled.extend(((name, key), values) for key, values in schema.baseline_entries(details))
+                compiled.sort(key=lambda entry: entry[0])
+                entries[(category, namespace)] = compiled
+        return cls(list(baseline), resources, entries)
+
+    def contains(self, category, namespace, name):
+        """True if the resource is present in the baseline."""
+        return (category, namespace, name) in self.resources
+
+
+def baseline_digest(content):
+    """
+    Return the digest of a baseline file content together with the kind declarations,
+    which decide what is compiled and compared
+    :param content: baseline JSON file content
+    :type content: bytes
+    :return:
+    :rtype: str
+    """
+    return hashlib.sha256(content + json.dumps(RESOURCE_KINDS, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_compiled_baseline(filename, cache_dir=None):
+    """
+    Load the baseline, reusing a compiled copy cached on disk under the file's content hash
+    :param filename: baseline JSON file
+    :type filename: str
+    :param cache_dir: directory for compiled copies, None disables caching
+    :type cache_dir: str
+    :return:
+    :rtype: CompiledBaseline
+    """
+    with open(filename, 'rb') as file:
+        content = file.read()
+    digest = baseline_digest(content)
+
+    cache_file = os.path.join(cache_dir, f'baseline_{COMPILED_VERSION}_{digest}.pickle') if cache_dir else None
+    if cache_file and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as file:
+                return CompiledBaseline(**pickle.load(file))
+        except (OSError, pickle.UnpicklingError, TypeError, EOFError) as err:
+            logging.warning("Ignoring unreadable compiled baseline %s: %s", cache_file, err)
+
+    compiled = CompiledBaseline.compile(json.loads(content))
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'wb') as file:
+            pickle.dump(vars(compiled), file, protocol=pickle.HIGHEST_PROTOCOL)
+    return compiled
+
+
+def _values_differ(quantity, deployed, baseline, tolerances):
+    """Compare numerically when both sides are quantities, otherwise as strings."""
+    raw, baseline_value = baseline
+    deployed_value = canonical(quantity, deployed) if quantity else None
+    if deployed_value is None or baseline_value is None:
+        return deployed != raw
+    return not within_tolerance(deployed_value, baseline_value, tolerances.get(quantity, 0.0))
+
+
+def _compare_group(group, row, approved, tolerances):
+    """
+    Return the deployed and baseline values of a group when any field differs, else None
+
+    A field the baseline does not set differs from the deployed value and is left out of
+    the reported baseline values, unless the baseline sets an optional field of the group:
+    then the fields it does not set are 'Not specified'.
+    """
+    # Optional fields are only compared when the baseline sets them
+    fields = [field for field in group.fields if not field.optional or field.column in approved]
+    missing = FILLED if any(field.optional for field in fields) else MISSING
+    if not any(_values_differ(field.quantity, row.get(field.column, NOT_SPECIFIED),
+                              approved.get(field.column, missing), tolerances) for field in fields):
+        return None
+    if group.scalar:
+        return {'deployed': row.get(fields[0].column, NOT_SPECIFIED),
+                'baseline': approved.get(fields[0].column, missing)[0]}
+    return {'deployed': {field.name: row.get(field.column, NOT_SPECIFIED) for field in fields},
+            'baseline': {field.name: approved.get(field.column, missing)[0] for field in fields
+                         if field.column in approved or missing is FILLED}}
+
+
+def compare_rows(deployed, baseline, category, namespace, tolerances, schemas=None):
+    """
+    Compare deployed resource rows with the compiled baseline of a namespace,
+    merging both sides sorted by (resource, key) in a single pass
+    :param deployed: rows as returned by the resource collection
+    :type deployed: list
+    :param baseline:
+    :type baseline: CompiledBaseline
+    :param category: resource kind, e.g. deployments or pvc
+    :type category: str
+    :param namespace: baseline namespace profile, e.g. cm or evnfm
+    :type namespace: str
+    :param tolerances: allowed relative deviation per quantity
+    :type tolerances: dict
+    :param schemas: name -> KindSchema, defaults to the declared kinds
+    :type schemas: dict
+    :return: differences and resources not in the baseline;
+             differences are resource -> key -> group -> values for keyed kinds
+             and resource -> group -> values otherwise
+    :rtype: tuple
+    """
+    schema = (schemas or _SCHEMAS).get(category) or KindSchema(category)
+    entries = baseline.entries.get((category, namespace), [])
+    differences = {}
+    not_in_baseline = {}
+
+    position = 0
+    for row in sorted(deployed, key=schema.row_key):
+        name, key = schema.row_key(row)
+        if not baseline.contains(category, namespace, name):
+            not_in_baseline[name] = {'type': schema.label, 'namespace': row.get('Namespace', 'default'),
+                                     'details': row}
+            continue
+
+        while position < len(entries) and entries[position][0] < (name, key):
+            position += 1
+        matched = position < len(entries) and entries[position][0] == (name, key)
+        approved = entries[position][1] if matched else {}
+
+        for group in schema.groups:
+            diff = _compare_group(group, row, approved, tolerances)
+            if diff is not None:
+                target = differences.setdefault(name, {})
+                if schema.key_column:
+                    target = target.setdefault(key, {})
+                target[group.name] = diff
+
+    return differences, not_in_baseline
+
+
+_SCHEMAS = kind_schemas()
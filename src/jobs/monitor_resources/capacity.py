@@ -0,0 +1,221 @@
+"""
+Roll container requests and limits up to workload, namespace and cluster totals
+
+Values are parsed once per container; multiplication by replicas and the sums per
+workload and namespace are done on numpy arrays.
+"""
+import logging
+
+import numpy as np
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from config.jobs.monitor_resources.kinds import RESOURCE_KINDS, RESOURCE_NAMES
+from src.utils.k8s_pager import paginate_pages, raw_list_func
+from src.utils.quantity import canonical
+
+# One column per resource and limit type, in this order
+COLUMNS = [(resource, limit_type) for limit_type in ('Requests', 'Limits') for resource in RESOURCE_NAMES]
+UNITS = {'cpu': ('m', 1), 'memory': ('Mi', 2 ** 20), 'ephemeral-storage': ('Mi', 2 ** 20)}
+# Kinds whose rows are containers of a pod template
+WORKLOAD_KINDS = [kind for kind, declaration in RESOURCE_KINDS.items()
+                  if declaration.get('key_column') == 'Container Name']
+
+
+def replica_count(kind, replicas, nodes):
+    """
+    Return the number of pods a workload runs
+    :param kind: deployments, statefulsets, daemonsets or cronjobs
+    :type kind: str
+    :param replicas: declared replicas, empty for kinds without
+    :type replicas: str
+    :param nodes: schedulable nodes, the pods of a daemonset; None when unknown, counted as one pod
+    :type nodes: int
+    :return:
+    :rtype: int
+    """
+    if replicas not in ('', None):
+        return int(replicas)
+    # One pod per node for daemonsets, one running job assumed for cronjobs
+    return nodes if kind == 'daemonsets' and nodes is not None else 1
+
+
+def _label(resource, limit_type):
+    unit = UNITS[resource][0]
+    return f"{RESOURCE_NAMES[resource]} {limit_type} ({unit})"
+
+
+LABELS = [_label(resource, limit_type) for resource, limit_type in COLUMNS]
+SCALES = np.array([UNITS[resource][1] for resource, _ in COLUMNS], dtype=float)
+# Report columns of the workload and namespace sheets
+WORKLOAD_COLUMNS = ['Namespace', 'Resource Type', 'Resource Name', 'Replicas', *LABELS, 'Note']
+NAMESPACE_COLUMNS = ['Namespace', 'Profile',
+                     *(column for label in LABELS for column in (label, f'{label} Baseline', f'{label} Delta'))]
+
+
+class Totals:
+    """Per workload totals (requests and limits x replicas) of a set of containers."""
+
+    def __init__(self, containers, nodes):
+        """
+        :param containers: (workload key, kind, replicas, values in COLUMNS order) per container,
+                           the workload key starting with the namespace
+        :type containers: iterable
+        :param nodes: schedulable nodes, used for daemonsets; None when unknown
+        :type nodes: int
+        """
+        index = {}
+        positions = []
+        values = []
+        replicas = []
+        # Workloads whose replicas are a guess: daemonsets counted as one pod while the nodes are unknown
+        self.estimated = set()
+        for key, kind, count, row in containers:
+            if key not in index:
+                index[key] = len(index)
+                replicas.append(replica_count(kind, count, nodes))
+                if nodes is None and kind == 'daemonsets' and count in ('', None):
+                    self.estimated.add(key)
+            positions.append(index[key])
+            values.append(row)
+        self.keys = list(index)
+        self.replicas = np.array(replicas, dtype=float)
+        per_container = np.array(values, dtype=float).reshape(-1, len(COLUMNS))
+        self.workloads = np.zeros((len(index), len(COLUMNS)))
+        np.add.at(self.workloads, np.array(positions, dtype=int), per_container)
+        self.workloads *= self.replicas[:, None]
+
+    def by_namespace(self):
+        """
+        Sum the workload totals per namespace
+        :return: namespace -> array of totals in COLUMNS order
+        :rtype: dict
+        """
+        namespaces = sorted({key[0] for key in self.keys})
+        position = {namespace: number for number, namespace in enumerate(namespaces)}
+        sums = np.zeros((len(namespaces), len(COLUMNS)))
+        np.add.at(sums, np.array([position[key[0]] for key in self.keys], dtype=int), self.workloads)
+        return dict(zip(namespaces, sums))
+
+    def total(self):
+        """Return the totals of all workloads in COLUMNS order."""
+        return self.workloads.sum(axis=0)
+
+
+def _values(lookup):
+    return [canonical(resource, lookup(f"{RESOURCE_NAMES[resource]} {limit_type}")) or 0
+            for resource, limit_type in COLUMNS]
+
+
+def deployed_totals(resources, nodes):
+    """
+    Roll up collected resource rows
+    :param resources: namespace -> kind -> rows
+    :type resources: dict
+    :param nodes: schedulable nodes
+    :type nodes: int
+    :return:
+    :rtype: Totals
+    """
+    containers = (((namespace, kind, row['Name']), kind, row.get('Replicas'), _values(row.get))
+                  for namespace, kinds in resources.items()
+                  for kind in WORKLOAD_KINDS
+                  for row in kinds.get(kind, []))
+    return Totals(containers, nodes)
+
+
+def baseline_totals(baseline, namespace_map, nodes):
+    """
+    Roll up the approved values and replica_count of the baseline profile of each namespace
+    :param baseline:
+    :type baseline: CompiledBaseline
+    :param namespace_map: namespace -> baseline profile
+    :type namespace_map: dict
+    :param nodes: schedulable nodes
+    :type nodes: int
+    :return:
+    :rtype: Totals
+    """
+    def containers():
+        for namespace, profile in namespace_map.items():
+            for kind in WORKLOAD_KINDS:
+                for (name, _), values in baseline.entries.get((kind, profile), []):
+                    replicas = baseline.resources.get((kind, profile, name), {}).get('replica_count', '')
+                    yield ((namespace, kind, name), kind, replicas,
+                           _values(lambda column, approved=values: approved.get(column, (None, None))[0]))
+    return Totals(containers(), nodes)
+
+
+def node_allocatable():
+    """
+    Return the number of schedulable nodes and their summed allocatable cpu, memory and ephemeral storage
+    :return: nodes and an array in RESOURCE_NAMES order (millicores, bytes);
+             None and zeros when nodes cannot be listed
+    :rtype: tuple
+    """
+    nodes = 0
+    allocatable = np.zeros(len(RESOURCE_NAMES))
+    try:
+        for page in paginate_pages(raw_list_func(client.CoreV1Api().list_node)):
+            for node in page.items:
+                if (node.get('spec') or {}).get('unschedulable'):
+                    continue
+                nodes += 1
+                values = (node.get('status') or {}).get('allocatable') or {}
+                allocatable += [canonical(resource, values.get(resource)) or 0 for resource in RESOURCE_NAMES]
+    except ApiException as err:
+        # Listing nodes needs a cluster role; totals are still reported without headroom
+        logging.warning("Nodes not available (%s), headroom is not computed and daemonsets are counted as one pod",
+                        err.status)
+        return None, np.zeros(len(RESOURCE_NAMES))
+    return nodes, allocatable
+
+
+def _scaled(values):
+    return [round(float(value), 1) for value in np.asarray(values) / SCALES]
+
+
+def workload_rows(totals):
+    """Yield one row per workload with its replicas and totals, noting replicas that are estimated."""
+    for key, replicas, values in zip(totals.keys, totals.replicas, totals.workloads):
+        namespace, kind, name = key
+        yield {'Namespace': namespace, 'Resource Type': kind, 'Resource Name': name, 'Replicas': int(replicas),
+               **dict(zip(LABELS, _scaled(values))),
+               'Note': 'Nodes unknown, counted as one pod' if key in totals.estimated else ''}
+
+
+def namespace_rows(deployed, baseline, namespace_map):
+    """Yield one row per namespace with its deployed and baseline totals and their delta."""
+    deployed_sums = deployed.by_namespace()
+    baseline_sums = baseline.by_namespace()
+    empty = np.zeros(len(COLUMNS))
+    for namespace, profile in namespace_map.items():
+        actual = deployed_sums.get(namespace, empty)
+        approved = baseline_sums.get(namespace, empty)
+        row = {'Namespace': namespace, 'Profile': profile}
+        for label, value, approved_value, delta in zip(LABELS, _scaled(actual), _scaled(approved),
+                                                       _scaled(actual - approved)):
+            row[label] = value
+            row[f'{label} Baseline'] = approved_value
+            row[f'{label} Delta'] = delta
+        yield row
+
+
+def cluster_rows(deployed, nodes, allocatable):
+    """Yield one row per resource with the cluster totals, allocatable and headroom of the requests."""
+    total = deployed.total()
+    for position, resource in enumerate(RESOURCE_NAMES):
+        unit, scale = UNITS[resource]
+        requests = float(total[COLUMNS.index((resource, 'Requests'))])
+        limits = float(total[COLUMNS.index((resource, 'Limits'))])
+        available = float(allocatable[position])
+        yield {
+            'Resource': f"{RESOURCE_NAMES[resource]} ({unit})",
+            'Nodes': '' if nodes is None else nodes,
+            'Requests': round(requests / scale, 1),
+            'Limits': round(limits / scale, 1),
+            'Allocatable': round(available / scale, 1),
+            'Headroom': round((available - requests) / scale, 1),
+            'Headroom %': round(100 * (available - requests) / available, 1) if available else '',
+            'Limits / Allocatable %': round(100 * limits / available, 1) if available else '',
+        }
@@ -0,0 +1,282 @@
+"""
+Persistent run store and incremental comparison against the previous run
+
+Every run records a content hash of each collected resource. A later run with the
+same baseline only re-compares resources whose hash changed and reuses the stored
+findings of the others; the recorded hashes give the drift trend across runs.
+Only the latest runs are kept, older runs and their resource rows are deleted.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+
+from src.jobs.monitor_resources.baseline import baseline_digest, compare_rows
+
+ADDED = 'Added'
+CHANGED = 'Changed'
+REMOVED = 'Removed'
+# Runs kept in the store by default
+DEFAULT_KEEP_RUNS = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    label TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    resources INTEGER NOT NULL,
+    compared INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    changed INTEGER NOT NULL,
+    removed INTEGER NOT NULL,
+    differing INTEGER NOT NULL,
+    not_in_baseline INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    namespace TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    findings TEXT NOT NULL,
+    PRIMARY KEY (run_id, namespace, kind, name)
+);
+"""
+
+
+def resource_hash(rows):
+    """
+    Return the content hash of the rows of one resource
+    :param rows: resource detail rows, e.g. one per container
+    :type rows: list
+    :return:
+    :rtype: str
+    """
+    content = json.dumps(sorted(json.dumps(row, sort_keys=True, default=str) for row in rows))
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def run_fingerprint(baseline_file, tolerances):
+    """
+    Identify the baseline, kind declarations and tolerances findings are computed with
+    :param baseline_file:
+    :type baseline_file: str
+    :param tolerances:
+    :type tolerances: dict
+    :return:
+    :rtype: str
+    """
+    with open(baseline_file, 'rb') as file:
+        content = file.read()
+    return f"{baseline_digest(content)}:{json.dumps(tolerances, sort_keys=True)}"
+
+
+def rows_by_resource(rows):
+    """Group resource detail rows by resource name, keeping their order."""
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.get('Name', ''), []).append(row)
+    return grouped
+
+
+class RunStore:
+    """SQLite file with one row per run and one row per resource and run."""
+
+    def __init__(self, file_name, keep_runs=DEFAULT_KEEP_RUNS):
+        """
+        :param file_name:
+        :type file_name: str
+        :param keep_runs: latest runs kept when a run is recorded
+        :type keep_runs: int
+        """
+        self.file_name = file_name
+        self.keep_runs = keep_runs
+        self.connection = sqlite3.connect(file_name)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def latest_run(self):
+        """Return the last recorded run, None for an empty store."""
+        return self.connection.execute(
+            "SELECT * FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+
+    def resource_states(self, run_id):
+        """
+        Return the stored hashes and findings of a run
+        :param run_id:
+        :type run_id: int
+        :return: (namespace, kind, name) -> (hash, findings)
+        :rtype: dict
+        """
+        cursor = self.connection.execute(
+            "SELECT namespace, kind, name, hash, findings FROM resources WHERE run_id = ?", (run_id,))
+        return {(row['namespace'], row['kind'], row['name']): (row['hash'], json.loads(row['findings']))
+                for row in cursor}
+
+    def record_run(self, label, fingerprint, states, summary):
+        """
+        Store a run with the hash and findings of each resource in one transaction
+        :param label: free text identifying the run, e.g. the pipeline stage
+        :type label: str
+        :param fingerprint: identifies the baseline and rules the findings were computed with
+        :type fingerprint: str
+        :param states: (namespace, kind, name) -> (hash, findings)
+        :type states: dict
+        :param summary: resources, compared, added, changed, removed, differing and not_in_baseline counts
+        :type summary: dict
+        :return: run id
+        :rtype: int
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started, label, fingerprint, resources, compared, added, changed, removed, "
+                "differing, not_in_baseline) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), label, fingerprint, summary['resources'], summary['compared'], summary['added'],
+                 summary['changed'], summary['removed'], summary['differing'], summary['not_in_baseline']))
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO resources (run_id, namespace, kind, name, hash, findings) VALUES (?, ?, ?, ?, ?, ?)",
+                ((run_id, namespace, kind, name, digest, json.dumps(findings, default=str))
+                 for (namespace, kind, name), (digest, findings) in states.items()))
+            self._prune(run_id)
+        return run_id
+
+    def _prune(self, run_id):
+        """Delete the runs before the latest keep_runs and their resource rows."""
+        oldest = self.connection.execute(
+            "SELECT id FROM runs WHERE id <= ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (run_id, max(1, self.keep_runs) - 1)).fetchone()
+        if oldest is not None:
+            self.connection.execute("DELETE FROM resources WHERE run_id < ?", (oldest['id'],))
+            self.connection.execute("DELETE FROM runs WHERE id < ?", (oldest['id'],))
+
+    def trend(self, limit=50):
+        """
+        Return the drift summary of the latest runs, oldest first
+        :param limit:
+        :type limit: int
+        :return: one row per run
+        :rtype: list
+        """
+        cursor = self.connection.execute(
+            "SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,))
+        return [{'Run': row['id'], 'Time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['started'])),
+                 'Label': row['label'], 'Resources': row['resources'], 'Compared': row['compared'],
+                 'Added': row['added'], 'Changed': row['changed'], 'Removed': row['removed'],
+                 'Differing': row['differing'], 'Not in Baseline': row['not_in_baseline']}
+                for row in reversed(cursor.fetchall())]
+
+    def history(self, namespace, kind, name):
+        """
+        Return the runs in which a resource got a new hash, to find the stage that changed it
+        :return: one row per change, oldest first
+        :rtype: list
+        """
+        cursor = self.connection.execute(
+            "SELECT runs.id, runs.started, runs.label, resources.hash FROM runs "
+            "LEFT JOIN resources ON resources.run_id = runs.id "
+            "AND resources.namespace = ? AND resources.kind = ? AND resources.name = ? "
+            "ORDER BY runs.id", (namespace, kind, name))
+        changes = []
+        previous = None
+        for row in cursor:
+            if row['hash'] != previous:
+                changes.append({'Run': row['id'], 'Label': row['label'],
+                                'Time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['started'])),
+                                'Change': REMOVED if row['hash'] is None else (CHANGED if previous else ADDED),
+                                'Hash': row['hash'] or ''})
+                previous = row['hash']
+        return changes
+
+
+def compare_incremental(resources, namespace_map, baseline, categories, store, fingerprint, tolerances, label=''):
+    """
+    Compare collected namespaces with their baseline profiles, re-comparing only the resources
+    whose content changed since the previous run with the same fingerprint, and record the run
+    :param resources: namespace -> kind -> rows
+    :type resources: dict
+    :param namespace_map: namespace -> baseline profile
+    :type namespace_map: dict
+    :param baseline:
+    :type baseline: CompiledBaseline
+    :param categories: compared kinds
+    :type categories: list
+    :param store:
+    :type store: RunStore
+    :param fingerprint: baseline and comparison rules digest; a new one compares everything
+    :type fingerprint: str
+    :param tolerances:
+    :type tolerances: dict
+    :param label: stored with the run, e.g. the pipeline stage
+    :type label: str
+    :return: differences and not in baseline keyed '<namespace>/<kind>' as compare_namespaces,
+             and one drift row per resource added, changed or removed since the previous run
+    :rtype: tuple
+    """
+    previous = store.latest_run()
+    previous_states = store.resource_states(previous['id']) if previous else {}
+    # Stored findings are only valid for the same baseline and rules
+    reusable = previous is not None and previous['fingerprint'] == fingerprint
+
+    differences = {}
+    not_in_baseline = {}
+    drift = []
+    states = {}
+    compared = 0
+    for full_ns, short_ns in namespace_map.items():
+        for category in categories:
+            grouped = rows_by_resource(resources.get(full_ns, {}).get(category, []))
+            stale = []
+            for name, rows in grouped.items():
+                key = (full_ns, category, name)
+                digest = resource_hash(rows)
+                stored = previous_states.get(key)
+                if stored is None or stored[0] != digest:
+                    if previous is not None:
+                        drift.append({'Namespace': full_ns, 'Resource Type': category, 'Resource Name': name,
+                                      'Change': CHANGED if stored else ADDED})
+                if reusable and stored is not None and stored[0] == digest:
+                    states[key] = (digest, stored[1])
+                else:
+                    stale.append(name)
+                    states[key] = (digest, {})
+
+            stale_rows = [row for name in stale for row in grouped[name]]
+            compared += len(stale)
+            diff, nib = compare_rows(stale_rows, baseline, category, short_ns, tolerances)
+            for name, values in diff.items():
+                states[(full_ns, category, name)][1]['difference'] = values
+            for name, values in nib.items():
+                states[(full_ns, category, name)][1]['not_in_baseline'] = values
+
+            for name in grouped:
+                findings = states[(full_ns, category, name)][1]
+                if 'difference' in findings:
+                    differences.setdefault(f"{full_ns}/{category}", {})[name] = findings['difference']
+                if 'not_in_baseline' in findings:
+                    not_in_baseline.setdefault(f"{full_ns}/{category}", {})[name] = findings['not_in_baseline']
+
+    for (namespace, category, name) in previous_states.keys() - states.keys():
+        if namespace in namespace_map:
+            drift.append({'Namespace': namespace, 'Resource Type': category, 'Resource Name': name,
+                          'Change': REMOVED})
+
+    store.record_run(label, fingerprint, states, {
+        'resources': len(states), 'compared': compared,
+        'added': sum(row['Change'] == ADDED for row in drift),
+        'changed': sum(row['Change'] == CHANGED for row in drift),
+        'removed': sum(row['Change'] == REMOVED for row in drift),
+        'differing': sum(len(values) for values in differences.values()),
+        'not_in_baseline': sum(len(values) for values in not_in_baseline.values()),
+    })
+    return differences, not_in_baseline, drift
@@ -0,0 +1,102 @@
+"""
+Collect and compare several (context, namespace, profile) targets concurrently
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from kubernetes import config
+from config.jobs.monitor_resources.config import ResMonConfig, get_collection_settings, get_targets
+from lib.utils.error_handler import exception_handler
+from lib.utils.k8s_api_client import K8sApiClient
+from lib.utils.logger import Logger
+from src.utils.instrumentation import instrumented
+from src.jobs.monitor_resources.baseline import load_compiled_baseline
+from src.jobs.monitor_resources.monitor_resources import ResourceMonitor, report_differences
+from src.utils.report_writer import open_report
+
+LOG = Logger.get_logger(__name__)
+
+
+# Columns of the index sheet mapping the target keys of the sheet names to their targets
+TARGET_COLUMNS = ['Target', 'Context', 'Namespace', 'Profile', 'Error']
+
+
+def collect_target(target: dict) -> dict:
+    """Collect and compare one target in a worker process with its own client and kube context."""
+    result = {'target': target, 'resources': {}, 'differences': {}, 'not_in_baseline': {}, 'error': None}
+    try:
+        res_monitor = ResourceMonitor(K8sApiClient())
+        # Switch this process to the target context of the shared kube config
+        config.load_kube_config(config_file=os.getenv('KUBECONFIG'), context=target['context'])
+        res_monitor.context = target['context']
+
+        namespace = target['namespace']
+        workers, call_timeout = get_collection_settings()
+        if workers > 1:
+            resources = res_monitor.collect_resources_parallel([namespace], workers, call_timeout)
+        else:
+            resources = res_monitor.collect_resources([namespace])
+
+        baseline = load_compiled_baseline(ResMonConfig.BASELINE_FILE, ResMonConfig.BASELINE_CACHE_DIR)
+        differences, not_in_baseline = res_monitor.compare_namespaces(
+            resources, {namespace: target['profile']}, baseline, prefix=f"{target['key']}:")
+        result.update(resources=resources or {}, differences=differences or {}, not_in_baseline=not_in_baseline or {})
+        if resources is None:
+            result['error'] = 'collection failed'
+    except Exception as err:  # pylint: disable=broad-except
+        result['error'] = str(err)
+    return result
+
+
+@exception_handler(LOG)
+@instrumented
+def resource_monitor_fleet(targets: list = None):
+    """Monitor every RESMON_TARGETS entry in parallel processes and merge the results into one report."""
+    targets = targets or get_targets()
+    if not targets:
+        raise ValueError("No targets set in RESMON_TARGETS")
+    # Short keys name the target in sheet names and difference keys, the index sheet maps them back
+    targets = [{**target, 'key': f"T{number}"} for number, target in enumerate(targets, 1)]
+    LOG.info(f"Monitoring {len(targets)} targets: {targets}")
+
+    with ProcessPoolExecutor(max_workers=min(len(targets), ResMonConfig.TARGET_WORKERS)) as executor:
+        results = list(executor.map(collect_target, targets))
+
+    resources = {}
+    differences = {}
+    not_in_baseline = {}
+    failed = []
+    for result in results:
+        target = result['target']
+        if result['error']:
+            LOG.error(f"Target {target['context']}:{target['namespace']} failed: {result['error']}")
+            failed.append(target)
+            continue
+        resources[target['key']] = result['resources']
+        differences.update(result['differences'])
+        not_in_baseline.update(result['not_in_baseline'])
+
+    res_monitor = ResourceMonitor(K8sApiClient())
+    create_fleet_workbook(res_monitor.report_format, results, resources, ResMonConfig.FLEET_RESOURCES_FILE)
+    report_differences(res_monitor, differences, not_in_baseline)
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(targets)} targets could not be monitored")
+
+
+@exception_handler(LOG)
+@instrumented
+def create_fleet_workbook(report_format: str, results: list, resources: dict, filename: str):
+    """
+    Write a 'targets' index sheet and one '<kind>_<target key>' sheet per collected kind of each target,
+    so that the kind and target survive the sheet title limit of 31 characters
+    """
+    with open_report(filename, report_format) as writer:
+        writer.write_sheet('targets', ({'Target': result['target']['key'], 'Context': result['target']['context'],
+                                        'Namespace': result['target']['namespace'],
+                                        'Profile': result['target']['profile'], 'Error': result['error'] or ''}
+                                       for result in results), headers=TARGET_COLUMNS)
+        for key, namespaces in resources.items():
+            for kinds in namespaces.values():
+                for res_type, details in kinds.items():
+                    writer.write_sheet(f"{res_type}_{key}", details)
+    LOG.info(f"Fleet resource details report {', '.join(writer.files_written)} created successfully")
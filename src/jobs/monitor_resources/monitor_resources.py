@@ -1,64 +1,213 @@
-import json
-import pandas as pd
+import asyncio
+import time
+
 from tabulate import tabulate
-from config.jobs.monitor_resources.config import ResMonConfig, get_env_namespace
+from config.jobs.monitor_resources.config import (ResMonConfig, get_env_namespace, get_collection_settings,
+                                                  get_sampling_settings, get_targets)
 from lib.utils.error_handler import exception_handler
-from lib.utils.file_utils import load_json_file
 from lib.utils.k8s_api_client import K8sApiClient
 from lib.utils.logger import Logger
+from src.utils.concurrency import run_bounded
+from src.utils.instrumentation import instrumented
+from src.utils.k8s_async import async_enabled, run_with_client
+from src.utils.k8s_cache import current_context, shared_cache, unchanged_since
+from src.utils.k8s_pager import list_namespaced_pods, resource_list_func
+from src.utils.k8s_resources import async_resource_rows, fetch_resource_rows, iter_resource_rows
+from src.utils.log_payload import LazyJson, Summary
+from src.utils.report_writer import open_report
+from src.jobs.monitor_resources.baseline import CompiledBaseline, compare_rows, load_compiled_baseline
+from src.jobs.monitor_resources.capacity import (NAMESPACE_COLUMNS, WORKLOAD_COLUMNS, baseline_totals, cluster_rows,
+                                                 deployed_totals, namespace_rows, node_allocatable, workload_rows)
+from src.jobs.monitor_resources.drift import RunStore, compare_incremental, run_fingerprint
 
 LOG = Logger.get_logger(__name__)
 
+# Report columns of the differing details and not in baseline sheets
+DETAIL_COLUMNS = ['Resource Type', 'Namespace', 'Deployed Resource Name', 'Container', 'Differing Details',
+                  'Deployed Value', 'Approved Value']
+NOT_IN_BASELINE_COLUMNS = ['Resource Type', 'Namespace', 'Deployed Resource Name', 'Differing Details']
+
+
 class ResourceMonitor:
     def __init__(self, client: K8sApiClient):
         """Initialize ResourceMonitor with a Kubernetes API client."""
         self.client = client
         self.resource_types = ResMonConfig.RESOURCE_TYPES
+        self.call_latencies = {}
+        self.page_size = ResMonConfig.PAGE_SIZE
+        self.label_selector = ResMonConfig.LABEL_SELECTOR
+        self.report_format = ResMonConfig.REPORT_FORMAT
+        self.cache = shared_cache()
+        self.context = current_context() if self.cache else ''
+
+    @staticmethod
+    def custom_kind(res_type: str):
+        """Return the group, version, plural and columns of a custom resource kind, None for built-in kinds."""
+        kind = ResMonConfig.RESOURCE_KINDS.get(res_type, {})
+        return {**kind['api'], 'columns': kind.get('columns', {})} if 'api' in kind else None
+
+    def get_resource_details(self, namespace: str, res_type: str, request_timeout: float = None) -> list:
+        """
+        Stream the resource detail rows of a namespace page by page, keeping only the flattened rows;
+        request_timeout bounds each list call at the socket level
+        """
+        custom = self.custom_kind(res_type)
+        options = {'_request_timeout': request_timeout} if request_timeout else {}
+        if self.cache is None:
+            return list(iter_resource_rows(namespace, res_type, custom, page_size=self.page_size,
+                                           label_selector=self.label_selector, **options))
+        return self.cache.get_or_fetch(
+            (self.context, namespace, res_type, self.label_selector or ''),
+            fetch=lambda: fetch_resource_rows(namespace, res_type, custom, page_size=self.page_size,
+                                              label_selector=self.label_selector, **options),
+            # Custom resources are not watched, their cached rows are served until the TTL expires
+            revalidate=None if custom else lambda version: unchanged_since(
+                resource_list_func(res_type), namespace, resource_version=version, label_selector=self.label_selector))
 
     @exception_handler(LOG)
+    @instrumented
     def collect_resources(self, namespaces: list) -> dict:
         """Collect resources from the given namespaces."""
         all_resources = {}
         for namespace in namespaces:
             namespace_resources = {}
             for res_type in self.resource_types:
-                details = self.client.get_resource_details(namespace, res_type)
+                details = self.get_resource_details(namespace, res_type)
                 namespace_resources[res_type] = details
             all_resources[namespace] = namespace_resources
         return all_resources
 
     @exception_handler(LOG)
+    @instrumented
+    def collect_resources_parallel(self, namespaces: list, max_workers: int, call_timeout: float) -> dict:
+        """Collect resources from the given namespaces with concurrent API calls."""
+        # The socket timeout ends calls that run_bounded has given up on, their threads cannot be interrupted
+        calls = {
+            (namespace, res_type): (lambda ns=namespace, rt=res_type: self.get_resource_details(ns, rt, call_timeout))
+            for namespace in namespaces
+            for res_type in self.resource_types
+        }
+        results = run_bounded(calls, max_workers=max_workers, call_timeout=call_timeout)
+
+        all_resources = {namespace: {} for namespace in namespaces}
+        failed = []
+        for (namespace, res_type), result in results.items():
+            self.call_latencies[f"{namespace}/{res_type}"] = result.latency
+            if not result.ok:
+                failed.append(f"{namespace}/{res_type}")
+            all_resources[namespace][res_type] = result.value or []
+
+        self.log_call_latencies()
+        if failed:
+            raise RuntimeError(f"Resource collection failed or timed out for: {', '.join(failed)}")
+        return all_resources
+
+    @exception_handler(LOG)
+    @instrumented
+    def collect_resources_async(self, namespaces: list, call_timeout: float) -> dict:
+        """Collect resources from the given namespaces with all list calls in flight on one event loop."""
+        async def collect(api, namespace, res_type):
+            started = time.monotonic()
+            try:
+                return await asyncio.wait_for(
+                    async_resource_rows(api, namespace, res_type, self.custom_kind(res_type), page_size=self.page_size,
+                                        label_selector=self.label_selector), call_timeout)
+            finally:
+                self.call_latencies[f"{namespace}/{res_type}"] = time.monotonic() - started
+
+        keys = [(namespace, res_type) for namespace in namespaces for res_type in self.resource_types]
+        results = run_with_client(lambda api: asyncio.gather(*(collect(api, *key) for key in keys),
+                                                              return_exceptions=True), call_timeout=call_timeout)
+
+        all_resources = {namespace: {} for namespace in namespaces}
+        failed = []
+        for (namespace, res_type), result in zip(keys, results):
+            if isinstance(result, BaseException):
+                LOG.error(f"Collecting {namespace}/{res_type} failed: {result!r}")
+                failed.append(f"{namespace}/{res_type}")
+                result = []
+            all_resources[namespace][res_type] = result
+
+        self.log_call_latencies()
+        if failed:
+            raise RuntimeError(f"Resource collection failed or timed out for: {', '.join(failed)}")
+        return all_resources
+
+    def log_call_latencies(self):
+        """Log the latency of every collection call, flagging slow ones."""
+        for call, latency in sorted(self.call_latencies.items(), key=lambda item: item[1], reverse=True):
+            if latency > ResMonConfig.SLOW_CALL_THRESHOLD:
+                LOG.warning(f"Slow API call {call}: {latency:.2f}s")
+            else:
+                LOG.info(f"API call {call}: {latency:.2f}s")
+
+    @exception_handler(LOG)
+    @instrumented
+    def sample_utilization(self, namespaces: list, resources: dict, duration: float, interval: float):
+        """Sample container usage for the test window and relate it to the collected requests and limits."""
+        # Imported here as both modules load numpy, which runs without a sampling window do not need
+        # pylint: disable=import-outside-toplevel
+        from src.utils.k8s_metrics import UsageRing, sample_usage
+        from src.jobs.monitor_resources.utilization import Utilization, pod_workloads, workload_usage
+        LOG.info(f"Sampling container usage every {interval}s for {duration}s")
+        ring = UsageRing.for_window(duration, interval, max_series=ResMonConfig.SAMPLE_MAX_SERIES)
+        stats = sample_usage(namespaces, duration, interval, ring=ring).stats()
+        owners = {namespace: pod_workloads(list_namespaced_pods(namespace, page_size=self.page_size))
+                  for namespace in namespaces}
+        return Utilization(workload_usage(stats, owners), resources)
+
+    @exception_handler(LOG)
+    @instrumented
     def create_resource_details_workbook(self, all_resources: dict, filename: str):
-        """Create an Excel workbook with resource details."""
-        with pd.ExcelWriter(filename) as writer:
+        """Create a report with resource details, one sheet per namespace and resource type."""
+        with open_report(filename, self.report_format) as writer:
             for namespace, resources in all_resources.items():
                 for res_type, details in resources.items():
-                    df = pd.DataFrame(details)
-                    sheet_name = f"{namespace}_{res_type}"
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-        LOG.info(f"Resource details workbook '{filename}' created successfully")
+                    writer.write_sheet(f"{namespace}_{res_type}", details)
+        LOG.info(f"Resource details report {', '.join(writer.files_written)} created successfully")
 
     @exception_handler(LOG)
+    @instrumented
+    def create_capacity_report(self, resources: dict, namespace_map: dict, baseline: CompiledBaseline,
+                               filename: str = ResMonConfig.CAPACITY_REPORT):
+        """Report requests and limits x replicas per workload, namespace and cluster, with headroom and baseline delta."""
+        nodes, allocatable = node_allocatable()
+        deployed = deployed_totals(resources, nodes)
+        approved = baseline_totals(baseline, namespace_map, nodes)
+        cluster = list(cluster_rows(deployed, nodes, allocatable))
+        for row in cluster:
+            LOG.info(f"{row['Resource']}: requests {row['Requests']}, limits {row['Limits']}, "
+                     f"allocatable {row['Allocatable']} on {row['Nodes'] or 'unknown'} nodes, "
+                     f"headroom {row['Headroom']}")
+        with open_report(filename, self.report_format) as writer:
+            writer.write_sheet('cluster', cluster)
+            writer.write_sheet('namespaces', namespace_rows(deployed, approved, namespace_map), NAMESPACE_COLUMNS)
+            writer.write_sheet('workloads', workload_rows(deployed), WORKLOAD_COLUMNS)
+        LOG.info(f"Capacity report {', '.join(writer.files_written)} created successfully")
+
+    @exception_handler(LOG)
+    @instrumented
     def print_differences_table(self, differences: dict, not_in_baseline: dict):
         """Print a table of differences between deployed and baseline resources."""
         table_data = []
         for ns_res_type, diffs in differences.items():
-            resource_type, namespace = ns_res_type.split('/')
+            namespace, resource_type = ns_res_type.rsplit('/', 1)
             for res, containers in diffs.items():
                 in_baseline = 'Yes' if containers else 'No'
                 table_data.append([resource_type, namespace, res, in_baseline])
-                LOG.info(f"Details for {res}:\nDeployed Value: {json.dumps(containers, indent=2)}")
+                LOG.info("Details for %s:\nDeployed Value: %s", res, LazyJson(containers, indent=2))
 
         for ns_res_type, nibs in not_in_baseline.items():
-            resource_type, namespace = ns_res_type.split('/')
+            namespace, resource_type = ns_res_type.rsplit('/', 1)
             for res, details in nibs.items():
                 table_data.append([resource_type, namespace, res, 'No'])
-                LOG.info(f"Details for {res} (Not in Baseline):\nDeployed Value: {json.dumps(details, indent=2)}")
+                LOG.info("Details for %s (Not in Baseline):\nDeployed Value: %s", res, LazyJson(details, indent=2))
 
         table = tabulate(table_data, headers=ResMonConfig.DIFF_TABLE_HEADERS, tablefmt='grid')
         print(table)
 
     @exception_handler(LOG)
+    @instrumented
     def write_detailed_differences_to_file(self, differences: dict, filename: str = ResMonConfig.RESOURCE_DIFF_FILE):
         """Write detailed differences to a file."""
         with open(filename, 'w') as file:
@@ -66,93 +215,124 @@ class ResourceMonitor:
                 file.write(f"\nDifferences for {ns_res_type}:\n")
                 for res, containers in diffs.items():
                     file.write(f"Resource: {res}\n")
-                    if 'Capacity' in containers:
-                        diff = containers['Capacity']
-                        file.write(f"  Capacity - Deployed: {diff['deployed']} | Baseline: {diff['baseline']}\n")
-                    else:
-                        for container, limit_types in containers.items():
-                            file.write(f"  Container: {container}\n")
-                            for limit_type, diff in limit_types.items():
-                                if isinstance(diff, dict):
-                                    file.write(f"    {limit_type.capitalize()} - Deployed: {diff['deployed']} | Baseline: {diff['baseline']}\n")
-                                else:
-                                    file.write(f"    {limit_type.capitalize()} - {diff}\n")
+                    for entry, values in containers.items():
+                        if is_group_diff(values):
+                            file.write(f"  {entry} - Deployed: {values['deployed']} | Baseline: {values['baseline']}\n")
+                            continue
+                        file.write(f"  Container: {entry}\n")
+                        for limit_type, diff in values.items():
+                            if isinstance(diff, dict):
+                                file.write(f"    {limit_type.capitalize()} - Deployed: {diff['deployed']} | Baseline: {diff['baseline']}\n")
+                            else:
+                                file.write(f"    {limit_type.capitalize()} - {diff}\n")
 
     @exception_handler(LOG)
-    def compare_resource_details(self, deployed: list, baseline: dict, resource_type: str) -> (dict, dict):
-        """Compare deployed resource details with the baseline."""
+    @instrumented
+    def compare_namespaces(self, resources: dict, namespace_map: dict, baseline: CompiledBaseline,
+                           prefix: str = '') -> (dict, dict):
+        """Compare collected namespaces with their baseline profiles, keyed '<prefix><namespace>/<category>'."""
         differences = {}
         not_in_baseline = {}
+        for full_ns, short_ns in namespace_map.items():
+            for category in baseline.categories:
+                LOG.info(f"Accessing resources for mapped namespace '{full_ns}' and category '{category}'")
+                deployed_data = resources.get(full_ns, {}).get(category, [])
+                LOG.debug("Deployed data for '%s' under '%s': %s", full_ns, category, LazyJson(deployed_data),
+                          extra={'payload': deployed_data})
+
+                diff, nib = self.compare_resource_details(deployed_data, baseline, category, short_ns)
+                if diff:
+                    differences[f"{prefix}{full_ns}/{category}"] = diff
+                if nib:
+                    not_in_baseline[f"{prefix}{full_ns}/{category}"] = nib
+        return differences, not_in_baseline
 
-        for item in deployed:
-            item_name = item.get('Name', '')
-            container_name = item.get('Container Name', '')
-            namespace = item.get('Namespace', 'default')  # Assuming namespace is provided in the item
-
-            if resource_type == 'pvc':
-                LOG.info(f'Processing PVC: {item_name}')
-                baseline_pvc_data = baseline.get(item_name, {})
-                if not baseline_pvc_data:
-                    LOG.info(f"PVC {item_name} not found in baseline.")
-                    not_in_baseline[item_name] = {
-                        'type': 'PersistentVolumeClaim',
-                        'namespace': namespace,
-                        'details': item
-                    }
-                    continue
-
-                deployed_capacity = item.get('Capacity', 'Not specified')
-                baseline_capacity = baseline_pvc_data.get('capacity', None)
-                LOG.info(f'Baseline capacity for PVC {item_name}: {baseline_capacity}')
-
-                if deployed_capacity != baseline_capacity:
-                    differences.setdefault(item_name, {})['Capacity'] = {
-                        'deployed': deployed_capacity,
-                        'baseline': baseline_capacity
-                    }
-                continue
-
-            if item_name not in baseline:
-                LOG.info(f"Resource {item_name} not found in baseline.")
-                not_in_baseline[item_name] = {
-                    'type': resource_type,
-                    'namespace': namespace,
-                    'details': item
-                }
-                continue
-
-            baseline_item = baseline[item_name]
-            baseline_container = baseline_item.get('data', {}).get(container_name, {})
+    @exception_handler(LOG)
+    @instrumented
+    def compare_since_last_run(self, resources: dict, namespace_map: dict, baseline: CompiledBaseline) -> (dict, dict):
+        """Compare only the resources changed since the previous stored run and report the drift."""
+        with RunStore(ResMonConfig.RUN_STORE, keep_runs=ResMonConfig.RUN_KEEP) as store:
+            differences, not_in_baseline, drift = compare_incremental(
+                resources, namespace_map, baseline, baseline.categories, store,
+                run_fingerprint(ResMonConfig.BASELINE_FILE, ResMonConfig.TOLERANCES), ResMonConfig.TOLERANCES,
+                label=ResMonConfig.RUN_LABEL)
+            trend = store.trend()
+        LOG.info(f"Compared {trend[-1]['Compared']} of {trend[-1]['Resources']} resources, "
+                 f"{len(drift)} changed since the previous run")
+        with open_report(ResMonConfig.DRIFT_REPORT, self.report_format) as writer:
+            writer.write_sheet('drift', drift)
+            writer.write_sheet('trend', trend)
+        LOG.info(f"Drift report {', '.join(writer.files_written)} created successfully")
+        return differences, not_in_baseline
 
-            for limit_type in ['limits', 'requests']:
-                deployed_limits = {
-                    'cpu': item.get(f'CPU {limit_type.capitalize()}', 'Not specified'),
-                    'memory': item.get(f'Memory {limit_type.capitalize()}', 'Not specified'),
-                    'ephemeral-storage': item.get(f'Ephemeral-storage {limit_type.capitalize()}', 'Not specified')
+    @exception_handler(LOG)
+    @instrumented
+    def compare_resource_details(self, deployed: list, baseline: CompiledBaseline, resource_type: str,
+                                 namespace: str) -> (dict, dict):
+        """Compare deployed resource details with the compiled baseline of a namespace profile."""
+        return compare_rows(deployed, baseline, resource_type, namespace, ResMonConfig.TOLERANCES)
+
+def is_group_diff(values: dict) -> bool:
+    """True for the differing values of a group, False for the groups of a container or other key."""
+    return isinstance(values, dict) and 'deployed' in values and 'baseline' in values
+
+
+def differing_detail_rows(differences: dict):
+    """Yield one report row per differing group, e.g. a capacity or a container limit type."""
+    for ns_res_type, diffs in differences.items():
+        namespace, resource_type = ns_res_type.rsplit('/', 1)
+        for res, containers in diffs.items():
+            resource_groups = {group: diff for group, diff in containers.items() if is_group_diff(diff)}
+            for group, diff in resource_groups.items():
+                yield {
+                    'Resource Type': resource_type,
+                    'Namespace': namespace,
+                    'Deployed Resource Name': res,
+                    'Container': 'N/A',
+                    'Differing Details': group,
+                    'Deployed Value': diff['deployed'],
+                    'Approved Value': diff['baseline']
                 }
-                baseline_limits = baseline_container.get(limit_type, {})
-
-                if 'ephemeral-storage' in baseline_limits:
-                    baseline_limits = {
-                        'cpu': baseline_limits.get('cpu', 'Not specified'),
-                        'memory': baseline_limits.get('memory', 'Not specified'),
-                        'ephemeral-storage': baseline_limits.get('ephemeral-storage', 'Not specified')
-                    }
-
-                if 'ephemeral-storage' not in baseline_limits:
-                    deployed_limits.pop('ephemeral-storage', None)
-
-                if deployed_limits != baseline_limits:
-                    differences.setdefault(item_name, {}).setdefault(container_name, {})[limit_type] = {
-                        'deployed': deployed_limits,
-                        'baseline': baseline_limits
-                    }
+            for container, limit_types in containers.items():
+                if container in resource_groups:
+                    continue
+                for limit_type, diff in limit_types.items():
+                    if isinstance(diff, dict):
+                        yield {
+                            'Resource Type': resource_type,
+                            'Namespace': namespace,
+                            'Deployed Resource Name': res,
+                            'Container': container,
+                            'Differing Details': limit_type,
+                            'Deployed Value': diff['deployed'],
+                            'Approved Value': diff['baseline']
+                        }
+
+
+def not_in_baseline_rows(not_in_baseline: dict):
+    """Yield one report row per deployed resource missing from the baseline."""
+    for ns_res_type, nibs in not_in_baseline.items():
+        namespace, resource_type = ns_res_type.rsplit('/', 1)
+        for res in nibs:
+            yield {
+                'Resource Type': resource_type,
+                'Namespace': namespace,
+                'Deployed Resource Name': res,
+                'Differing Details': 'Not in Baseline'
+            }
 
-        return differences, not_in_baseline
 
 @exception_handler(LOG)
+@instrumented
 def resource_monitor():
     """Main function to monitor resources and compare with the baseline."""
+    targets = get_targets()
+    if targets:
+        # Imported here as the fleet module builds on this one
+        from src.jobs.monitor_resources.fleet import resource_monitor_fleet  # pylint: disable=import-outside-toplevel
+        resource_monitor_fleet(targets)
+        return
+
     api_client = K8sApiClient()
     res_monitor = ResourceMonitor(api_client)
 
@@ -160,84 +340,80 @@ def resource_monitor():
     namespaces = list(namespace_map.keys())
     LOG.info(f"Processed namespaces for baseline comparison: {namespaces}")
 
-    resources = res_monitor.collect_resources(namespaces)
-    LOG.info(f"Collected resources: {json.dumps(resources, indent=2)}")
+    workers, call_timeout = get_collection_settings()
+    if async_enabled() and not res_monitor.cache:
+        # All calls are in flight at once, bounded by K8S_CONNECTIONS and K8S_RATE_LIMIT instead of the workers
+        LOG.info(f"Collecting with the async client, RESMON_WORKERS={workers} is not used")
+        resources = res_monitor.collect_resources_async(namespaces, call_timeout)
+    elif workers > 1:
+        resources = res_monitor.collect_resources_parallel(namespaces, workers, call_timeout)
+    else:
+        resources = res_monitor.collect_resources(namespaces)
+    LOG.info("Collected resources: %s", Summary(resources))
+    LOG.debug("Collected resource details: %s", LazyJson(resources), extra={'payload': resources})
+    if res_monitor.cache:
+        res_monitor.cache.log_stats()
 
-    baseline = load_json_file(filename=ResMonConfig.BASELINE_FILE)
-    LOG.info(f"Loaded baseline data: {json.dumps(baseline, indent=2)}")
+    baseline = load_compiled_baseline(ResMonConfig.BASELINE_FILE, ResMonConfig.BASELINE_CACHE_DIR)
+    LOG.info(f"Loaded baseline with {len(baseline.resources)} resources in {len(baseline.categories)} categories")
 
     res_monitor.create_resource_details_workbook(resources, resources_filename)
+    res_monitor.create_capacity_report(resources, namespace_map, baseline)
+
+    utilization = None
+    duration, interval = get_sampling_settings()
+    if duration:
+        utilization = res_monitor.sample_utilization(namespaces, resources, duration, interval)
 
-    differences = {}
-    not_in_baseline = {}
-    for full_ns, short_ns in namespace_map.items():
-        for category in baseline.keys():
-            LOG.info(f"Accessing resources for mapped namespace '{full_ns}' and category '{category}'")
-            deployed_data = resources.get(full_ns, {}).get(category, [])
-            LOG.info(f"Deployed data for '{full_ns}' under '{category}': {json.dumps(deployed_data, indent=2)}")
+    if ResMonConfig.RUN_STORE:
+        differences, not_in_baseline = res_monitor.compare_since_last_run(resources, namespace_map, baseline)
+    else:
+        differences, not_in_baseline = res_monitor.compare_namespaces(resources, namespace_map, baseline)
+    report_differences(res_monitor, differences, not_in_baseline, utilization)
 
-            baseline_data = baseline.get(category, {}).get(short_ns, {})
-            LOG.info(f"Baseline data for '{short_ns}' under '{category}': {json.dumps(baseline_data, indent=2)}")
 
-            diff, nib = res_monitor.compare_resource_details(deployed_data, baseline_data, category)
-            if diff:
-                differences[f"{full_ns}/{category}"] = diff
-            if nib:
-                not_in_baseline[f"{full_ns}/{category}"] = nib
+def report_differences(res_monitor: ResourceMonitor, differences: dict, not_in_baseline: dict,
+                       utilization=None):
+    """Write the difference file, the differing details report and print the summary table."""
+    if utilization is not None and not (differences or not_in_baseline):
+        with open_report(ResMonConfig.DIFFERING_DETAILS, res_monitor.report_format) as writer:
+            writer.write_sheet('utilization', utilization.rows())
+        LOG.info(f"Utilization written to {', '.join(writer.files_written)}")
 
     if differences or not_in_baseline:
         LOG.info("Differences detected:")
         res_monitor.write_detailed_differences_to_file(differences)
 
-        data_rows = []
-        nib_rows = []
-        for ns_res_type, diffs in differences.items():
-            for res, containers in diffs.items():
-                if 'Capacity' in containers:
-                    diff = containers['Capacity']
-                    data_rows.append({
-                        'Resource Type': ns_res_type.split('/')[1],
-                        'Namespace': ns_res_type.split('/')[0],
-                        'Deployed Resource Name': res,
-                        'Container': 'N/A',
-                        'Differing Details': 'Capacity',
-                        'Deployed Value': diff['deployed'],
-                        'Approved Value': diff['baseline']
-                    })
-                else:
-                    for container, limit_types in containers.items():
-                        for limit_type, diff in limit_types.items():
-                            if isinstance(diff, dict):
-                                data_rows.append({
-                                    'Resource Type': ns_res_type.split('/')[1],
-                                    'Namespace': ns_res_type.split('/')[0],
-                                    'Deployed Resource Name': res,
-                                    'Container': container,
-                                    'Differing Details': limit_type,
-                                    'Deployed Value': diff['deployed'],
-                                    'Approved Value': diff['baseline']
-                                })
-
-        for ns_res_type, nibs in not_in_baseline.items():
-            for res, details in nibs.items():
-                resource_type, namespace = ns_res_type.split('/')
-                nib_rows.append({
-                    'Resource Type': resource_type,
-                    'Namespace': namespace,
-                    'Deployed Resource Name': res,
-                    'Differing Details': 'Not in Baseline'
-                })
-
-        differing_details_df = pd.DataFrame(data_rows)
-        not_in_baseline_df = pd.DataFrame(nib_rows)
-        LOG.info("Data rows for Excel:\n%s", data_rows)
-        LOG.info("Data rows for Not in Baseline Excel:\n%s", nib_rows)
-
-        with pd.ExcelWriter(ResMonConfig.DIFFERING_DETAILS) as writer:
-            differing_details_df.to_excel(writer, sheet_name='differing_details', index=False)
-            not_in_baseline_df.to_excel(writer, sheet_name='not_in_baseline', index=False)
-        LOG.info(f"{ResMonConfig.DIFFERING_DETAILS} generated successfully")
+        rows = differing_detail_rows(differences)
+        with open_report(ResMonConfig.DIFFERING_DETAILS, res_monitor.report_format) as writer:
+            if utilization is not None:
+                # The utilization columns follow the declared ones, they are taken from the first row
+                writer.write_sheet('differing_details', utilization.annotate(rows))
+            else:
+                writer.write_sheet('differing_details', rows, DETAIL_COLUMNS)
+            writer.write_sheet('not_in_baseline', not_in_baseline_rows(not_in_baseline), NOT_IN_BASELINE_COLUMNS)
+            if utilization is not None:
+                writer.write_sheet('utilization', utilization.rows())
+        LOG.info(f"{', '.join(writer.files_written)} generated successfully")
 
         res_monitor.print_differences_table(differences, not_in_baseline)
     else:
         LOG.info("No differences detected.")
+
+
+@exception_handler(LOG)
+@instrumented
+def resource_drift_trend():
+    """Print the drift trend of the run store, and the change history of RESMON_DRIFT_RESOURCE if set."""
+    if not ResMonConfig.RUN_STORE:
+        raise ValueError("RESMON_RUN_STORE is not set")
+    with RunStore(ResMonConfig.RUN_STORE) as store:
+        trend = store.trend()
+        print(tabulate([list(row.values()) for row in trend], headers=list(trend[0]) if trend else [], tablefmt='grid'))
+        resource = ResMonConfig.DRIFT_RESOURCE
+        if resource:
+            namespace, kind, name = resource.split('/', 2)
+            history = store.history(namespace, kind, name)
+            print(f"\nChanges of {resource}:")
+            print(tabulate([list(row.values()) for row in history], headers=list(history[0]) if history else [],
+                           tablefmt='grid'))
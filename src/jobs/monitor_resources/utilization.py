@@ -0,0 +1,97 @@
+"""
+Join sampled container usage with the configured requests and limits
+"""
+import numpy as np
+
+from config.jobs.monitor_resources.kinds import RESOURCE_NAMES
+from src.jobs.pod_monitor.restart_index import pod_lineage
+from src.utils.k8s_metrics import METRICS
+from src.utils.quantity import canonical
+
+UNITS = {'cpu': ('m', 1), 'memory': ('Mi', 2 ** 20)}
+
+
+def pod_workloads(pods):
+    """
+    Map pod names to the name of their owning workload
+    :param pods: iterable of V1Pod objects
+    :type pods: iterable
+    :return: pod name -> workload name, the pod name itself for bare pods
+    :rtype: dict
+    """
+    owners = {}
+    for pod in pods:
+        lineage = pod_lineage(pod.metadata.owner_references, pod.metadata.labels)
+        owners[pod.metadata.name] = lineage.split('/', 1)[1] if lineage else pod.metadata.name
+    return owners
+
+
+def workload_usage(stats, owners):
+    """
+    Fold per pod statistics into per workload container statistics, keeping the busiest replica
+    :param stats: (namespace, pod, container) -> {metric: (p50, p95, max)}
+    :type stats: dict
+    :param owners: namespace -> {pod: workload}
+    :type owners: dict
+    :return: (namespace, workload, container) -> {metric: (p50, p95, max)}
+    :rtype: dict
+    """
+    usage = {}
+    for (namespace, pod, container), values in stats.items():
+        workload = owners.get(namespace, {}).get(pod, pod)
+        key = (namespace, workload, container)
+        if key in usage:
+            values = {metric: tuple(np.fmax(usage[key][metric], values[metric])) for metric in METRICS}
+        usage[key] = values
+    return usage
+
+
+def _percent(value, reference):
+    if reference is None or not reference or np.isnan(value):
+        return ''
+    return round(100 * value / reference, 1)
+
+
+class Utilization:
+    """Sampled usage per workload container, reported against the deployed requests and limits."""
+
+    def __init__(self, usage, resources):
+        self.usage = usage
+        self.deployed = {
+            (namespace, row['Name'], row.get('Container Name', '')): row
+            for namespace, types in resources.items()
+            for rows in types.values()
+            for row in rows if 'Container Name' in row
+        }
+
+    def columns(self, namespace, name, container):
+        """
+        Return usage statistics and p95 utilization against request and limit
+        :return: report columns, empty values when nothing was sampled
+        :rtype: dict
+        """
+        values = self.usage.get((namespace, name, container), {})
+        row = self.deployed.get((namespace, name, container), {})
+        columns = {}
+        for metric in METRICS:
+            label = RESOURCE_NAMES[metric]
+            unit, scale = UNITS[metric]
+            p50, p95, peak = values.get(metric, (np.nan, np.nan, np.nan))
+            for stat, value in (('p50', p50), ('p95', p95), ('max', peak)):
+                columns[f'{label} {stat} ({unit})'] = '' if np.isnan(value) else round(value / scale, 1)
+            columns[f'{label} p95 / Request %'] = _percent(p95, canonical(metric, row.get(f'{label} Requests')))
+            columns[f'{label} p95 / Limit %'] = _percent(p95, canonical(metric, row.get(f'{label} Limits')))
+        return columns
+
+    def annotate(self, rows):
+        """Add the utilization columns to differing details rows."""
+        for row in rows:
+            yield {**row, **self.columns(row['Namespace'], row['Deployed Resource Name'], row.get('Container', ''))}
+
+    def rows(self):
+        """Yield one utilization row per deployed container."""
+        for (namespace, name, container), row in self.deployed.items():
+            yield {'Namespace': namespace, 'Resource Name': name, 'Container': container,
+                   **{f'{RESOURCE_NAMES[metric]} {limit_type}': row.get(f'{RESOURCE_NAMES[metric]} {limit_type}', '')
+                      for metric in METRICS for limit_type in ('Requests', 'Limits')},
+                   **self.columns(namespace, name, container)}
@@ -0,0 +1,235 @@
+"""
+Events and previous container logs of restarted pods, fetched in bulk
+
+The Events of a namespace are listed once and indexed by involved object; the
+previous logs of the restarted containers are read concurrently, each capped in
+lines by the API server and in bytes here, keeping the end of the log.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from src.utils.concurrency import run_bounded
+from src.utils.k8s_async import RESOURCE_PATHS
+from src.utils.k8s_pager import paginate_pages, raw_list_func, raw_lists_enabled
+
+# Events kept per involved object, the most recent ones
+MAX_EVENTS = 20
+TRUNCATED = '[... truncated]'
+
+
+def event_record(event):
+    """
+    Return the reported fields of an Event given as API JSON
+    :param event:
+    :type event: dict
+    :return:
+    :rtype: dict
+    """
+    metadata = event.get('metadata') or {}
+    series = event.get('series') or {}
+    return {
+        'Time': (event.get('lastTimestamp') or (series.get('lastObservedTime')) or event.get('eventTime')
+                 or metadata.get('creationTimestamp') or ''),
+        'Type': event.get('type') or '',
+        'Reason': event.get('reason') or '',
+        'Count': series.get('count') or event.get('count') or 1,
+        'Message': (event.get('message') or '').strip(),
+    }
+
+
+def list_events(namespace, page_size=None):
+    """
+    Stream the Events of a namespace as API JSON
+    :param namespace:
+    :type namespace: str
+    :param page_size: items requested per list call, the pager default when omitted
+    :type page_size: int
+    :return: generator over event dicts
+    :rtype: generator
+    """
+    list_func = client.CoreV1Api().list_namespaced_event
+    raw = raw_lists_enabled()
+    sanitize = client.ApiClient().sanitize_for_serialization
+    kwargs = {'page_size': page_size} if page_size else {}
+    for page in paginate_pages(raw_list_func(list_func) if raw else list_func, namespace, **kwargs):
+        for event in page.items:
+            yield event if raw else sanitize(event)
+
+
+def index_events(events, max_events=MAX_EVENTS):
+    """
+    Index events by the kind and name of their involved object, oldest first
+    :param events: event dicts as listed by list_events
+    :type events: iterable
+    :param max_events: most recent events kept per object
+    :type max_events: int
+    :return: (kind, name) -> list of event records
+    :rtype: dict
+    """
+    index = defaultdict(list)
+    for event in events:
+        involved = event.get('involvedObject') or {}
+        index[(involved.get('kind', ''), involved.get('name', ''))].append(event_record(event))
+    for key, records in index.items():
+        records.sort(key=lambda record: record['Time'])
+        index[key] = records[-max_events:]
+    return dict(index)
+
+
+def read_previous_log(namespace, pod, container, tail_lines, limit_bytes, request_timeout=None):
+    """
+    Return the log of the previous instance of a container, its last lines and bytes
+    :param namespace:
+    :type namespace: str
+    :param pod:
+    :type pod: str
+    :param container:
+    :type container: str
+    :param tail_lines: last lines requested from the API server
+    :type tail_lines: int
+    :param limit_bytes: last bytes kept
+    :type limit_bytes: int
+    :param request_timeout: socket timeout of the read in seconds
+    :type request_timeout: float
+    :return: log text, or why it is not available
+    :rtype: str
+    """
+    try:
+        response = client.CoreV1Api().read_namespaced_pod_log(
+            pod, namespace, container=container, previous=True, tail_lines=tail_lines, _preload_content=False,
+            **({'_request_timeout': request_timeout} if request_timeout else {}))
+    except ApiException as err:
+        # 400 once the previous instance is gone, e.g. the pod was recreated
+        return f"Previous log not available: {err.status} {err.reason}"
+    try:
+        data = response.data
+    finally:
+        response.release_conn()
+    return _log_text(data, limit_bytes)
+
+
+def _log_text(data, limit_bytes):
+    # The limitBytes of the API server keeps the start of the log, the end is what explains a restart
+    if len(data) <= limit_bytes:
+        return data.decode('utf-8', errors='replace')
+    data = data[-limit_bytes:]
+    # Drop the partial first line unless the kept bytes are a single line
+    newline = data.find(b'\n')
+    if 0 <= newline < len(data) - 1:
+        data = data[newline + 1:]
+    return f"{TRUNCATED}\n{data.decode('utf-8', errors='replace')}"
+
+
+def fetch_previous_logs(namespace, containers, tail_lines, limit_bytes, max_workers=8, call_timeout=None):
+    """
+    Read the previous logs of containers concurrently
+    :param namespace:
+    :type namespace: str
+    :param containers: (pod, container) pairs
+    :type containers: list
+    :param tail_lines: last lines requested per container
+    :type tail_lines: int
+    :param limit_bytes: last bytes kept per container
+    :type limit_bytes: int
+    :param max_workers: concurrent log reads
+    :type max_workers: int
+    :param call_timeout: seconds a single read may take
+    :type call_timeout: float
+    :return: (pod, container) -> log text
+    :rtype: dict
+    """
+    calls = {key: (lambda pod=key[0], container=key[1]:
+                   read_previous_log(namespace, pod, container, tail_lines, limit_bytes, call_timeout))
+             for key in dict.fromkeys(containers)}
+    logs = {}
+    for key, result in run_bounded(calls, max_workers=max_workers, call_timeout=call_timeout).items():
+        if result.ok:
+            logs[key] = result.value
+        else:
+            logs[key] = 'Previous log not available: ' + ('timed out' if result.timed_out else str(result.error))
+    return logs
+
+
+async def async_events_and_logs(api, namespace, containers, tail_lines, limit_bytes, page_size=None,
+                                call_timeout=None):
+    """
+    List the events of a namespace and read the previous logs of containers, all on one event loop
+    :param api:
+    :type api: AsyncK8sClient
+    :param namespace:
+    :type namespace: str
+    :param containers: (pod, container) pairs
+    :type containers: list
+    :param tail_lines: last lines requested per container
+    :type tail_lines: int
+    :param limit_bytes: last bytes kept per container
+    :type limit_bytes: int
+    :param page_size: items requested per event list call
+    :type page_size: int
+    :param call_timeout: seconds a single log read may take
+    :type call_timeout: float
+    :return: events as returned by index_events and logs as returned by fetch_previous_logs
+    :rtype: tuple
+    """
+    async def events():
+        try:
+            return index_events(await api.list_items(RESOURCE_PATHS['events'], namespace,
+                                                     **({'page_size': page_size} if page_size else {})))
+        except ApiException as err:
+            logging.warning("Events of %s not available: %s %s", namespace, err.status, err.reason)
+            return {}
+
+    async def previous_log(pod, container):
+        try:
+            data = await asyncio.wait_for(api.read_log(namespace, pod, container, previous=True,
+                                                       tail_lines=tail_lines), call_timeout)
+        except ApiException as err:
+            return f"Previous log not available: {err.status} {err.reason}"
+        except TimeoutError:
+            return 'Previous log not available: timed out'
+        return _log_text(data, limit_bytes)
+
+    keys = list(dict.fromkeys(containers))
+    index, *logs = await asyncio.gather(events(), *(previous_log(pod, container) for pod, container in keys))
+    return index, dict(zip(keys, logs))
+
+
+def restart_context(events, logs, restarts, changes):
+    """
+    Attach the events and previous logs to the restarts and pod changes of a comparison
+    :param events: as returned by index_events
+    :type events: dict
+    :param logs: as returned by fetch_previous_logs
+    :type logs: dict
+    :param restarts: [Pod, Container, Restarts] rows
+    :type restarts: list
+    :param changes: [Pod, Owner, Change, Replacement] rows
+    :type changes: list
+    :return: restart and change records with their Events, and the restarts with their Previous Log
+    :rtype: dict
+    """
+    def owner_events(owner):
+        kind, _, name = owner.partition('/')
+        return events.get((kind, name), [])
+
+    return {
+        'restarts': [{'Pod': pod, 'Container': container, 'Restarts': count,
+                      'Events': events.get(('Pod', pod), []),
+                      'Previous Log': logs.get((pod, container), '')}
+                     for pod, container, count in restarts],
+        'changes': [{'Pod': pod, 'Owner': owner, 'Change': change, 'Replacement': replacement,
+                     'Events': events.get(('Pod', pod), []) + owner_events(owner)}
+                    for pod, owner, change, replacement in changes],
+    }
+
+
+def event_summary(records):
+    """Summarize events as their reasons with counts, e.g. 'BackOff x3, OOMKilling'."""
+    counts = {}
+    for record in records:
+        counts[record['Reason']] = counts.get(record['Reason'], 0) + record['Count']
+    return ', '.join(reason if count == 1 else f"{reason} x{count}" for reason, count in counts.items())
@@ -1,9 +1,12 @@
 """
 Detect unexpected behaviour in pods
 """
-import os
 import json
+import os
+import time
 
+from kubernetes import client
+from kubernetes.client.rest import ApiException
 from tabulate import tabulate
 from lib.constants import EnvVar
 from config.jobs.pod_monitor.config import PodMonConfig as Pdc
@@ -12,30 +15,48 @@ from lib.utils.env_data import get_env_var
 from lib.utils.file_utils import delete_file
 from lib.utils.k8s_api_client import K8sApiClient
 from lib.utils.logger import Logger
+from src.utils.instrumentation import instrumented
+from src.utils.k8s_async import RESOURCE_PATHS, async_enabled, run_with_client
+from src.utils.k8s_cache import current_context, shared_cache, unchanged_since
+from src.utils.k8s_pager import paginate_pages, raw_list_func, raw_lists_enabled
+from src.utils.k8s_watch import watch_events
+from src.jobs.pod_monitor.timeline import RestartTimeline
+from src.jobs.pod_monitor.correlation import (async_events_and_logs, event_summary, fetch_previous_logs,
+                                              index_events, list_events, restart_context)
+from src.jobs.pod_monitor.snapshot import SnapshotReader, SnapshotWriter
+from src.jobs.pod_monitor.records import pod_records, raw_pod_records
+from src.jobs.pod_monitor.restart_index import ADDED, RECREATED, compare_pod_states, interval_restarts
 
 LOG = Logger.get_logger(__name__)
 
 
 @exception_handler(LOG)
+@instrumented
 def pod_restart_monitor():
     """
     Wrapper script
     """
+    mode = get_env_var('POD_MONITOR_MODE')
+    if mode == 'watch':
+        pod_restart_watch()
+        return
+    if mode == 'soak':
+        pod_snapshot_soak()
+        return
+
     namespace = get_env_var(EnvVar.NAMESPACE.value)
-    file_name = (f'{Pdc.file_prefix}_'
-                 f'{get_env_var(EnvVar.PIPELINE.value)}_'
-                 f'{get_env_var(EnvVar.ENVIRONMENT.value)}.json')
+    file_name = snapshot_file_name()
 
     if os.path.isfile(file_name):
         LOG.info("End of pipeline detected")
         LOG.info("Generating final pod state")
-        final_pod_data = json.loads(str(create_pod_state(namespace)))
+        SnapshotWriter(file_name).append(create_pod_state(namespace))
 
-        # Open the JSON file and load the data
-        with open(file_name, 'r') as file:
-            initial_pod_data = json.load(file)
+        reader = SnapshotReader(file_name)
+        initial_pod_data = reader.load(0)
+        final_pod_data = reader.load()
 
-        if detect_pod_restart(initial_pod_data, final_pod_data):
+        if detect_pod_restart(initial_pod_data, final_pod_data, namespace):
             LOG.error("Restarts detected in pods")
             LOG.error("Failing this job")
             delete_file(file_name)
@@ -46,77 +67,257 @@ def pod_restart_monitor():
     else:
         LOG.info("Beginning of pipeline detected")
         LOG.info("Generating initial pod state")
-        initial_pod_data = create_pod_state(namespace)
-        with open(file_name, 'w') as file:
-            file.write(str(initial_pod_data))
+        SnapshotWriter(file_name).append(create_pod_state(namespace))
+
+
+def snapshot_file_name():
+    """
+    Return the snapshot file name of the current pipeline and environment
+    """
+    return (f'{Pdc.file_prefix}_'
+            f'{get_env_var(EnvVar.PIPELINE.value)}_'
+            f'{get_env_var(EnvVar.ENVIRONMENT.value)}.snap')
+
+
+def context_file_name():
+    """
+    Return the restart context file name of the current pipeline and environment
+    """
+    return (f'{Pdc.context_prefix}_'
+            f'{get_env_var(EnvVar.PIPELINE.value)}_'
+            f'{get_env_var(EnvVar.ENVIRONMENT.value)}.json')
 
 
 @exception_handler(LOG)
+@instrumented
+def pod_snapshot_soak():
+    """
+    Append a pod state snapshot every interval for the duration of a soak test,
+    report the restarts of every interval, then compare the first and last snapshots
+    """
+    namespace = get_env_var(EnvVar.NAMESPACE.value)
+    duration = float(get_env_var('WATCH_DURATION') or Pdc.watch_duration)
+    interval = float(get_env_var('SNAPSHOT_INTERVAL') or Pdc.snapshot_interval)
+    file_name = snapshot_file_name()
+    # Start on a fresh file, the writer would resume a snapshot left behind by an earlier run
+    if os.path.isfile(file_name):
+        delete_file(file_name)
+    writer = SnapshotWriter(file_name)
+    LOG.info(f"Recording pod snapshots of {namespace} every {interval}s for {duration}s in {file_name}")
+
+    deadline = time.monotonic() + duration
+    while True:
+        writer.append(create_pod_state(namespace))
+        if time.monotonic() + interval > deadline:
+            break
+        time.sleep(interval)
+
+    reader = SnapshotReader(file_name)
+    # The file is deleted below, print the per-interval history so the job log keeps it
+    intervals = interval_restarts(reader.snapshots())
+    if intervals:
+        table = [[time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(row[0]))] + row[1:] for row in intervals]
+        LOG.info(f"Restarts in {len(intervals)} container intervals")
+        print(tabulate(table, headers=['Time (UTC)', 'Pod', 'Container', 'Restarts'], tablefmt="grid",
+                       numalign="center"), "\n\n")
+    if detect_pod_restart(reader.load(0), reader.load(), namespace):
+        LOG.error("Restarts detected in pods")
+        LOG.error("Failing this job")
+        delete_file(file_name)
+        assert False
+    LOG.info("No Pods restart detected")
+    delete_file(file_name)
+
+
+@exception_handler(LOG)
+@instrumented
+def pod_restart_watch():
+    """
+    Follow pod status changes through the watch API for the duration of the test
+    window and keep a timeline of container restarts and OOM kills
+    """
+    namespace = get_env_var(EnvVar.NAMESPACE.value)
+    duration = float(get_env_var('WATCH_DURATION') or Pdc.watch_duration)
+    file_name = (f'{Pdc.timeline_prefix}_'
+                 f'{get_env_var(EnvVar.PIPELINE.value)}_'
+                 f'{get_env_var(EnvVar.ENVIRONMENT.value)}.jsonl')
+
+    # The client loads the kube config used by the watch calls
+    K8sApiClient()
+    timeline = RestartTimeline(file_name, flush_every=Pdc.flush_every, flush_interval=Pdc.flush_interval)
+    LOG.info(f"Watching pods in {namespace} for {duration}s, timeline written to {file_name}")
+
+    try:
+        for event in watch_events(client.CoreV1Api().list_namespaced_pod, namespace, duration=duration,
+                                  page_size=Pdc.page_size, label_selector=Pdc.label_selector,
+                                  field_selector=Pdc.field_selector):
+            timeline.observe(event['type'], event['object'])
+    finally:
+        timeline.flush()
+
+    restarts = timeline.restarts()
+    if restarts:
+        headers = ['Time', 'Pod', 'Container', 'Event', 'Delta', 'Reason']
+        print(tabulate([[entry[header] for header in headers] for entry in restarts],
+                       headers=headers, tablefmt="grid"), "\n\n")
+        counts = {}
+        for entry in restarts:
+            key = (entry['Pod'], entry['Container'])
+            counts[key] = counts.get(key, 0) + entry['Delta']
+        report_restart_context(namespace, [[pod, container, count] for (pod, container), count in counts.items()],
+                               [])
+        LOG.error("Restarts detected in pods")
+        LOG.error("Failing this job")
+        assert False
+    LOG.info("No Pods restart detected")
+
+
+@exception_handler(LOG)
+@instrumented
 def create_pod_state(namespace):
     """
-    Return a dictionary with containers restart count
+    Return the restart count, lineage, node, image and last termination reason of every container
     :param namespace:
-    :type namespace:
+    :type namespace: str
     :return:
-    :rtype: json
+    :rtype: list
     """
-    # Get the list of all pods in the namespace
-    k8s_cli = K8sApiClient()
-    resp = k8s_cli.list_namespaced_pod(namespace)
+    # The client loads the kube config used by the paginated list calls
+    K8sApiClient()
+    selectors = {'label_selector': Pdc.label_selector, 'field_selector': Pdc.field_selector}
 
-    # Initialize an empty list to hold the pod data
-    pod_data = []
+    cache = shared_cache()
+    if cache is None:
+        # Stream the pods of the namespace page by page, keeping only the restart counts
+        return fetch_pod_records(namespace, **selectors)[0]
 
-    for pod in resp.items:
-        for status in pod.status.container_statuses:
-            # Create a dictionary for each pod
+    # Restart counts must be current: cached entries are always revalidated before use
+    pod_data = cache.get_or_fetch(
+        (current_context(), namespace, 'pods', f"{Pdc.label_selector or ''}|{Pdc.field_selector or ''}"),
+        fetch=lambda: fetch_pod_records(namespace, **selectors),
+        revalidate=lambda version: unchanged_since(client.CoreV1Api().list_namespaced_pod, namespace,
+                                                   resource_version=version, **selectors),
+        ttl=0)
+    cache.log_stats()
+    return pod_data
 
-            pod_dict = {
-                "Pod": pod.metadata.name,
-                "Container": status.name,
-                "Restarts": status.restart_count
-            }
 
-            pod_data.append(pod_dict)
+def fetch_pod_records(namespace, **selectors):
+    """
+    Return the container records of a namespace and the resourceVersion of the pod list
+    :param namespace:
+    :type namespace: str
+    :return:
+    :rtype: tuple
+    """
+    if async_enabled():
+        return run_with_client(lambda api: fetch_pod_records_async(api, namespace, **selectors))
+    pod_data = []
+    resource_version = None
+    raw = raw_lists_enabled()
+    list_func = client.CoreV1Api().list_namespaced_pod
+    # Raw pages are projected straight into records, without building V1Pod objects
+    for page in paginate_pages(raw_list_func(list_func) if raw else list_func, namespace,
+                               page_size=Pdc.page_size, **selectors):
+        resource_version = resource_version or page.metadata.resource_version
+        pod_data.extend(raw_pod_records(page.items) if raw else pod_records(page.items))
+    return pod_data, resource_version
 
-    # Serialize the list to a JSON formatted string
-    json_data = json.dumps(pod_data, indent=4)
 
-    return json_data
+async def fetch_pod_records_async(api, namespace, **selectors):
+    """
+    Return the container records of a namespace and the resourceVersion of the pod list, see fetch_pod_records
+    :param api:
+    :type api: AsyncK8sClient
+    :param namespace:
+    :type namespace: str
+    :return:
+    :rtype: tuple
+    """
+    pod_data = []
+    resource_version = None
+    async for page in api.list_pages(RESOURCE_PATHS['pods'], namespace, page_size=Pdc.page_size, **selectors):
+        resource_version = resource_version or page.metadata.resource_version
+        pod_data.extend(raw_pod_records(page.items))
+    return pod_data, resource_version
 
 
 @exception_handler(LOG)
-def detect_pod_restart(initial_pod_data, final_pod_data):
+@instrumented
+def detect_pod_restart(initial_pod_data, final_pod_data, namespace=None, fail_on_recreated=None):
     """
-    Compare initial and final state of pods and detect restarts
+    Compare initial and final state of pods and detect restarts; pods recreated
+    under a new name by their workload are reported as well
     :param initial_pod_data:
-    :type initial_pod_data: dict
+    :type initial_pod_data: list
     :param final_pod_data:
-    :type final_pod_data: dict
-    :return:
-    :rtype:
+    :type final_pod_data: list
+    :param namespace: when given, the events and previous logs of restarted pods are added to the report
+    :type namespace: str
+    :param fail_on_recreated: count recreated pods as restarts, POD_FAIL_ON_RECREATED by default
+    :type fail_on_recreated: bool
+    :return: True if containers restarted, or pods were recreated and fail_on_recreated is set
+    :rtype: bool
     """
-    # Compare the old and new pod data
+    if fail_on_recreated is None:
+        fail_on_recreated = Pdc.fail_on_recreated
+    LOG.info("Searching for unexpected pod restarts\n\n")
+    restarts, changes = compare_pod_states(initial_pod_data, final_pod_data)
 
-    faulty_pod_count = 0
-    pod_data = []
-    # printout headers
-    headers = ['Pod', 'Container', 'Restarts']
+    if changes:
+        LOG.info("Pods deleted, recreated or added during the pipeline:")
+        print(tabulate(changes, headers=['Pod', 'Owner', 'Change', 'Replacement'], tablefmt="grid"), "\n\n")
 
-    LOG.info("Searching for unexpected pod restarts\n\n")
-    for initial_pod in initial_pod_data:
-        for final_pod in final_pod_data:
-
-            if (initial_pod["Pod"] == final_pod["Pod"] and
-                    initial_pod["Container"] == final_pod["Container"]):
-
-                if initial_pod["Restarts"] != final_pod["Restarts"]:
-                    restarts = final_pod['Restarts'] - initial_pod['Restarts']
-                    pod = [final_pod['Pod'], final_pod['Container'], restarts]
-                    pod_data.append(pod)
-                    faulty_pod_count += 1
-
-    if faulty_pod_count > 0:
-        print(tabulate(pod_data, headers=headers, tablefmt="grid", numalign="center"), "\n\n")
-        return True
-    return False
+    recreated = [change for change in changes if change[2] == RECREATED]
+    if restarts:
+        print(tabulate(restarts, headers=['Pod', 'Container', 'Restarts'], tablefmt="grid", numalign="center"), "\n\n")
+    if recreated and not fail_on_recreated:
+        LOG.warning(f"{len(recreated)} pods were recreated, set POD_FAIL_ON_RECREATED to fail on them")
+    if namespace and (restarts or recreated):
+        report_restart_context(namespace, restarts, [change for change in changes if change[2] != ADDED])
+    return bool(restarts or (recreated and fail_on_recreated))
+
+
+@exception_handler(LOG)
+@instrumented
+def report_restart_context(namespace, restarts, changes):
+    """
+    List the events of the namespace once and read the previous logs of the restarted containers
+    concurrently, print the event reasons per restart and write both to the restart context file
+    :param namespace:
+    :type namespace: str
+    :param restarts: [Pod, Container, Restarts] rows
+    :type restarts: list
+    :param changes: [Pod, Owner, Change, Replacement] rows
+    :type changes: list
+    """
+    containers = [(pod, container) for pod, container, _ in restarts]
+    if async_enabled():
+        # The event list and all log reads share one event loop and connection pool
+        events, logs = run_with_client(lambda api: async_events_and_logs(
+            api, namespace, containers, Pdc.log_tail_lines, Pdc.log_limit_bytes, page_size=Pdc.page_size,
+            call_timeout=Pdc.log_timeout), call_timeout=Pdc.log_timeout)
+    else:
+        try:
+            events = index_events(list_events(namespace, page_size=Pdc.page_size))
+        except ApiException as err:
+            LOG.warning(f"Events of {namespace} not available: {err.status} {err.reason}")
+            events = {}
+        logs = fetch_previous_logs(namespace, containers, tail_lines=Pdc.log_tail_lines,
+                                   limit_bytes=Pdc.log_limit_bytes, max_workers=Pdc.log_workers,
+                                   call_timeout=Pdc.log_timeout)
+    context = restart_context(events, logs, restarts, changes)
+
+    table = [[entry['Pod'], entry['Container'], entry['Restarts'], event_summary(entry['Events']),
+              (entry['Previous Log'].strip().splitlines() or [''])[-1][:120]]
+             for entry in context['restarts']]
+    table += [[entry['Pod'], '', entry['Change'], event_summary(entry['Events']), '']
+              for entry in context['changes']]
+    if table:
+        print(tabulate(table, headers=['Pod', 'Container', 'Restarts', 'Events', 'Last Log Line'],
+                       tablefmt="grid"), "\n\n")
+
+    file_name = context_file_name()
+    with open(file_name, 'w') as file:
+        json.dump({'namespace': namespace, **context}, file, indent=2)
+    LOG.info(f"Events of {len(events)} objects and {len(logs)} previous logs written to {file_name}")
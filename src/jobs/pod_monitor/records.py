@@ -0,0 +1,72 @@
+"""
+Flatten pods into the per container records of a pod state
+"""
+from collections import namedtuple
+
+from src.jobs.pod_monitor.restart_index import pod_lineage
+
+# Owner reference fields used by pod_lineage, built from raw API responses
+OwnerReference = namedtuple('OwnerReference', 'kind name controller')
+
+
+def pod_records(pods):
+    """
+    Flatten pods into one record per container
+    :param pods: iterable of V1Pod objects
+    :type pods: iterable
+    :return:
+    :rtype: list
+    """
+    # Initialize an empty list to hold the pod data
+    pod_data = []
+
+    for pod in pods:
+        owner = pod_lineage(pod.metadata.owner_references, pod.metadata.labels)
+        for status in pod.status.container_statuses or []:
+            # Create a dictionary for each pod
+
+            terminated = status.last_state.terminated if status.last_state else None
+            pod_dict = {
+                "Pod": pod.metadata.name,
+                "Container": status.name,
+                "Restarts": status.restart_count,
+                "Owner": owner,
+                "Uid": pod.metadata.uid,
+                "Node": pod.spec.node_name,
+                "Image": status.image,
+                "Reason": terminated.reason if terminated else ''
+            }
+
+            pod_data.append(pod_dict)
+
+    return pod_data
+
+
+def raw_pod_records(pods):
+    """
+    Flatten pods parsed from the raw API response into one record per container, see pod_records
+    :param pods: pods as sent by the API server, with camelCase keys
+    :type pods: iterable
+    :return:
+    :rtype: list
+    """
+    pod_data = []
+    for pod in pods:
+        metadata = pod['metadata']
+        owner_references = [OwnerReference(ref.get('kind'), ref.get('name'), ref.get('controller', False))
+                            for ref in metadata.get('ownerReferences') or []]
+        owner = pod_lineage(owner_references, metadata.get('labels'))
+        node = (pod.get('spec') or {}).get('nodeName')
+        for status in (pod.get('status') or {}).get('containerStatuses') or []:
+            terminated = (status.get('lastState') or {}).get('terminated')
+            pod_data.append({
+                "Pod": metadata['name'],
+                "Container": status['name'],
+                "Restarts": status.get('restartCount', 0),
+                "Owner": owner,
+                "Uid": metadata.get('uid'),
+                "Node": node,
+                "Image": status.get('image'),
+                "Reason": (terminated.get('reason') or '') if terminated else ''
+            })
+    return pod_data
@@ -0,0 +1,116 @@
+"""
+Linear time comparison of pod state snapshots
+"""
+from collections import defaultdict
+
+RESTARTED = 'Restarted'
+RECREATED = 'Recreated'
+DELETED = 'Deleted'
+ADDED = 'Added'
+
+
+def pod_lineage(owner_references, labels):
+    """
+    Return the workload a pod belongs to, following ReplicaSets up to their Deployment
+    :param owner_references: pod metadata owner references
+    :type owner_references: list
+    :param labels: pod metadata labels
+    :type labels: dict
+    :return: "<Kind>/<name>" of the owning workload, empty for bare pods
+    :rtype: str
+    """
+    controller = next((ref for ref in owner_references or [] if getattr(ref, 'controller', False)), None)
+    if controller is None:
+        return ''
+    kind, name = controller.kind, controller.name
+    template_hash = (labels or {}).get('pod-template-hash')
+    if kind == 'ReplicaSet' and template_hash and name.endswith(f'-{template_hash}'):
+        return f"Deployment/{name[:-len(template_hash) - 1]}"
+    return f"{kind}/{name}"
+
+
+def _index(pod_data):
+    """Index snapshot records by (pod, container) and pods by name."""
+    containers = {}
+    pods = {}
+    for record in pod_data:
+        containers[(record['Pod'], record['Container'])] = record
+        pods.setdefault(record['Pod'], record)
+    return containers, pods
+
+
+def compare_pod_states(initial_pod_data, final_pod_data):
+    """
+    Compare two snapshots and classify every change
+    :param initial_pod_data: records with Pod, Container, Restarts and optional Owner/Uid
+    :type initial_pod_data: list
+    :param final_pod_data: records with Pod, Container, Restarts and optional Owner/Uid
+    :type final_pod_data: list
+    :return: tuple of container restarts [Pod, Container, Restarts] and
+             pod changes [Pod, Owner, Change, Replacement]
+    :rtype: tuple
+    """
+    initial_containers, initial_pods = _index(initial_pod_data)
+    final_containers, final_pods = _index(final_pod_data)
+
+    restarts = []
+    changes = []
+    recreated_in_place = set()
+
+    for pod, record in final_pods.items():
+        initial = initial_pods.get(pod)
+        if initial is not None and initial.get('Uid') != record.get('Uid'):
+            # Same name, new object: StatefulSet pods keep their name but reset restart counts
+            recreated_in_place.add(pod)
+            changes.append([pod, record.get('Owner', ''), RECREATED, pod])
+
+    for key, record in final_containers.items():
+        initial = initial_containers.get(key)
+        if initial is None or key[0] in recreated_in_place:
+            continue
+        if record['Restarts'] != initial['Restarts']:
+            restarts.append([record['Pod'], record['Container'], record['Restarts'] - initial['Restarts']])
+
+    deleted = defaultdict(list)
+    added = defaultdict(list)
+    for pod, record in initial_pods.items():
+        if pod not in final_pods:
+            deleted[record.get('Owner', '')].append(pod)
+    for pod, record in final_pods.items():
+        if pod not in initial_pods:
+            added[record.get('Owner', '')].append(pod)
+
+    for owner, pods in deleted.items():
+        replacements = sorted(added.pop(owner, [])) if owner else []
+        for index, pod in enumerate(sorted(pods)):
+            if index < len(replacements):
+                changes.append([pod, owner, RECREATED, replacements[index]])
+            else:
+                changes.append([pod, owner, DELETED, ''])
+        for pod in replacements[len(pods):]:
+            changes.append([pod, owner, ADDED, ''])
+    for owner, pods in added.items():
+        for pod in sorted(pods):
+            changes.append([pod, owner, ADDED, ''])
+
+    return restarts, changes
+
+
+def interval_restarts(snapshots):
+    """
+    Compare every snapshot with the one before it, so restarts that happen between the
+    first and last snapshots are attributed to the interval they happened in
+    :param snapshots: (timestamp, {(pod, container): record}) pairs in time order
+    :type snapshots: iterable
+    :return: [Time, Pod, Container, Restarts] rows, Time being the end of the interval
+    :rtype: list
+    """
+    rows = []
+    previous = None
+    for timestamp, state in snapshots:
+        current = list(state.values())
+        if previous is not None:
+            restarts, _ = compare_pod_states(previous, current)
+            rows.extend([timestamp] + restart for restart in restarts)
+        previous = current
+    return rows
@@ -0,0 +1,247 @@
+"""
+Compact, versioned binary file of pod state snapshots
+
+Layout: MAGIC, format version byte, then a sequence of frames
+``<type byte><payload length varint><payload>``:
+
+* ``S`` appends strings to the interned string table (id 0 is always "")
+* ``F`` full snapshot: timestamp, record count, records
+* ``D`` delta against the previous snapshot: timestamp, upserted records, removed keys
+
+Records store every field as a varint, strings as string table ids, so a
+snapshot of unchanged pods costs a few bytes and a delta only carries the
+containers whose state changed.
+"""
+import os
+import time
+
+MAGIC = b'PODSNAP'
+VERSION = 1
+STRINGS, FULL, DELTA = b'S', b'F', b'D'
+FIELDS = ('Pod', 'Container', 'Restarts', 'Owner', 'Uid', 'Node', 'Image', 'Reason')
+INT_FIELDS = frozenset(['Restarts'])
+
+
+def _write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _read_stream_varint(file):
+    result = shift = 0
+    while True:
+        byte = file.read(1)
+        if not byte:
+            raise EOFError
+        result |= (byte[0] & 0x7f) << shift
+        if not byte[0] & 0x80:
+            return result
+        shift += 7
+
+
+def _key(record):
+    return record['Pod'], record['Container']
+
+
+class SnapshotReader:
+    """
+    Lazily read a snapshot file: frame headers are scanned on demand and
+    payloads are only decoded while replaying up to the requested snapshot
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+    def _frames(self):
+        """Yield (type, payload) for every frame in the file."""
+        with open(self.file_name, 'rb') as file:
+            header = file.read(len(MAGIC) + 1)
+            if header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.file_name} is not a pod snapshot file")
+            if header[len(MAGIC)] != VERSION:
+                raise ValueError(f"Unsupported pod snapshot version {header[len(MAGIC)]}")
+            while True:
+                frame_type = file.read(1)
+                if not frame_type:
+                    return
+                try:
+                    length = _read_stream_varint(file)
+                except EOFError:
+                    return
+                payload = file.read(length)
+                if len(payload) < length:
+                    # Truncated trailing frame from an interrupted write
+                    return
+                yield frame_type, payload
+
+    @staticmethod
+    def _decode_strings(payload, strings):
+        count, pos = _read_varint(payload, 0)
+        for _ in range(count):
+            length, pos = _read_varint(payload, pos)
+            strings.append(payload[pos:pos + length].decode())
+            pos += length
+
+    @staticmethod
+    def _decode_record(payload, pos, strings):
+        record = {}
+        for field in FIELDS:
+            value, pos = _read_varint(payload, pos)
+            record[field] = value if field in INT_FIELDS else strings[value]
+        return record, pos
+
+    def snapshots(self):
+        """
+        Replay the file, yielding (timestamp, state) after every snapshot frame
+        :return: generator of (epoch seconds, {(pod, container): record})
+        :rtype: generator
+        """
+        strings = ['']
+        state = {}
+        for frame_type, payload in self._frames():
+            if frame_type == STRINGS:
+                self._decode_strings(payload, strings)
+                continue
+            timestamp, pos = _read_varint(payload, 0)
+            count, pos = _read_varint(payload, pos)
+            if frame_type == FULL:
+                state = {}
+            for _ in range(count):
+                record, pos = self._decode_record(payload, pos, strings)
+                state[_key(record)] = record
+            if frame_type == DELTA:
+                removed, pos = _read_varint(payload, pos)
+                for _ in range(removed):
+                    pod, pos = _read_varint(payload, pos)
+                    container, pos = _read_varint(payload, pos)
+                    state.pop((strings[pod], strings[container]), None)
+            yield timestamp / 1000, state
+            state = dict(state)
+
+    def timestamps(self):
+        """Return the timestamps of all snapshots without decoding records."""
+        stamps = []
+        for frame_type, payload in self._frames():
+            if frame_type in (FULL, DELTA):
+                stamps.append(_read_varint(payload, 0)[0] / 1000)
+        return stamps
+
+    def load(self, index=-1):
+        """
+        Return the records of one snapshot, by default the latest
+        :param index: position of the snapshot, negative values count from the end
+        :type index: int
+        :return: list of records
+        :rtype: list
+        """
+        if index < 0:
+            index += len(self.timestamps())
+        for position, (_, state) in enumerate(self.snapshots()):
+            if position == index:
+                return list(state.values())
+        raise IndexError(f"Snapshot {index} not found in {self.file_name}")
+
+
+class SnapshotWriter:
+    """Append full or delta pod snapshots to a snapshot file."""
+
+    def __init__(self, file_name, full_every=60):
+        self.file_name = file_name
+        self.full_every = full_every
+        self.strings = {'': 0}
+        self.state = {}
+        self.since_full = 0
+        if os.path.isfile(file_name) and os.path.getsize(file_name):
+            self._resume()
+        else:
+            with open(file_name, 'wb') as file:
+                file.write(MAGIC + bytes([VERSION]))
+
+    def _resume(self):
+        """Rebuild the string table and last state from an existing file."""
+        reader = SnapshotReader(self.file_name)
+        strings = ['']
+        for frame_type, payload in reader._frames():  # pylint: disable=protected-access
+            if frame_type == STRINGS:
+                reader._decode_strings(payload, strings)  # pylint: disable=protected-access
+            self.since_full = 0 if frame_type == FULL else self.since_full + (frame_type == DELTA)
+        self.strings = {value: index for index, value in enumerate(strings)}
+        for _, state in reader.snapshots():
+            self.state = state
+
+    def _intern(self, value, new_strings):
+        value = '' if value is None else str(value)
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+            new_strings.append(value)
+        return index
+
+    def _encode_record(self, buffer, record, new_strings):
+        for field in FIELDS:
+            value = record.get(field)
+            _write_varint(buffer, int(value or 0) if field in INT_FIELDS else self._intern(value, new_strings))
+
+    def append(self, records, timestamp=None):
+        """
+        Append a snapshot, written as a delta against the previous one when possible
+        :param records: pod container records as returned by create_pod_state
+        :type records: list
+        :param timestamp: epoch seconds, defaults to now
+        :type timestamp: float
+        """
+        state = {_key(record): {field: record.get(field, 0 if field in INT_FIELDS else '') for field in FIELDS}
+                 for record in records}
+        full = not self.state or self.since_full >= self.full_every
+        new_strings = []
+        body = bytearray()
+        _write_varint(body, int((time.time() if timestamp is None else timestamp) * 1000))
+
+        if full:
+            upserts, removed = list(state.values()), []
+            self.since_full = 0
+        else:
+            upserts = [record for key, record in state.items() if self.state.get(key) != record]
+            removed = [key for key in self.state if key not in state]
+            self.since_full += 1
+
+        _write_varint(body, len(upserts))
+        for record in upserts:
+            self._encode_record(body, record, new_strings)
+        if not full:
+            _write_varint(body, len(removed))
+            for pod, container in removed:
+                _write_varint(body, self._intern(pod, new_strings))
+                _write_varint(body, self._intern(container, new_strings))
+
+        out = bytearray()
+        if new_strings:
+            table = bytearray()
+            _write_varint(table, len(new_strings))
+            for value in new_strings:
+                encoded = value.encode()
+                _write_varint(table, len(encoded))
+                table += encoded
+            out += STRINGS
+            _write_varint(out, len(table))
+            out += table
+        out += FULL if full else DELTA
+        _write_varint(out, len(body))
+        out += body
+
+        with open(self.file_name, 'ab') as file:
+            file.write(out)
+        self.state = state
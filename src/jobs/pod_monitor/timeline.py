@@ -0,0 +1,94 @@
+"""
+Restart and OOMKilled timeline built from pod watch events
+"""
+import json
+import time
+from datetime import datetime, timezone
+
+from src.jobs.pod_monitor.restart_index import pod_lineage
+from src.utils.k8s_watch import SYNC
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _termination(status):
+    """Return the reason, exit code and finish time of the last container termination."""
+    terminated = status.last_state.terminated if status.last_state else None
+    if terminated is None:
+        return '', None, ''
+    finished_at = terminated.finished_at.isoformat() if terminated.finished_at else ''
+    return terminated.reason or '', terminated.exit_code, finished_at
+
+
+class RestartTimeline:
+    """
+    Keep the restart history of every container seen on a pod watch stream
+    and append new entries to a JSON lines file
+    """
+
+    def __init__(self, file_name, flush_every=50, flush_interval=30):
+        self.file_name = file_name
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.restart_counts = {}
+        self.events = []
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def observe(self, event_type, pod):
+        """
+        Record restarts and deletions carried by a single watch event
+        :param event_type: SYNC, ADDED, MODIFIED or DELETED
+        :type event_type: str
+        :param pod: V1Pod object of the event
+        :type pod: object
+        """
+        name = pod.metadata.name
+        owner = pod_lineage(pod.metadata.owner_references, pod.metadata.labels)
+        if event_type == 'DELETED':
+            self._record({'Time': _utc_now(), 'Pod': name, 'Owner': owner, 'Event': 'Deleted'})
+            for key in [key for key in self.restart_counts if key[0] == name]:
+                del self.restart_counts[key]
+            return
+
+        for status in pod.status.container_statuses or []:
+            key = (name, status.name)
+            previous = self.restart_counts.get(key)
+            self.restart_counts[key] = status.restart_count
+            if previous is None:
+                # First sight of the container after a (re)list sets the baseline
+                if event_type == SYNC or not status.restart_count:
+                    continue
+                previous = 0
+            if status.restart_count > previous:
+                reason, exit_code, finished_at = _termination(status)
+                self._record({
+                    'Time': _utc_now(), 'Pod': name, 'Container': status.name, 'Owner': owner,
+                    'Event': 'OOMKilled' if reason == 'OOMKilled' else 'Restarted',
+                    'Restarts': status.restart_count, 'Delta': status.restart_count - previous,
+                    'Reason': reason, 'ExitCode': exit_code, 'FinishedAt': finished_at
+                })
+        self.maybe_flush()
+
+    def _record(self, entry):
+        self.events.append(entry)
+        self._pending.append(entry)
+
+    def restarts(self):
+        """Return the recorded restart and OOMKilled entries."""
+        return [event for event in self.events if event['Event'] != 'Deleted']
+
+    def maybe_flush(self):
+        """Flush when enough entries are pending or the flush interval has passed."""
+        if len(self._pending) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Append pending entries to the timeline file."""
+        if self._pending:
+            with open(self.file_name, 'a') as file:
+                file.writelines(json.dumps(entry) + '\n' for entry in self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
@@ -0,0 +1,45 @@
+"""
+Lazy job registry: jobs are registered by import path and imported only when selected
+"""
+import importlib
+
+# Jenkins job name -> "module:function"; main.py is called with the JOB_NAME of the pipeline
+JOBS = {
+    'ro_non_funct_resources_monitor': 'src.jobs.monitor_resources.monitor_resources:resource_monitor',
+    'resource_monitor_fleet': 'src.jobs.monitor_resources.fleet:resource_monitor_fleet',
+    'resource_drift_trend': 'src.jobs.monitor_resources.monitor_resources:resource_drift_trend',
+    'pod_restart_monitor': 'src.jobs.pod_monitor.pod_monitor:pod_restart_monitor',
+    'exec_probes_in_pods': 'src.jobs.ro_non_funct_test.test:exec_probes_in_pods',
+}
+
+# Seconds allowed for interpreter-level imports before a job starts
+STARTUP_BUDGET = 1.5
+
+
+def _legacy_jobs():
+    """Jobs registered eagerly in lib.jobs, imported only for names missing here."""
+    from lib.jobs import JOBS as LEGACY_JOBS  # pylint: disable=import-outside-toplevel
+    return LEGACY_JOBS
+
+
+def job_names():
+    """
+    Return the names of all available jobs
+    :return:
+    :rtype: list
+    """
+    return sorted(set(JOBS) | set(_legacy_jobs()))
+
+
+def load_job(name):
+    """
+    Import and return the function of a job
+    :param name: job name
+    :type name: str
+    :return: job function, None for unknown jobs
+    :rtype: callable
+    """
+    if name in JOBS:
+        module_path, func_name = JOBS[name].split(':')
+        return getattr(importlib.import_module(module_path), func_name)
+    return _legacy_jobs().get(name)
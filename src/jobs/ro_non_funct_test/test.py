@@ -1,16 +1,29 @@
 """
 Test module
 """
+import json
+
+from tabulate import tabulate
 from lib.utils.error_handler import exception_handler
 from lib.utils.k8s_api_client import K8sApiClient
 from lib.utils.env_data import get_env_var
 from lib.utils.logger import Logger
+from src.utils.instrumentation import instrumented
+from src.utils.k8s_exec import probe_skipped, run_probes
+from src.utils.k8s_pager import list_namespaced_pods
 
 
 LOG = Logger.get_logger(__name__)
 
+# Defaults of the fleet-wide probe job
+PROBE_COMMANDS = 'df -h;free -m'
+PROBE_STREAMS = 8
+PROBE_TIMEOUT = 30
+PROBE_RESULTS_FILE = 'pod_probes.json'
+
 
 @exception_handler(LOG)
+@instrumented
 def exec_command_in_pod():
     """
     Test method
@@ -27,3 +40,55 @@ def exec_command_in_pod():
 
     # LOG.info("Response: \n%s", resp)
     LOG.info("Function 1 completed")
+
+
+@exception_handler(LOG)
+@instrumented
+def exec_probes_in_pods():
+    """
+    Run the probe commands in every running pod matching PROBE_SELECTOR
+    and write the parsed results to pod_probes.json
+    """
+    namespace = get_env_var('NAMESPACE')
+    selector = get_env_var('PROBE_SELECTOR')
+    container_name = get_env_var('PROBE_CONTAINER')
+    commands = [cmd.strip() for cmd in (get_env_var('PROBE_COMMANDS') or PROBE_COMMANDS).split(';') if cmd.strip()]
+    streams = int(get_env_var('PROBE_STREAMS') or PROBE_STREAMS)
+    timeout = float(get_env_var('PROBE_TIMEOUT') or PROBE_TIMEOUT)
+
+    # The client loads the kube config used by the list and exec calls
+    K8sApiClient()
+    targets = []
+    for pod in list_namespaced_pods(namespace, label_selector=selector, field_selector='status.phase=Running'):
+        containers = [container.name for container in pod.spec.containers]
+        if container_name:
+            containers = [name for name in containers if name == container_name]
+        targets.extend((pod.metadata.name, name) for name in containers[:1])
+    LOG.info(f"Running {commands} in {len(targets)} containers with up to {streams} open streams")
+
+    probes = run_probes(targets, commands, namespace, max_streams=streams, timeout=timeout)
+    with open(PROBE_RESULTS_FILE, 'w') as file:
+        json.dump(probes, file, indent=2)
+
+    table = []
+    for probe in probes:
+        for mount in probe.get('result', {}).get('mounts', []):
+            table.append([probe['pod'], mount['mount'], mount['use_percent']])
+    if table:
+        print(tabulate(sorted(table, key=lambda row: -(row[2] or 0)), headers=['Pod', 'Mount', 'Use%'], tablefmt='grid'))
+
+    # Containers that cannot run the command, e.g. distroless ones without a shell, are skipped;
+    # a probe cut off by the timeout has no exit code and did not succeed
+    skipped = [probe for probe in probes if probe_skipped(probe)]
+    failed = [probe for probe in probes if not probe_skipped(probe) and
+              ('error' in probe or probe.get('timed_out') or probe['exit_code'] is None or probe['exit_code'])]
+    for probe in skipped:
+        LOG.warning(f"Probe {probe['command']!r} skipped in {probe['pod']}/{probe['container']}: "
+                    f"{probe.get('error') or probe.get('exit_code') or probe.get('stderr', '').strip()}")
+    LOG.info(f"{len(probes) - len(failed) - len(skipped)} of {len(probes)} probes succeeded, "
+             f"{len(skipped)} skipped, results in {PROBE_RESULTS_FILE}")
+    if failed:
+        for probe in failed:
+            LOG.error(f"Probe {probe['command']!r} failed in {probe['pod']}/{probe['container']}: "
+                      f"{probe.get('error') or ('timeout' if probe.get('timed_out') else probe['exit_code'])}")
+        raise RuntimeError(f"{len(failed)} of {len(probes)} probes failed")
@@ -0,0 +1,89 @@
+"""
+Bounded fan-out of blocking calls over a thread pool
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# How often the scheduler wakes up to check running calls against their timeout
+POLL_INTERVAL = 0.5
+
+
+class CallResult:
+    """Outcome of a single call submitted to run_bounded."""
+    __slots__ = ('key', 'value', 'error', 'latency', 'timed_out')
+
+    def __init__(self, key, value=None, error=None, latency=0.0, timed_out=False):
+        self.key = key
+        self.value = value
+        self.error = error
+        self.latency = latency
+        self.timed_out = timed_out
+
+    @property
+    def ok(self):
+        """True when the call returned without error or timeout."""
+        return self.error is None and not self.timed_out
+
+
+def run_bounded(calls, max_workers=4, call_timeout=None):
+    """
+    Run blocking calls concurrently with at most max_workers in flight.
+    A call past call_timeout is reported as timed out but its worker thread cannot be
+    interrupted and keeps running, delaying interpreter exit; calls should carry their
+    own socket timeout (_request_timeout for the kubernetes client) so that they end
+    :param calls: mapping of key to zero-argument callable
+    :type calls: dict
+    :param max_workers: upper bound on concurrently running calls
+    :type max_workers: int
+    :param call_timeout: seconds a call may run once started, None for no limit
+    :type call_timeout: float
+    :return: mapping of key to CallResult, in the order of calls
+    :rtype: dict
+    """
+    results = {}
+    started = {}
+    lock = threading.Lock()
+
+    def _timed(key, func):
+        begin = time.monotonic()
+        with lock:
+            started[key] = begin
+        value = func()
+        return value, time.monotonic() - begin
+
+    def _started(key):
+        with lock:
+            return started.get(key)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        pending = {executor.submit(_timed, key, func): key for key, func in calls.items()}
+        while pending:
+            done, _ = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    value, latency = future.result()
+                    results[key] = CallResult(key, value=value, latency=latency)
+                except Exception as err:  # pylint: disable=broad-except
+                    latency = time.monotonic() - (_started(key) or time.monotonic())
+                    logging.error("Call %s failed after %.2fs: %s", key, latency, err)
+                    results[key] = CallResult(key, error=err, latency=latency)
+
+            if call_timeout is None:
+                continue
+            now = time.monotonic()
+            for future, key in list(pending.items()):
+                begin = _started(key)
+                if begin is not None and now - begin > call_timeout:
+                    # The worker thread cannot be interrupted; stop waiting for it
+                    future.cancel()
+                    pending.pop(future)
+                    logging.error("Call %s timed out after %ss", key, call_timeout)
+                    results[key] = CallResult(key, latency=now - begin, timed_out=True)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return {key: results[key] for key in calls}
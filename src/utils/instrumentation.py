@@ -0,0 +1,283 @@
+"""
+Per-stage timings, API traffic and memory of a job run
+
+Stages are functions decorated with instrumented, stacked below exception_handler:
+
+    @exception_handler(LOG)
+    @instrumented
+    def create_pod_state(namespace):
+
+Every call of a stage adds its wall and CPU time, the Kubernetes API calls made and
+bytes received meanwhile (by any thread) and the peak RSS of the process. Nested
+stages are inclusive.
+
+API calls are counted on every client path: REST requests and watches of the
+kubernetes client once install_api_counter is installed, and the async client and
+the exec websockets of k8s_exec, which bypass the REST client, count their own. export_metrics writes the totals as a Prometheus textfile and
+a JSON summary, configured by METRICS_TEXTFILE / METRICS_JSON by default.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+METRIC_PREFIX = 'eo_nf_job'
+
+_lock = threading.Lock()
+# Process wide API traffic since start, read before and after each stage
+_traffic = {'api_calls': 0, 'bytes_received': 0}
+# stage name -> StageMetrics
+STAGES = {}
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of the process
+    :return: bytes, 0 when unknown
+    :rtype: int
+    """
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def count_api_call():
+    """Add an API call to the process totals."""
+    with _lock:
+        _traffic['api_calls'] += 1
+
+
+def count_bytes(bytes_received):
+    """Add bytes read from an API response to the process totals."""
+    with _lock:
+        _traffic['bytes_received'] += bytes_received
+
+
+def traffic():
+    """Return a copy of the process API call and received bytes totals."""
+    with _lock:
+        return dict(_traffic)
+
+
+class StageMetrics:
+    """Totals of all calls of one stage."""
+    __slots__ = ('name', 'calls', 'errors', 'wall_seconds', 'cpu_seconds', 'api_calls', 'bytes_received',
+                 'peak_rss_bytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.api_calls = 0
+        self.bytes_received = 0
+        self.peak_rss_bytes = 0
+
+    def as_dict(self):
+        """
+        Return the totals keyed by their attribute names, as exported in the JSON summary
+        :return:
+        :rtype: dict
+        """
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def instrumented(func=None, *, stage=None):
+    """
+    Record the calls of a function as a stage, see the module docstring
+    :param func: decorated function
+    :type func: callable
+    :param stage: stage name, the qualified function name by default
+    :type stage: str
+    :return:
+    :rtype: callable
+    """
+    if func is None:
+        return functools.partial(instrumented, stage=stage)
+    name = stage or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        before = traffic()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        failed = True
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            after = traffic()
+            rss = peak_rss()
+            with _lock:
+                metrics = STAGES.setdefault(name, StageMetrics(name))
+                metrics.calls += 1
+                metrics.errors += failed
+                metrics.wall_seconds += wall
+                metrics.cpu_seconds += cpu
+                metrics.api_calls += after['api_calls'] - before['api_calls']
+                metrics.bytes_received += after['bytes_received'] - before['bytes_received']
+                metrics.peak_rss_bytes = max(metrics.peak_rss_bytes, rss)
+    return wrapper
+
+
+class _CountingResponse:
+    """Count the bytes of a urllib3 response as they are read, whether preloaded, raw or streamed."""
+
+    def __init__(self, response):
+        self._response = response
+        self._counted = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    @property
+    def data(self):
+        data = self._response.data
+        if not self._counted:
+            self._counted = True
+            count_bytes(len(data or b''))
+        return data
+
+    def read(self, *args, **kwargs):
+        data = self._response.read(*args, **kwargs)
+        count_bytes(len(data or b''))
+        return data
+
+    def stream(self, *args, **kwargs):
+        for chunk in self._response.stream(*args, **kwargs):
+            count_bytes(len(chunk))
+            yield chunk
+
+
+def install_api_counter():
+    """
+    Count the calls and received bytes of every request made through the REST client of the kubernetes
+    client; exec websockets do not go through it and are counted by k8s_exec
+    :return: False when already installed
+    :rtype: bool
+    """
+    from kubernetes.client import rest  # pylint: disable=import-outside-toplevel
+    request = rest.RESTClientObject.request
+    if getattr(request, 'instrumented', False):
+        return False
+
+    @functools.wraps(request)
+    def counted_request(self, *args, **kwargs):
+        response = request(self, *args, **kwargs)
+        count_api_call()
+        # Deserialized calls read response.data, raw (_preload_content=False) calls get the response itself
+        response.response = _CountingResponse(response.response)
+        return response
+    counted_request.instrumented = True
+    rest.RESTClientObject.request = counted_request
+    return True
+
+
+def enable_instrumentation():
+    """Count API traffic when an export is configured by METRICS_TEXTFILE or METRICS_JSON."""
+    if os.getenv('METRICS_TEXTFILE') or os.getenv('METRICS_JSON'):
+        install_api_counter()
+
+
+def summary(job, started=None):
+    """
+    Return the stage totals of the run
+    :param job: job name
+    :type job: str
+    :param started: epoch seconds the job started at
+    :type started: float
+    :return:
+    :rtype: dict
+    """
+    with _lock:
+        stages = [metrics.as_dict() for metrics in STAGES.values()]
+    return {'job': job, 'started': started, 'finished': time.time(), 'api': traffic(),
+            'peak_rss_bytes': peak_rss(), 'stages': stages}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(run):
+    """
+    Render a summary in the Prometheus text exposition format
+    :param run: as returned by summary
+    :type run: dict
+    :return:
+    :rtype: str
+    """
+    metrics = [
+        ('stage_calls_total', 'calls', 'counter', 'Calls of the stage'),
+        ('stage_errors_total', 'errors', 'counter', 'Calls of the stage that raised'),
+        ('stage_wall_seconds_total', 'wall_seconds', 'counter', 'Wall time spent in the stage'),
+        ('stage_cpu_seconds_total', 'cpu_seconds', 'counter', 'Process CPU time spent in the stage'),
+        ('stage_api_calls_total', 'api_calls', 'counter', 'Kubernetes API calls made during the stage'),
+        ('stage_api_received_bytes_total', 'bytes_received', 'counter',
+         'Bytes received from the Kubernetes API during the stage'),
+        ('stage_peak_rss_bytes', 'peak_rss_bytes', 'gauge', 'Peak resident set size of the process after the stage'),
+    ]
+    job = _label(run['job'])
+    lines = []
+    for name, key, kind, description in metrics:
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        for stage in run['stages']:
+            lines.append(f'{METRIC_PREFIX}_{name}{{job="{job}",stage="{_label(stage["name"])}"}} {stage[key]}')
+    if run.get('started'):
+        lines.append(f"# HELP {METRIC_PREFIX}_duration_seconds Wall time of the job run")
+        lines.append(f"# TYPE {METRIC_PREFIX}_duration_seconds gauge")
+        lines.append(f'{METRIC_PREFIX}_duration_seconds{{job="{job}"}} {run["finished"] - run["started"]}')
+    lines.append(f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds End of the job run")
+    lines.append(f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge")
+    lines.append(f'{METRIC_PREFIX}_last_run_timestamp_seconds{{job="{job}"}} {run["finished"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(file_name, text):
+    # The textfile collector may read at any time, so the file is replaced, never rewritten in place
+    temporary = f"{file_name}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as file:
+        file.write(text)
+    os.replace(temporary, file_name)
+
+
+def export_metrics(job, started=None, textfile=None, json_file=None):
+    """
+    Write the stage totals as a Prometheus textfile and a JSON summary,
+    configured by METRICS_TEXTFILE / METRICS_JSON by default
+    :param job: job name
+    :type job: str
+    :param started: epoch seconds the job started at
+    :type started: float
+    :param textfile: Prometheus textfile, e.g. in the node exporter textfile directory
+    :type textfile: str
+    :param json_file: JSON summary
+    :type json_file: str
+    :return: the summary, None when no export is configured
+    :rtype: dict
+    """
+    textfile = textfile or os.getenv('METRICS_TEXTFILE')
+    json_file = json_file or os.getenv('METRICS_JSON')
+    if not (textfile or json_file):
+        return None
+    run = summary(job, started)
+    if textfile:
+        _write_atomic(textfile, prometheus_text(run))
+    if json_file:
+        _write_atomic(json_file, json.dumps(run, indent=2) + '\n')
+    logging.info("Metrics of %s stages written to %s", len(run['stages']),
+                 ', '.join(name for name in (textfile, json_file) if name))
+    return run
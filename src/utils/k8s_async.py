@@ -0,0 +1,326 @@
+"""
+Asyncio Kubernetes API client on one shared connection pool
+
+All requests of a job go through one aiohttp session: a bounded pool of keep-alive
+connections (the socket budget) and a global token bucket rate limiter shared by
+every task. Lists are paginated with limit/continue and parsed straight into plain
+dicts, as the raw list path of the synchronous client.
+
+    result = run_with_client(lambda api: api.list_items(RESOURCE_PATHS['pods'], namespace='ns'))
+
+aiohttp is optional; async_enabled() is True only when it is installed and K8S_ASYNC=1.
+"""
+import asyncio
+import json
+import os
+import ssl
+import time
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from src.utils.instrumentation import count_api_call, count_bytes
+from src.utils.k8s_pager import DEFAULT_PAGE_SIZE, ListResponse, loads
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - aiohttp is optional
+    aiohttp = None
+
+# Connections kept open to the API server and requests started per second
+DEFAULT_CONNECTIONS = 16
+DEFAULT_RATE = 50
+# Seconds allowed to connect and to wait for the next chunk of a response
+DEFAULT_CALL_TIMEOUT = 300
+EXEC_PROTOCOL = 'v4.channel.k8s.io'
+STDOUT, STDERR, STATUS = 1, 2, 3
+
+RESOURCE_PATHS = {
+    'deployments': '/apis/apps/v1/namespaces/{namespace}/deployments',
+    'statefulsets': '/apis/apps/v1/namespaces/{namespace}/statefulsets',
+    'daemonsets': '/apis/apps/v1/namespaces/{namespace}/daemonsets',
+    'cronjobs': '/apis/batch/v1/namespaces/{namespace}/cronjobs',
+    'pvc': '/api/v1/namespaces/{namespace}/persistentvolumeclaims',
+    'pods': '/api/v1/namespaces/{namespace}/pods',
+    'events': '/api/v1/namespaces/{namespace}/events',
+    'nodes': '/api/v1/nodes',
+}
+
+
+def custom_object_path(group, version, plural):
+    """Return the namespaced list path of a custom resource."""
+    return f'/apis/{group}/{version}/namespaces/{{namespace}}/{plural}'
+
+
+def async_enabled():
+    """True when aiohttp is installed and K8S_ASYNC=1 opts in to the async client."""
+    return aiohttp is not None and os.getenv('K8S_ASYNC', '0') == '1'
+
+
+def _query(params):
+    """Drop unset parameters and render booleans as the API server expects them."""
+    return {key: ('true' if value else 'false') if isinstance(value, bool) else str(value)
+            for key, value in params.items() if value is not None}
+
+
+class RateLimiter:
+    """Token bucket shared by all tasks of an event loop; waiting tasks are served in order."""
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: requests per second, 0 for no limit
+        :type rate: float
+        :param burst: requests that may start at once after an idle period, rate by default
+        :type burst: int
+        """
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait for a token."""
+        if not self.rate:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+
+class AsyncK8sClient:
+    """Async list, watch, log and exec calls against one API server."""
+
+    def __init__(self, host, auth=None, ssl_context=None, max_connections=DEFAULT_CONNECTIONS, rate=DEFAULT_RATE,
+                 burst=None, call_timeout=DEFAULT_CALL_TIMEOUT):
+        """
+        :param host: API server URL
+        :type host: str
+        :param auth: callable returning the authentication headers, called per request so tokens can refresh
+        :type auth: callable
+        :param ssl_context: None for plain http
+        :type ssl_context: ssl.SSLContext
+        :param max_connections: size of the keep-alive connection pool
+        :type max_connections: int
+        :param rate: requests started per second, 0 for no limit
+        :type rate: float
+        :param burst: requests that may start at once
+        :type burst: int
+        :param call_timeout: seconds allowed to connect and between reads of a response, None for no limit
+        :type call_timeout: float
+        """
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for the async Kubernetes client")
+        self.host = host.rstrip('/')
+        self.auth = auth or dict
+        self.ssl_context = ssl_context
+        self.max_connections = max_connections
+        self.limiter = RateLimiter(rate, burst)
+        self.call_timeout = call_timeout
+        self.session = None
+
+    @classmethod
+    def from_configuration(cls, configuration=None, **kwargs):
+        """
+        Build a client from a kubernetes client configuration, the one loaded from the kube config by default;
+        pool size and rate default to K8S_CONNECTIONS and K8S_RATE_LIMIT
+        :param configuration:
+        :type configuration: kubernetes.client.Configuration
+        :return:
+        :rtype: AsyncK8sClient
+        """
+        configuration = configuration or client.Configuration.get_default_copy()
+        ssl_context = None
+        if configuration.host.startswith('https'):
+            ssl_context = ssl.create_default_context(cafile=configuration.ssl_ca_cert)
+            if configuration.cert_file:
+                ssl_context.load_cert_chain(configuration.cert_file, configuration.key_file)
+            if not configuration.verify_ssl:
+                ssl_context.check_hostname = False
+                ssl_context.verify_mode = ssl.CERT_NONE
+
+        def auth():
+            return {setting['key']: setting['value'] for setting in configuration.auth_settings().values()
+                    if setting['in'] == 'header' and setting['value']}
+        kwargs.setdefault('max_connections', int(os.getenv('K8S_CONNECTIONS') or DEFAULT_CONNECTIONS))
+        kwargs.setdefault('rate', float(os.getenv('K8S_RATE_LIMIT') or DEFAULT_RATE))
+        return cls(configuration.host, auth=auth, ssl_context=ssl_context, **kwargs)
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30,
+                                         ssl=self.ssl_context or True)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self._timeout())
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _timeout(self, total=None, sock_read=None):
+        """A request timeout keeping the connect and read limits of the client, which a per-request one replaces."""
+        return aiohttp.ClientTimeout(total=total, sock_connect=self.call_timeout,
+                                     sock_read=sock_read or self.call_timeout)
+
+    async def _get(self, path, params, timeout=None):
+        await self.limiter.acquire()
+        count_api_call()
+        options = {'timeout': timeout} if timeout else {}
+        response = await self.session.get(f"{self.host}{path}", params=_query(params), headers=self.auth(), **options)
+        if response.status >= 300:
+            body = await response.text()
+            response.release()
+            error = ApiException(status=response.status, reason=response.reason)
+            error.body = body
+            raise error
+        return response
+
+    async def get_bytes(self, path, timeout=None, **params):
+        """
+        Return the body of a GET request
+        :param path: API path
+        :type path: str
+        :param timeout: seconds for the whole request
+        :type timeout: float
+        :param params: query parameters, in the API's camelCase
+        :return:
+        :rtype: bytes
+        """
+        response = await self._get(path, params, self._timeout(timeout) if timeout else None)
+        async with response:
+            data = await response.read()
+        count_bytes(len(data))
+        return data
+
+    async def get_json(self, path, timeout=None, **params):
+        """Return the parsed body of a GET request, see get_bytes."""
+        return loads(await self.get_bytes(path, timeout, **params))
+
+    async def list_pages(self, path, namespace=None, page_size=DEFAULT_PAGE_SIZE, label_selector=None,
+                         field_selector=None, **params):
+        """
+        Yield the pages of a list using limit/continue tokens
+        :param path: list path, {namespace} is filled in, e.g. RESOURCE_PATHS['pods']
+        :type path: str
+        :param namespace:
+        :type namespace: str
+        :param page_size: items requested per round-trip
+        :type page_size: int
+        :return: async generator over ListResponse pages of camelCase dict items
+        :rtype: async generator
+        """
+        path = path.format(namespace=namespace)
+        token = None
+        while True:
+            page = ListResponse(await self.get_json(path, limit=page_size, labelSelector=label_selector,
+                                                    fieldSelector=field_selector, **{'continue': token}, **params))
+            yield page
+            token = page.metadata._continue  # pylint: disable=protected-access
+            if not token:
+                break
+
+    async def list_items(self, path, namespace=None, **kwargs):
+        """Return all items of a list, see list_pages."""
+        items = []
+        async for page in self.list_pages(path, namespace, **kwargs):
+            items.extend(page.items)
+        return items
+
+    async def watch(self, path, namespace=None, resource_version=None, timeout_seconds=300, label_selector=None,
+                    field_selector=None):
+        """
+        Yield the events of a watch until the server closes it
+        :param path: list path, {namespace} is filled in
+        :type path: str
+        :param resource_version: start after this version, e.g. the one of a previous list
+        :type resource_version: str
+        :param timeout_seconds: watch duration requested from the server
+        :type timeout_seconds: int
+        :return: async generator over {'type': ..., 'object': dict} events, including BOOKMARK and ERROR
+        :rtype: async generator
+        """
+        # A quiet watch sends nothing until the server closes it, so reads may wait for the whole watch
+        read_timeout = self._timeout(sock_read=timeout_seconds + self.call_timeout) if self.call_timeout else None
+        response = await self._get(path.format(namespace=namespace), {
+            'watch': True, 'resourceVersion': resource_version, 'timeoutSeconds': timeout_seconds,
+            'allowWatchBookmarks': True, 'labelSelector': label_selector, 'fieldSelector': field_selector},
+            read_timeout)
+        async with response:
+            async for line in response.content:
+                count_bytes(len(line))
+                if line.strip():
+                    yield loads(line)
+
+    async def read_log(self, namespace, pod, container=None, previous=False, tail_lines=None, limit_bytes=None):
+        """
+        Return the log of a container, capped by the API server
+        :return:
+        :rtype: bytes
+        """
+        return await self.get_bytes(f'/api/v1/namespaces/{namespace}/pods/{pod}/log', container=container,
+                                    previous=previous or None, tailLines=tail_lines, limitBytes=limit_bytes)
+
+    async def exec(self, namespace, pod, command, container=None, timeout=None):
+        """
+        Run a command in a container over the exec websocket
+        :param command: argument list
+        :type command: list
+        :param timeout: seconds before the stream is closed
+        :type timeout: float
+        :return: exit code (None when unknown or timed out), stdout and stderr
+        :rtype: tuple
+        """
+        await self.limiter.acquire()
+        count_api_call()
+        params = [('stdout', 'true'), ('stderr', 'true')] + [('command', part) for part in command]
+        if container:
+            params.append(('container', container))
+        stdout, stderr = bytearray(), bytearray()
+        exit_code = None
+        async with self.session.ws_connect(f"{self.host}/api/v1/namespaces/{namespace}/pods/{pod}/exec",
+                                           params=params, headers=self.auth(), protocols=(EXEC_PROTOCOL,)) as socket:
+            try:
+                async with asyncio.timeout(timeout):
+                    async for message in socket:
+                        if message.type != aiohttp.WSMsgType.BINARY or not message.data:
+                            continue
+                        count_bytes(len(message.data))
+                        channel, data = message.data[0], message.data[1:]
+                        if channel == STDOUT:
+                            stdout.extend(data)
+                        elif channel == STDERR:
+                            stderr.extend(data)
+                        elif channel == STATUS:
+                            exit_code = _exit_code(json.loads(data))
+            except TimeoutError:
+                exit_code = None
+        return exit_code, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+def _exit_code(status):
+    """Return the exit code reported on the status channel of an exec."""
+    if status.get('status') == 'Success':
+        return 0
+    for cause in (status.get('details') or {}).get('causes') or []:
+        if cause.get('reason') == 'ExitCode':
+            return int(cause['message'])
+    return None
+
+
+def run_with_client(func, configuration=None, **kwargs):
+    """
+    Run a coroutine function with a client on a new event loop, closing the client afterwards
+    :param func: callable taking the client and returning an awaitable
+    :type func: callable
+    :param configuration: kubernetes client configuration, the default one when omitted
+    :type configuration: kubernetes.client.Configuration
+    :return: the result of the awaitable
+    """
+    async def main():
+        async with AsyncK8sClient.from_configuration(configuration, **kwargs) as api:
+            return await func(api)
+    return asyncio.run(main())
@@ -0,0 +1,209 @@
+"""
+Optional in-process and on-disk cache for Kubernetes list responses
+
+Entries are keyed by (context, namespace, kind, selector) and store the list
+resourceVersion. Within the TTL an entry is served as is; once expired it is
+revalidated with a watch from its resourceVersion, and only re-downloaded when
+that watch reports a change. The API server replays the changes since a
+resourceVersion at once, so the watch ends on its first event, bookmark or a
+short idle read timeout rather than waiting for the server side timeout.
+"""
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from kubernetes import config, watch
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError, ReadTimeoutError
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+REVALIDATE_TIMEOUT = 1
+# Seconds without any event after which a revalidation watch is taken as unchanged
+REVALIDATE_IDLE = 0.2
+
+_SHARED_CACHE = {}
+
+
+def current_context():
+    """Return the name of the active kube config context, empty when unavailable."""
+    try:
+        _, active = config.list_kube_config_contexts(config_file=os.getenv('KUBECONFIG'))
+        return active['name'] if active else ''
+    except (config.ConfigException, OSError, TypeError):
+        return ''
+
+
+def unchanged_since(list_func, *args, resource_version, **kwargs):
+    """
+    Check whether a list changed after resource_version with a short watch
+    :param list_func: list call the cached entry was fetched with
+    :type list_func: callable
+    :param resource_version: resourceVersion of the cached list
+    :type resource_version: str
+    :return: True when the watch reports no change; False on a change or any failure, so the list is fetched again
+    :rtype: bool
+    """
+    responses = []
+
+    @functools.wraps(list_func)
+    def start_watch(*call_args, **call_kwargs):
+        response = list_func(*call_args, **call_kwargs)
+        responses.append(response)
+        return response
+
+    watcher = watch.Watch()
+    try:
+        for event in watcher.stream(start_watch, *args, resource_version=resource_version,
+                                    timeout_seconds=REVALIDATE_TIMEOUT, allow_watch_bookmarks=True,
+                                    deserialize=False, _request_timeout=(REVALIDATE_TIMEOUT, REVALIDATE_IDLE),
+                                    **kwargs):
+            # A bookmark is sent once the server has nothing older to replay
+            watcher.stop()
+            return event['type'] == 'BOOKMARK'
+    except ApiException as err:
+        logging.info("Cache revalidation from resourceVersion %s failed: %s", resource_version, err.status)
+        return False
+    except ReadTimeoutError as err:
+        if responses:
+            # The watch started and replayed no change within the idle timeout
+            return True
+        logging.info("Cache revalidation from resourceVersion %s failed: %s", resource_version, err)
+        return False
+    except HTTPError as err:
+        logging.info("Cache revalidation from resourceVersion %s failed: %s", resource_version, err)
+        return False
+    # Closed by the server without any event
+    return True
+
+
+class ResponseCache:
+    """LRU cache of list results with TTL, size limits and resourceVersion revalidation."""
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evictions': 0}
+        self._lock = threading.RLock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f'{digest}.pickle')
+
+    def _load(self, key):
+        """Return the entry of a key from memory or disk."""
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        if not self.cache_dir or not os.path.isfile(self._path(key)):
+            return None
+        try:
+            with open(self._path(key), 'rb') as file:
+                entry = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as err:
+            logging.warning("Ignoring unreadable cache entry for %s: %s", key, err)
+            return None
+        if entry.get('key') != key:
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        """Keep an entry in memory, evicting least recently used entries over the limits."""
+        with self._lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)['size']
+            self.entries[key] = entry
+            self.size += entry['size']
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted['size']
+                self.stats['evictions'] += 1
+
+    def _store(self, key, value, resource_version):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        entry = {'key': key, 'value': value, 'resource_version': resource_version,
+                 'stored_at': time.time(), 'size': len(payload)}
+        self._remember(key, entry)
+        if self.cache_dir and entry['size'] <= self.max_bytes:
+            with open(self._path(key), 'wb') as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Delete the oldest cache files beyond max_entries."""
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.pickle')]
+        if len(files) <= self.max_entries:
+            return
+        for path in sorted(files, key=os.path.getmtime)[:len(files) - self.max_entries]:
+            os.remove(path)
+            self._count('evictions')
+
+    def _count(self, *counters):
+        with self._lock:
+            for counter in counters:
+                self.stats[counter] += 1
+
+    def get_or_fetch(self, key, fetch, revalidate=None, ttl=None):
+        """
+        Return a cached value or fetch it
+        :param key: (context, namespace, kind, selector)
+        :type key: tuple
+        :param fetch: callable returning (value, resourceVersion)
+        :type fetch: callable
+        :param revalidate: callable taking a resourceVersion, True when the list is unchanged
+        :type revalidate: callable
+        :param ttl: seconds an entry is served without revalidation, defaults to the cache TTL
+        :type ttl: float
+        :return: cached or fetched value
+        """
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._load(key)
+        if entry is not None:
+            if time.time() - entry['stored_at'] < ttl:
+                self._count('hits')
+                return entry['value']
+            if revalidate and entry['resource_version'] and revalidate(entry['resource_version']):
+                self._count('hits', 'revalidated')
+                entry['stored_at'] = time.time()
+                return entry['value']
+
+        self._count('misses')
+        value, resource_version = fetch()
+        self._store(key, value, resource_version)
+        return value
+
+    def log_stats(self):
+        """Log the hit and miss counters."""
+        with self._lock:
+            stats = dict(self.stats)
+        logging.info("K8s response cache: %s hits (%s revalidated), %s misses, %s evictions",
+                     stats['hits'], stats['revalidated'], stats['misses'], stats['evictions'])
+
+
+def shared_cache():
+    """
+    Return the process wide cache configured by K8S_CACHE_DIR / K8S_CACHE_TTL, None when disabled
+    :return:
+    :rtype: ResponseCache
+    """
+    cache_dir = os.getenv('K8S_CACHE_DIR')
+    ttl = os.getenv('K8S_CACHE_TTL')
+    if not cache_dir and ttl is None:
+        return None
+    if 'cache' not in _SHARED_CACHE:
+        _SHARED_CACHE['cache'] = ResponseCache(cache_dir=cache_dir, ttl=float(ttl or DEFAULT_TTL))
+    return _SHARED_CACHE['cache']
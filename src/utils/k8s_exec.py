@@ -0,0 +1,155 @@
+"""
+Concurrent in-pod command execution with streamed output
+"""
+import json
+import logging
+import time
+
+from kubernetes import client
+from kubernetes.stream import stream
+from kubernetes.stream.ws_client import ERROR_CHANNEL
+
+from src.utils.concurrency import run_bounded
+from src.utils.instrumentation import count_api_call, count_bytes
+from src.utils.probe_parsers import parser_for
+
+# Bytes of stderr kept per exec
+MAX_STDERR = 4096
+# Seconds a single websocket read waits for output
+READ_INTERVAL = 1
+# Exit codes of a shell that cannot run the command, and runtime messages of a missing executable,
+# e.g. in distroless containers without /bin/sh
+NOT_RUNNABLE_EXIT_CODES = (126, 127)
+NOT_FOUND_MESSAGES = ('executable file not found', 'no such file or directory')
+
+
+def _exec_status(resp):
+    """
+    Return the exit code and failure message of a finished exec from its status channel,
+    the exit code is None when the command did not run
+    :rtype: tuple
+    """
+    raw = resp.read_channel(ERROR_CHANNEL)
+    status = json.loads(raw) if raw else {}
+    if status.get('status') == 'Success':
+        return 0, ''
+    for cause in (status.get('details') or {}).get('causes') or []:
+        if cause.get('reason') == 'ExitCode':
+            return int(cause['message']), ''
+    return None, status.get('message', '')
+
+
+def exec_streaming(pod, container, namespace, command, timeout, on_stdout):
+    """
+    Run a shell command in a container, handing stdout to on_stdout chunk by chunk
+    :param pod:
+    :type pod: str
+    :param container:
+    :type container: str
+    :param namespace:
+    :type namespace: str
+    :param command: shell command
+    :type command: str
+    :param timeout: seconds before the stream is closed
+    :type timeout: float
+    :param on_stdout: callable receiving stdout chunks
+    :type on_stdout: callable
+    :return: exit code (None if unknown), stderr head and whether the exec timed out
+    :rtype: tuple
+    """
+    # stream() swaps the request method of the API client while connecting, so every exec gets its own client;
+    # the websocket bypasses the REST client, whose calls the API counter sees
+    count_api_call()
+    resp = stream(client.CoreV1Api().connect_get_namespaced_pod_exec, pod, namespace,
+                  container=container, command=['/bin/sh', '-c', command],
+                  stderr=True, stdin=False, stdout=True, tty=False, _preload_content=False)
+    stderr = ''
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    try:
+        while resp.is_open():
+            if time.monotonic() > deadline:
+                timed_out = True
+                break
+            resp.update(timeout=READ_INTERVAL)
+            if resp.peek_stdout():
+                chunk = resp.read_stdout()
+                count_bytes(len(chunk.encode()))
+                on_stdout(chunk)
+            if resp.peek_stderr():
+                chunk = resp.read_stderr()
+                count_bytes(len(chunk.encode()))
+                stderr += chunk[:MAX_STDERR - len(stderr)]
+        exit_code = None
+        if not timed_out:
+            exit_code, message = _exec_status(resp)
+            if message:
+                stderr = f"{message}\n{stderr}"[:MAX_STDERR]
+    finally:
+        resp.close()
+    return exit_code, stderr, timed_out
+
+
+def run_probe(pod, container, namespace, command, timeout):
+    """
+    Execute one probe command and parse its output while it streams in
+    :return: probe result
+    :rtype: dict
+    """
+    parser = parser_for(command)
+    exit_code, stderr, timed_out = exec_streaming(pod, container, namespace, command, timeout, parser.feed)
+    return {'pod': pod, 'container': container, 'command': command, 'exit_code': exit_code,
+            'timed_out': timed_out, 'stderr': stderr, 'result': parser.close()}
+
+
+def probe_skipped(probe):
+    """
+    True when the probe command could not be run in the container, e.g. one without a shell,
+    as opposed to a command that ran and failed
+    :param probe: probe result, see run_probes
+    :type probe: dict
+    :rtype: bool
+    """
+    if probe.get('exit_code') in NOT_RUNNABLE_EXIT_CODES:
+        return True
+    if probe.get('exit_code') is not None or probe.get('timed_out'):
+        return False
+    message = (probe.get('error') or probe.get('stderr') or '').lower()
+    return any(marker in message for marker in NOT_FOUND_MESSAGES)
+
+
+def run_probes(targets, commands, namespace, max_streams=8, timeout=30):
+    """
+    Run every command in every (pod, container) target with at most max_streams open execs
+    :param targets: (pod, container) pairs
+    :type targets: list
+    :param commands: shell commands
+    :type commands: list
+    :param namespace:
+    :type namespace: str
+    :param max_streams: concurrently open exec streams
+    :type max_streams: int
+    :param timeout: seconds per exec
+    :type timeout: float
+    :return: probe results, failed execs carry an error entry
+    :rtype: list
+    """
+    calls = {
+        (pod, container, command): (lambda p=pod, c=container, cmd=command:
+                                    run_probe(p, c, namespace, cmd, timeout))
+        for pod, container in targets
+        for command in commands
+    }
+    # The exec stream enforces the timeout; the pool limit only guards against a hung websocket
+    results = run_bounded(calls, max_workers=max_streams, call_timeout=timeout + 2 * READ_INTERVAL + 5)
+
+    probes = []
+    for (pod, container, command), result in results.items():
+        if result.ok:
+            probes.append(dict(result.value, latency=round(result.latency, 3)))
+            continue
+        error = 'timeout' if result.timed_out else str(result.error)
+        logging.error("Probe '%s' in %s/%s failed: %s", command, pod, container, error)
+        probes.append({'pod': pod, 'container': container, 'command': command, 'error': error,
+                       'latency': round(result.latency, 3)})
+    return probes
@@ -0,0 +1,172 @@
+"""
+Container usage sampling from the metrics.k8s.io API
+"""
+import logging
+import time
+import warnings
+
+import numpy as np
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from src.utils.quantity import canonical
+
+METRICS_GROUP = 'metrics.k8s.io'
+METRICS_VERSION = 'v1beta1'
+# Column of each metric in the sample buffer; cpu in millicores, memory in bytes
+METRICS = ('cpu', 'memory')
+# Columns of a usage buffer sized for a sampling window, longer windows are bucketed
+MAX_CAPACITY = 720
+
+
+def pod_usage(api, namespace):
+    """
+    Return the current usage of every container in a namespace
+    :param api: kubernetes CustomObjectsApi or a stub with list_namespaced_custom_object
+    :type api: object
+    :param namespace:
+    :type namespace: str
+    :return: (pod, container) -> (cpu millicores, memory bytes)
+    :rtype: dict
+    """
+    response = api.list_namespaced_custom_object(METRICS_GROUP, METRICS_VERSION, namespace, 'pods')
+    usage = {}
+    for item in response.get('items', []):
+        pod = item['metadata']['name']
+        for container in item.get('containers', []):
+            values = container.get('usage', {})
+            usage[(pod, container['name'])] = tuple(canonical(metric, values.get(metric)) or 0 for metric in METRICS)
+    return usage
+
+
+class UsageRing:
+    """
+    Fixed size ring buffer of usage samples: one row per series, one column per
+    sample or bucket of samples. Rows are allocated as series are observed, up to
+    max_series; with bucket > 1 each column holds the mean of that many samples
+    and the peak of every series is kept separately, so it stays exact.
+    """
+    # Rows allocated at once when new series are observed
+    GROW_ROWS = 64
+
+    def __init__(self, capacity=240, max_series=4096, bucket=1):
+        self.capacity = capacity
+        self.max_series = max_series
+        self.bucket = bucket
+        rows = min(max_series, self.GROW_ROWS)
+        self.samples = np.full((rows, capacity, len(METRICS)), np.nan)
+        self.peak = np.full((rows, len(METRICS)), np.nan)
+        # Samples added to the current column per series
+        self.filled = np.zeros(rows, dtype=np.int32)
+        self.index = {}
+        self.count = 0
+        self.dropped = set()
+
+    @classmethod
+    def for_window(cls, duration, interval, max_series=4096, max_capacity=MAX_CAPACITY):
+        """
+        Return a buffer holding a whole sampling window in at most max_capacity columns
+        :param duration: seconds sampled
+        :type duration: float
+        :param interval: seconds between samples
+        :type interval: float
+        :return:
+        :rtype: UsageRing
+        """
+        samples = max(1, int(duration // interval) + 1)
+        capacity = min(samples, max_capacity)
+        return cls(capacity=capacity, max_series=max_series, bucket=-(-samples // capacity))
+
+    def _grow(self):
+        rows = min(self.max_series, 2 * len(self.samples))
+        extra = rows - len(self.samples)
+        self.samples = np.concatenate([self.samples, np.full((extra,) + self.samples.shape[1:], np.nan)])
+        self.peak = np.concatenate([self.peak, np.full((extra, len(METRICS)), np.nan)])
+        self.filled = np.concatenate([self.filled, np.zeros(extra, dtype=np.int32)])
+
+    def add(self, usage):
+        """
+        Store one sample of all series; series missing from it are recorded as gaps
+        :param usage: key -> tuple of metric values
+        :type usage: dict
+        """
+        column = (self.count // self.bucket) % self.capacity
+        if self.count % self.bucket == 0:
+            self.samples[:, column, :] = np.nan
+            self.filled[:] = 0
+        for key, values in usage.items():
+            row = self.index.get(key)
+            if row is None:
+                if len(self.index) >= self.max_series:
+                    self.dropped.add(key)
+                    continue
+                if len(self.index) == len(self.samples):
+                    self._grow()
+                row = self.index[key] = len(self.index)
+            values = np.asarray(values, dtype=float)
+            filled = self.filled[row]
+            if filled:
+                # Running mean of the samples in the bucket
+                self.samples[row, column, :] += (values - self.samples[row, column, :]) / (filled + 1)
+            else:
+                self.samples[row, column, :] = values
+            self.filled[row] = filled + 1
+            self.peak[row] = np.fmax(self.peak[row], values)
+        self.count += 1
+
+    def stats(self):
+        """
+        Aggregate all series at once; percentiles are over the bucket means when bucket > 1
+        :return: key -> {metric: (p50, p95, max)}
+        :rtype: dict
+        """
+        if not self.index:
+            return {}
+        columns = min(-(-self.count // self.bucket), self.capacity)
+        used = self.samples[:len(self.index), :columns, :]
+        with warnings.catch_warnings():
+            # Series without any sample in the window yield NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            p50, p95 = np.nanpercentile(used, [50, 95], axis=1)
+        return {
+            key: {metric: (p50[row, column], p95[row, column], self.peak[row, column])
+                  for column, metric in enumerate(METRICS)}
+            for key, row in self.index.items()
+        }
+
+
+def sample_usage(namespaces, duration, interval, ring=None, api=None):
+    """
+    Poll container usage of the namespaces at a fixed interval for the test window
+    :param namespaces:
+    :type namespaces: list
+    :param duration: seconds to sample
+    :type duration: float
+    :param interval: seconds between samples
+    :type interval: float
+    :param ring: buffer to fill, sized for the window when omitted
+    :type ring: UsageRing
+    :param api: metrics API, defaults to kubernetes CustomObjectsApi
+    :type api: object
+    :return: filled buffer keyed by (namespace, pod, container)
+    :rtype: UsageRing
+    """
+    api = api or client.CustomObjectsApi()
+    ring = ring or UsageRing.for_window(duration, interval)
+    deadline = time.monotonic() + duration
+    while True:
+        started = time.monotonic()
+        usage = {}
+        for namespace in namespaces:
+            try:
+                for (pod, container), values in pod_usage(api, namespace).items():
+                    usage[(namespace, pod, container)] = values
+            except ApiException as err:
+                logging.warning("Metrics not available for %s: %s", namespace, err.status)
+        ring.add(usage)
+        if started + interval > deadline:
+            break
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    if ring.dropped:
+        logging.warning("Usage buffer full, %s series were not sampled", len(ring.dropped))
+    return ring
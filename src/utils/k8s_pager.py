@@ -0,0 +1,168 @@
+"""
+Paginated, generator based list calls against the Kubernetes API
+"""
+import json
+import logging
+import os
+from types import SimpleNamespace
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+try:
+    from orjson import loads
+except ImportError:  # pragma: no cover - orjson is optional
+    loads = json.loads
+
+DEFAULT_PAGE_SIZE = 250
+
+
+def paginate_pages(list_func, *args, page_size=DEFAULT_PAGE_SIZE, label_selector=None, field_selector=None, **kwargs):
+    """
+    Yield the pages of a Kubernetes list call using limit/continue tokens
+    :param list_func: any list_* method of a kubernetes client API class
+    :type list_func: callable
+    :param page_size: maximum number of items requested per round-trip
+    :type page_size: int
+    :param label_selector: label selector evaluated by the API server
+    :type label_selector: str
+    :param field_selector: field selector evaluated by the API server
+    :type field_selector: str
+    :return: generator over list responses, all sharing the resourceVersion of the first one
+    :rtype: generator
+    """
+    if label_selector:
+        kwargs['label_selector'] = label_selector
+    if field_selector:
+        kwargs['field_selector'] = field_selector
+
+    token = None
+    pages = 0
+    while True:
+        if token:
+            kwargs['_continue'] = token
+        page = list_func(*args, limit=page_size, **kwargs)
+        pages += 1
+        yield page
+        token = page.metadata._continue  # pylint: disable=protected-access
+        if not token:
+            break
+    logging.info("%s: listed %s page(s) of up to %s items", getattr(list_func, '__name__', list_func), pages, page_size)
+
+
+def paginate(list_func, *args, **kwargs):
+    """
+    Yield the items of a Kubernetes list call one page at a time, see paginate_pages
+    :param list_func: any list_* method of a kubernetes client API class
+    :type list_func: callable
+    :return: generator over the listed items
+    :rtype: generator
+    """
+    for page in paginate_pages(list_func, *args, **kwargs):
+        yield from page.items
+
+
+def list_namespaced_pods(namespace, **kwargs):
+    """
+    Stream the pods of a namespace
+    :param namespace:
+    :type namespace: str
+    :return: generator over V1Pod objects
+    :rtype: generator
+    """
+    return paginate(client.CoreV1Api().list_namespaced_pod, namespace, **kwargs)
+
+
+def resource_list_func(resource_type):
+    """
+    Return the namespaced list call of one of the monitored resource types
+    :param resource_type: deployments, statefulsets, daemonsets, cronjobs or pvc
+    :type resource_type: str
+    :return: kubernetes client list_namespaced_* method
+    :rtype: callable
+    """
+    list_funcs = {
+        'deployments': lambda: client.AppsV1Api().list_namespaced_deployment,
+        'statefulsets': lambda: client.AppsV1Api().list_namespaced_stateful_set,
+        'daemonsets': lambda: client.AppsV1Api().list_namespaced_daemon_set,
+        'cronjobs': lambda: client.BatchV1Api().list_namespaced_cron_job,
+        'pvc': lambda: client.CoreV1Api().list_namespaced_persistent_volume_claim,
+        'pods': lambda: client.CoreV1Api().list_namespaced_pod,
+    }
+    if resource_type not in list_funcs:
+        raise ValueError(f"Unsupported resource type: {resource_type}")
+    return list_funcs[resource_type]()
+
+
+class ListResponse:
+    """A list response of plain dicts with the items and metadata attributes of the typed list responses."""
+    __slots__ = ('items', 'metadata')
+
+    def __init__(self, response):
+        metadata = response.get('metadata', {})
+        self.items = response.get('items', [])
+        self.metadata = SimpleNamespace(_continue=metadata.get('continue'),
+                                        resource_version=metadata.get('resourceVersion'))
+
+
+def raw_lists_enabled():
+    """True unless K8S_RAW_LISTS=0 asks for typed model objects instead of plain dicts."""
+    return os.getenv('K8S_RAW_LISTS', '1') != '0'
+
+
+def raw_list_func(list_func):
+    """
+    Wrap a typed list call so that each page is parsed straight into plain dicts,
+    skipping the deserialization into model objects; usable with paginate_pages
+    :param list_func: any list_* method of a kubernetes client API class
+    :type list_func: callable
+    :return: callable with the same arguments returning a ListResponse of camelCase dict items
+    :rtype: callable
+    """
+    def list_raw(*args, **kwargs):
+        response = list_func(*args, _preload_content=False, **kwargs)
+        try:
+            return ListResponse(loads(response.data))
+        finally:
+            response.release_conn()
+    list_raw.__name__ = getattr(list_func, '__name__', 'list_raw')
+    return list_raw
+
+
+def custom_object_list_func(group, version, plural):
+    """
+    Return the namespaced list call of a custom resource, usable with paginate_pages
+    :param group: API group, e.g. kvdbrd.gs.ericsson.com
+    :type group: str
+    :param version:
+    :type version: str
+    :param plural: resource name, e.g. redisclusters
+    :type plural: str
+    :return: callable(namespace, **kwargs) returning a ListResponse of plain dict items
+    :rtype: callable
+    """
+    api = client.CustomObjectsApi()
+
+    def list_namespaced_custom_object(namespace, **kwargs):
+        try:
+            return ListResponse(api.list_namespaced_custom_object(group, version, namespace, plural, **kwargs))
+        except ApiException as err:
+            if err.status != 404:
+                raise
+            # The custom resource is not installed in this cluster
+            logging.warning("%s.%s/%s is not served, listing no objects", plural, group, version)
+            return ListResponse({})
+    return list_namespaced_custom_object
+
+
+def list_namespaced_resources(namespace, resource_type, **kwargs):
+    """
+    Stream the objects of one of the monitored resource types in a namespace
+    :param namespace:
+    :type namespace: str
+    :param resource_type: deployments, statefulsets, daemonsets, cronjobs or pvc
+    :type resource_type: str
+    :return: generator over kubernetes model objects
+    :rtype: generator
+    """
+    return paginate(resource_list_func(resource_type), namespace, **kwargs)
@@ -0,0 +1,192 @@
+"""
+Flatten Kubernetes workload objects into resource detail rows
+"""
+import logging
+
+from kubernetes.client.rest import ApiException
+
+from config.jobs.monitor_resources.kinds import RESOURCE_NAMES
+from src.utils.k8s_async import RESOURCE_PATHS, custom_object_path
+from src.utils.k8s_pager import (custom_object_list_func, paginate_pages, raw_list_func, raw_lists_enabled,
+                                 resource_list_func)
+
+NOT_SPECIFIED = 'Not specified'
+
+
+def _pod_template(obj, resource_type):
+    """Return the pod template spec of a workload object."""
+    if resource_type == 'cronjobs':
+        return obj.spec.job_template.spec.template.spec
+    return obj.spec.template.spec
+
+
+def _container_row(name, namespace, container_name, limits, requests, replicas):
+    """Build one row with the limits and requests of a container."""
+    row = {'Name': name, 'Namespace': namespace, 'Container Name': container_name, 'Replicas': replicas}
+    for limit_type, values in (('Limits', limits or {}), ('Requests', requests or {})):
+        for resource, label in RESOURCE_NAMES.items():
+            row[f'{label} {limit_type}'] = values.get(resource, NOT_SPECIFIED)
+    return row
+
+
+def resource_rows(obj, resource_type):
+    """
+    Flatten a single workload or PVC object into resource detail rows
+    :param obj: kubernetes model object
+    :type obj: object
+    :param resource_type: deployments, statefulsets, daemonsets, cronjobs or pvc
+    :type resource_type: str
+    :return: list of rows, one per container (one per claim for pvc)
+    :rtype: list
+    """
+    name = obj.metadata.name
+    namespace = obj.metadata.namespace
+    if resource_type == 'pvc':
+        capacity = (obj.status.capacity or {}) if obj.status else {}
+        requests = (obj.spec.resources.requests or {}) if obj.spec.resources else {}
+        return [{'Name': name, 'Namespace': namespace,
+                 'Capacity': capacity.get('storage', requests.get('storage', NOT_SPECIFIED))}]
+
+    replicas = getattr(obj.spec, 'replicas', None)
+    replicas = '' if replicas is None else str(replicas)
+    rows = []
+    for container in _pod_template(obj, resource_type).containers or []:
+        resources = container.resources
+        rows.append(_container_row(name, namespace, container.name, resources.limits if resources else None,
+                                   resources.requests if resources else None, replicas))
+    return rows
+
+
+def raw_resource_rows(obj, resource_type):
+    """
+    Flatten a single workload or PVC object parsed from the raw API response, see resource_rows
+    :param obj: object as sent by the API server, with camelCase keys
+    :type obj: dict
+    :param resource_type: deployments, statefulsets, daemonsets, cronjobs or pvc
+    :type resource_type: str
+    :return: list of rows, one per container (one per claim for pvc)
+    :rtype: list
+    """
+    metadata = obj['metadata']
+    spec = obj.get('spec') or {}
+    if resource_type == 'pvc':
+        capacity = (obj.get('status') or {}).get('capacity') or {}
+        requests = (spec.get('resources') or {}).get('requests') or {}
+        return [{'Name': metadata['name'], 'Namespace': metadata.get('namespace'),
+                 'Capacity': capacity.get('storage', requests.get('storage', NOT_SPECIFIED))}]
+
+    replicas = spec.get('replicas')
+    replicas = '' if replicas is None else str(replicas)
+    template = spec['jobTemplate']['spec']['template'] if resource_type == 'cronjobs' else spec['template']
+    rows = []
+    for container in template['spec'].get('containers') or []:
+        resources = container.get('resources') or {}
+        rows.append(_container_row(metadata['name'], metadata.get('namespace'), container['name'],
+                                   resources.get('limits'), resources.get('requests'), replicas))
+    return rows
+
+
+def custom_object_rows(obj, columns):
+    """
+    Flatten a custom object into a single row
+    :param obj: custom object as returned by the custom objects API
+    :type obj: dict
+    :param columns: row column -> dotted path into the object, e.g. spec.replicas
+    :type columns: dict
+    :return: list with one row
+    :rtype: list
+    """
+    row = {'Name': obj['metadata']['name'], 'Namespace': obj['metadata'].get('namespace', '')}
+    for column, path in columns.items():
+        value = obj
+        for part in path.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        row[column] = NOT_SPECIFIED if value is None else value
+    return [row]
+
+
+def _pages_and_rows(namespace, resource_type, custom=None, **kwargs):
+    """Return the pages of a resource type and the flattening of its objects."""
+    if custom:
+        list_func = custom_object_list_func(custom['group'], custom['version'], custom['plural'])
+        return (paginate_pages(list_func, namespace, **kwargs),
+                lambda obj: custom_object_rows(obj, custom.get('columns', {})))
+    if raw_lists_enabled():
+        # Project the parsed pages directly, without building model objects
+        return (paginate_pages(raw_list_func(resource_list_func(resource_type)), namespace, **kwargs),
+                lambda obj: raw_resource_rows(obj, resource_type))
+    return (paginate_pages(resource_list_func(resource_type), namespace, **kwargs),
+            lambda obj: resource_rows(obj, resource_type))
+
+
+def iter_resource_rows(namespace, resource_type, custom=None, **kwargs):
+    """
+    Stream resource detail rows for a namespace, one API page at a time
+    :param namespace:
+    :type namespace: str
+    :param resource_type:
+    :type resource_type: str
+    :param custom: group, version, plural and columns of a custom resource kind
+    :type custom: dict
+    :return: generator over rows
+    :rtype: generator
+    """
+    pages, rows = _pages_and_rows(namespace, resource_type, custom, **kwargs)
+    for page in pages:
+        for obj in page.items:
+            yield from rows(obj)
+
+
+def fetch_resource_rows(namespace, resource_type, custom=None, **kwargs):
+    """
+    Collect the resource detail rows of a namespace together with the list resourceVersion
+    :param namespace:
+    :type namespace: str
+    :param resource_type:
+    :type resource_type: str
+    :param custom: group, version, plural and columns of a custom resource kind
+    :type custom: dict
+    :return: rows and the resourceVersion the list was served at
+    :rtype: tuple
+    """
+    rows = []
+    resource_version = None
+    pages, flatten = _pages_and_rows(namespace, resource_type, custom, **kwargs)
+    for page in pages:
+        resource_version = resource_version or page.metadata.resource_version
+        for obj in page.items:
+            rows.extend(flatten(obj))
+    return rows, resource_version
+
+
+async def async_resource_rows(api, namespace, resource_type, custom=None, **kwargs):
+    """
+    Collect the resource detail rows of a namespace through the async client
+    :param api:
+    :type api: AsyncK8sClient
+    :param namespace:
+    :type namespace: str
+    :param resource_type:
+    :type resource_type: str
+    :param custom: group, version, plural and columns of a custom resource kind
+    :type custom: dict
+    :return:
+    :rtype: list
+    """
+    if custom:
+        path = custom_object_path(custom['group'], custom['version'], custom['plural'])
+    else:
+        path = RESOURCE_PATHS[resource_type]
+    rows = []
+    try:
+        async for page in api.list_pages(path, namespace, **kwargs):
+            for obj in page.items:
+                rows.extend(custom_object_rows(obj, custom.get('columns', {})) if custom
+                            else raw_resource_rows(obj, resource_type))
+    except ApiException as err:
+        if not custom or err.status != 404:
+            raise
+        # The custom resource is not installed in this cluster
+        logging.warning("%s.%s/%s is not served, listing no objects", custom['plural'], custom['group'],
+                        custom['version'])
+    return rows
@@ -0,0 +1,85 @@
+"""
+Resumable Kubernetes watch streams with reconnect backoff
+"""
+import logging
+import time
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError
+
+from src.utils.k8s_pager import DEFAULT_PAGE_SIZE, paginate_pages
+
+HTTP_GONE = 410
+# Synthetic event type for objects returned by the (re)list preceding a watch
+SYNC = 'SYNC'
+
+
+def _relist(list_func, args, kwargs):
+    """Yield SYNC events for the current state and return the list resourceVersion."""
+    resource_version = None
+    for page in paginate_pages(list_func, *args, **kwargs):
+        if resource_version is None:
+            resource_version = page.metadata.resource_version
+        for item in page.items:
+            yield {'type': SYNC, 'object': item}
+    return resource_version
+
+
+def watch_events(list_func, *args, resource_version=None, duration=None, timeout_seconds=300,
+                 max_backoff=60, page_size=DEFAULT_PAGE_SIZE, **kwargs):
+    """
+    Stream watch events, resuming from the last seen resourceVersion after every disconnect
+    :param list_func: any list_* method of a kubernetes client API class
+    :type list_func: callable
+    :param resource_version: version to resume from, None to start with a full list
+    :type resource_version: str
+    :param duration: seconds to keep watching, None to watch forever
+    :type duration: float
+    :param timeout_seconds: server side timeout of a single watch request
+    :type timeout_seconds: int
+    :param max_backoff: upper bound in seconds of the reconnect backoff
+    :type max_backoff: float
+    :param page_size: items requested per call when (re)listing
+    :type page_size: int
+    :return: generator over {'type', 'object'} events, SYNC events after every (re)list
+    :rtype: generator
+    """
+    deadline = time.monotonic() + duration if duration else None
+    backoff = 1
+    while deadline is None or time.monotonic() < deadline:
+        try:
+            if resource_version is None:
+                resource_version = yield from _relist(list_func, args, dict(kwargs, page_size=page_size))
+
+            remaining = timeout_seconds if deadline is None else max(1, min(timeout_seconds, deadline - time.monotonic()))
+            watcher = watch.Watch()
+            started = time.monotonic()
+            received = False
+            for event in watcher.stream(list_func, *args, resource_version=resource_version,
+                                        timeout_seconds=int(remaining), allow_watch_bookmarks=True, **kwargs):
+                resource_version = watcher.resource_version or resource_version
+                backoff = 1
+                received = True
+                if event['type'] != 'BOOKMARK':
+                    yield event
+                if deadline is not None and time.monotonic() >= deadline:
+                    watcher.stop()
+            resource_version = watcher.resource_version or resource_version
+            if not received and time.monotonic() - started < int(remaining):
+                # Closed by the server before its timeout without any event, e.g. while it is overloaded
+                logging.warning("Watch closed without events, reconnecting in %ss", backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+        except ApiException as err:
+            if err.status == HTTP_GONE:
+                logging.warning("Watch resourceVersion %s expired, relisting", resource_version)
+                resource_version = None
+                continue
+            logging.warning("Watch failed with %s, reconnecting in %ss", err.status, backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+        except (HTTPError, OSError) as err:
+            logging.warning("Watch connection lost (%s), reconnecting in %ss", err, backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
@@ -0,0 +1,102 @@
+"""
+Lazy, size capped log payloads and an optional JSON lines log file
+
+Payload objects are passed as logging arguments (``LOG.info("x: %s", LazyJson(obj))``)
+so they are only serialized when a handler actually emits the record.
+"""
+import json
+import logging
+import os
+
+DEFAULT_MAX_CHARS = 2000
+
+
+def _truncate(text, max_chars):
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... ({len(text) - max_chars} more chars)"
+
+
+class LazyJson:
+    """JSON rendering of a payload, built on first use and capped to max_chars."""
+    __slots__ = ('obj', 'max_chars', 'indent', '_text')
+
+    def __init__(self, obj, max_chars=DEFAULT_MAX_CHARS, indent=None):
+        self.obj = obj
+        self.max_chars = max_chars
+        self.indent = indent
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = _truncate(json.dumps(self.obj, indent=self.indent, default=str), self.max_chars)
+        return self._text
+
+
+class Summary:
+    """Shape of a payload, e.g. number of keys and rows per key, rendered on first use."""
+    __slots__ = ('obj', 'max_keys')
+
+    def __init__(self, obj, max_keys=20):
+        self.obj = obj
+        self.max_keys = max_keys
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, dict):
+            return f"{len(value)} keys"
+        if isinstance(value, (list, tuple)):
+            return f"{len(value)} items"
+        return type(value).__name__
+
+    def __str__(self):
+        if isinstance(self.obj, dict):
+            keys = list(self.obj.items())[:self.max_keys]
+            parts = [f"{key}: {self._size(value)}" for key, value in keys]
+            more = len(self.obj) - len(keys)
+            return f"{{{', '.join(parts)}{f', ... {more} more' if more > 0 else ''}}}"
+        return self._size(self.obj)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record; an extra 'payload' is added as capped JSON."""
+
+    def __init__(self, max_chars=DEFAULT_MAX_CHARS):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': _truncate(record.getMessage(), self.max_chars),
+        }
+        payload = getattr(record, 'payload', None)
+        if payload is not None:
+            entry['payload'] = str(LazyJson(payload, self.max_chars))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def enable_json_lines_log(file_name=None, level=None, max_chars=DEFAULT_MAX_CHARS):
+    """
+    Send log records to a JSON lines side file, configured by LOG_JSON_FILE / LOG_JSON_LEVEL by default
+    :param file_name: side file, nothing is attached when empty
+    :type file_name: str
+    :param level: minimum level of the side file
+    :type level: str
+    :param max_chars: cap of messages and payloads
+    :type max_chars: int
+    :return: the attached handler, None when disabled
+    :rtype: logging.Handler
+    """
+    file_name = file_name or os.getenv('LOG_JSON_FILE')
+    if not file_name:
+        return None
+    handler = logging.FileHandler(file_name)
+    handler.setLevel(level or os.getenv('LOG_JSON_LEVEL') or logging.INFO)
+    handler.setFormatter(JsonLinesFormatter(max_chars))
+    logging.getLogger().addHandler(handler)
+    return handler
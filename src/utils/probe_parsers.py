@@ -0,0 +1,146 @@
+"""
+Incremental parsers for df and free output of in-pod probes
+"""
+import re
+from abc import ABC, abstractmethod
+
+BINARY_SUFFIXES = {'': 1, 'B': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40, 'P': 2 ** 50}
+# Lines kept per command without a dedicated parser
+MAX_RAW_LINES = 200
+SIZE = re.compile(r'^([0-9.]+)([KMGTPB]?)i?$')
+
+
+def to_bytes(value, unit=1):
+    """
+    Convert a df/free size such as "1.5G", "512Mi" or a plain block count to bytes
+    :param value:
+    :type value: str
+    :param unit: bytes per unit of plain numbers
+    :type unit: int
+    :return: bytes, None when the value is not a size
+    :rtype: int
+    """
+    match = SIZE.match(value)
+    if not match:
+        return None
+    number, suffix = match.groups()
+    return int(float(number) * (BINARY_SUFFIXES[suffix] if suffix else unit))
+
+
+class LineParser(ABC):
+    """Accepts output in arbitrary chunks and parses complete lines as they arrive."""
+
+    def __init__(self, command=''):
+        self.command = command
+        self._partial = ''
+
+    def feed(self, chunk):
+        """Parse the complete lines of a stdout chunk."""
+        lines = (self._partial + chunk).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                self.parse_line(line)
+
+    def close(self):
+        """Parse a trailing line without newline and return the result."""
+        if self._partial.strip():
+            self.parse_line(self._partial)
+        self._partial = ''
+        return self.result()
+
+    @abstractmethod
+    def parse_line(self, line):
+        """Parse one complete, non-blank line."""
+
+    @abstractmethod
+    def result(self):
+        """Return what was parsed so far."""
+
+
+class DfParser(LineParser):
+    """Parse df output, -h or 1K/-k blocks, into one entry per mount."""
+
+    def __init__(self, command=''):
+        super().__init__(command)
+        self.unit = 1024
+        self.mounts = []
+        self._wrapped = None
+
+    def parse_line(self, line):
+        fields = line.split()
+        if fields[0] == 'Filesystem':
+            if len(fields) > 1 and fields[1].endswith('-blocks'):
+                self.unit = to_bytes(fields[1].split('-')[0]) or 1024
+            return
+        if len(fields) == 1:
+            # Long filesystem names are printed on a line of their own
+            self._wrapped = fields[0]
+            return
+        if self._wrapped:
+            fields = [self._wrapped] + fields
+            self._wrapped = None
+        if len(fields) < 6:
+            return
+        self.mounts.append({
+            'filesystem': fields[0],
+            'size': to_bytes(fields[1], self.unit),
+            'used': to_bytes(fields[2], self.unit),
+            'available': to_bytes(fields[3], self.unit),
+            'use_percent': int(fields[4].rstrip('%')) if fields[4].rstrip('%').isdigit() else None,
+            'mount': ' '.join(fields[5:]),
+        })
+
+    def result(self):
+        return {'mounts': self.mounts}
+
+
+class FreeParser(LineParser):
+    """Parse free output into Mem and Swap byte counts."""
+    UNITS = {'-b': 1, '--bytes': 1, '-k': 2 ** 10, '--kibi': 2 ** 10, '-m': 2 ** 20, '--mebi': 2 ** 20,
+             '-g': 2 ** 30, '--gibi': 2 ** 30}
+
+    def __init__(self, command=''):
+        super().__init__(command)
+        flags = command.split()[1:]
+        self.unit = next((self.UNITS[flag] for flag in flags if flag in self.UNITS), 2 ** 10)
+        self.headers = []
+        self.memory = {}
+
+    def parse_line(self, line):
+        fields = line.split()
+        if not fields[0].endswith(':'):
+            self.headers = fields
+            return
+        name = fields[0].rstrip(':').lower()
+        self.memory[name] = {header: to_bytes(value, self.unit) for header, value in zip(self.headers, fields[1:])}
+
+    def result(self):
+        return self.memory
+
+
+class RawParser(LineParser):
+    """Keep the lines of commands without a dedicated parser."""
+
+    def __init__(self, command=''):
+        super().__init__(command)
+        self.lines = []
+
+    def parse_line(self, line):
+        if len(self.lines) < MAX_RAW_LINES:
+            self.lines.append(line)
+
+    def result(self):
+        return {'lines': self.lines}
+
+
+def parser_for(command):
+    """
+    Return a fresh parser for a probe command
+    :param command: shell command, e.g. "df -h"
+    :type command: str
+    :return:
+    :rtype: LineParser
+    """
+    program = command.split()[0] if command.split() else ''
+    return {'df': DfParser, 'free': FreeParser}.get(program, RawParser)(command)
@@ -0,0 +1,76 @@
+"""
+Kubernetes resource quantity parsing
+"""
+import functools
+import math
+import re
+from fractions import Fraction
+
+SUFFIXES = {
+    'n': Fraction(1, 10 ** 9), 'u': Fraction(1, 10 ** 6), 'm': Fraction(1, 1000), '': Fraction(1),
+    'k': Fraction(10 ** 3), 'M': Fraction(10 ** 6), 'G': Fraction(10 ** 9),
+    'T': Fraction(10 ** 12), 'P': Fraction(10 ** 15), 'E': Fraction(10 ** 18),
+    'Ki': Fraction(2 ** 10), 'Mi': Fraction(2 ** 20), 'Gi': Fraction(2 ** 30),
+    'Ti': Fraction(2 ** 40), 'Pi': Fraction(2 ** 50), 'Ei': Fraction(2 ** 60),
+}
+QUANTITY = re.compile(r'^([+-]?[0-9.]+(?:[eE][+-]?[0-9]+)?)([a-zA-Z]{0,2})$')
+# CPU is kept in millicores, everything else (memory, storage) in bytes
+SCALE = {'cpu': 1000}
+
+
+def parse_quantity(value):
+    """
+    Parse a quantity such as "500m", "1.5", "1Gi" or "2e3"
+    :param value:
+    :type value: str
+    :return: exact value, None when the string is not a quantity
+    :rtype: Fraction
+    """
+    if value is None:
+        return None
+    match = QUANTITY.match(str(value).strip())
+    if not match or match.group(2) not in SUFFIXES:
+        return None
+    try:
+        return Fraction(match.group(1)) * SUFFIXES[match.group(2)]
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def canonical(resource, value):
+    """
+    Convert a quantity to an integer in the canonical unit of the resource
+    :param resource: cpu, memory, ephemeral-storage or storage
+    :type resource: str
+    :param value: quantity string
+    :type value: str
+    :return: millicores for cpu, bytes otherwise; None when not a quantity
+    :rtype: int
+    """
+    if value is None:
+        return None
+    return _canonical(resource, value if isinstance(value, str) else str(value))
+
+
+# The same few quantities repeat across all containers of a cluster
+@functools.lru_cache(maxsize=4096)
+def _canonical(resource, value):
+    quantity = parse_quantity(value)
+    if quantity is None:
+        return None
+    return math.ceil(quantity * SCALE.get(resource, 1))
+
+
+def within_tolerance(deployed, baseline, tolerance=0.0):
+    """
+    Compare canonical values allowing a relative tolerance of the baseline
+    :param deployed:
+    :type deployed: int
+    :param baseline:
+    :type baseline: int
+    :param tolerance: allowed relative deviation, e.g. 0.05 for 5 %
+    :type tolerance: float
+    :return:
+    :rtype: bool
+    """
+    return abs(deployed - baseline) <= tolerance * abs(baseline)
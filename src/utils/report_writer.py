@@ -0,0 +1,263 @@
+"""
+Streaming report writers with pluggable output formats
+
+Every backend receives rows as they are produced and writes them out without
+building a table in memory first. Third party libraries are only imported
+when their backend is selected.
+"""
+import csv
+import itertools
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+
+PARQUET_BATCH_SIZE = 1000
+# Excel limits sheet titles to 31 characters without any of : \ / ? * [ ]
+MAX_SHEET_NAME = 31
+INVALID_SHEET_CHARS = re.compile(r'[:\\/?*\[\]]')
+
+
+def safe_sheet_name(sheet_name, used=()):
+    """
+    Return a sheet name valid as an Excel title and as part of a file name, unique among used
+    :param sheet_name:
+    :type sheet_name: str
+    :param used: names already taken in the report
+    :type used: set
+    :return:
+    :rtype: str
+    """
+    name = INVALID_SHEET_CHARS.sub('_', sheet_name)[:MAX_SHEET_NAME] or 'sheet'
+    number = 1
+    while name in used:
+        number += 1
+        suffix = f'~{number}'
+        name = INVALID_SHEET_CHARS.sub('_', sheet_name)[:MAX_SHEET_NAME - len(suffix)] + suffix
+    return name
+
+
+def _cell(value):
+    """Render nested values as JSON so every backend gets a scalar."""
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value)
+    return value
+
+
+class ReportWriter(ABC):
+    """Base class; rows are dicts, files_written lists the files the report consists of."""
+    extension = ''
+
+    def __init__(self, file_name):
+        self.file_name = os.path.splitext(file_name)[0] + self.extension
+        self.rows_written = 0
+        self.sheet_names = set()
+        self.files_written = []
+
+    def write_sheet(self, sheet_name, rows, headers=None):
+        """
+        Write a named table
+        :param sheet_name: made a valid, unique title, see safe_sheet_name
+        :type sheet_name: str
+        :param rows: iterable of dicts
+        :type rows: iterable
+        :param headers: columns of the sheet, the keys of the first row by default; keys other rows
+                        add are not written
+        :type headers: list
+        """
+        sheet_name = safe_sheet_name(sheet_name, self.sheet_names)
+        self.sheet_names.add(sheet_name)
+        if headers is None:
+            rows = iter(rows)
+            first = next(rows, None)
+            headers = [] if first is None else list(first)
+            rows = rows if first is None else itertools.chain([first], rows)
+        self.start_sheet(sheet_name, headers)
+        try:
+            for row in rows:
+                self.write_row([_cell(row.get(header, '')) for header in headers])
+                self.rows_written += 1
+        finally:
+            self.end_sheet()
+
+    @abstractmethod
+    def start_sheet(self, sheet_name, headers):
+        """Begin a sheet with its header row."""
+
+    @abstractmethod
+    def write_row(self, values):
+        """Write one row of the current sheet."""
+
+    def end_sheet(self):
+        """Finish the current sheet."""
+
+    def close(self):
+        """Finish the report."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class XlsxWriter(ReportWriter):
+    """Write-only openpyxl workbook, rows are streamed to the sheet XML."""
+    extension = '.xlsx'
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        from openpyxl import Workbook  # pylint: disable=import-outside-toplevel
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+
+    def start_sheet(self, sheet_name, headers):
+        self.sheet = self.workbook.create_sheet(title=sheet_name)
+        if headers:
+            self.sheet.append(headers)
+
+    def write_row(self, values):
+        self.sheet.append(values)
+
+    def close(self):
+        if not self.workbook.worksheets:
+            self.workbook.create_sheet()
+        self.workbook.save(self.file_name)
+        self.files_written.append(self.file_name)
+
+
+class CsvWriter(ReportWriter):
+    """One CSV file per sheet, named <report>_<sheet>.csv."""
+    extension = '.csv'
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        self.base_name = os.path.splitext(self.file_name)[0]
+        self.file = None
+        self.writer = None
+
+    def start_sheet(self, sheet_name, headers):
+        file_name = f"{self.base_name}_{sheet_name}.csv"
+        self.file = open(file_name, 'w', newline='')  # pylint: disable=consider-using-with
+        self.files_written.append(file_name)
+        self.writer = csv.writer(self.file)
+        if headers:
+            self.writer.writerow(headers)
+
+    def write_row(self, values):
+        self.writer.writerow(values)
+
+    def end_sheet(self):
+        self.file.close()
+
+
+class JsonLinesWriter(ReportWriter):
+    """Single JSON lines file, every row tagged with its sheet name."""
+    extension = '.jsonl'
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        self.file = open(self.file_name, 'w')  # pylint: disable=consider-using-with
+        self.files_written.append(self.file_name)
+        self.sheet_name = None
+        self.headers = None
+
+    def start_sheet(self, sheet_name, headers):
+        self.sheet_name, self.headers = sheet_name, headers
+
+    def write_row(self, values):
+        record = {'sheet': self.sheet_name, **dict(zip(self.headers, values))}
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter(ReportWriter):
+    """One Parquet file per sheet, written in row groups of PARQUET_BATCH_SIZE rows."""
+    extension = '.parquet'
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+        self.pa = pyarrow
+        self.base_name = os.path.splitext(self.file_name)[0]
+        self.writer = None
+        self.headers = None
+        self.batch = []
+
+    def start_sheet(self, sheet_name, headers):
+        self.headers = headers
+        schema = self.pa.schema([(header, self.pa.string()) for header in headers])
+        file_name = f"{self.base_name}_{sheet_name}.parquet"
+        self.writer = self.pa.parquet.ParquetWriter(file_name, schema)
+        self.files_written.append(file_name)
+
+    def write_row(self, values):
+        self.batch.append(['' if value is None else str(value) for value in values])
+        if len(self.batch) >= PARQUET_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            columns = list(zip(*self.batch))
+            self.writer.write_table(self.pa.table(
+                {header: list(column) for header, column in zip(self.headers, columns)}, schema=self.writer.schema))
+            self.batch = []
+
+    def end_sheet(self):
+        self._flush()
+        self.writer.close()
+
+
+class PandasWriter(ReportWriter):
+    """Previous behaviour: one DataFrame per sheet written through pandas.ExcelWriter."""
+    extension = '.xlsx'
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        import pandas  # pylint: disable=import-outside-toplevel
+        self.pd = pandas
+        self.excel_writer = pandas.ExcelWriter(self.file_name)
+        self.sheet_name = None
+        self.headers = None
+        self.rows = []
+
+    def start_sheet(self, sheet_name, headers):
+        self.sheet_name, self.headers, self.rows = sheet_name, headers, []
+
+    def write_row(self, values):
+        self.rows.append(values)
+
+    def end_sheet(self):
+        data_frame = self.pd.DataFrame(self.rows, columns=self.headers)
+        data_frame.to_excel(self.excel_writer, sheet_name=self.sheet_name, index=False)
+
+    def close(self):
+        self.excel_writer.close()
+        self.files_written.append(self.file_name)
+
+
+BACKENDS = {
+    'xlsx': XlsxWriter,
+    'csv': CsvWriter,
+    'jsonl': JsonLinesWriter,
+    'parquet': ParquetWriter,
+    'pandas': PandasWriter,
+}
+
+
+def open_report(file_name, backend='xlsx'):
+    """
+    Return a report writer for the selected backend
+    :param file_name: report file name, its extension is replaced by the backend's
+    :type file_name: str
+    :param backend: xlsx, csv, jsonl, parquet or pandas
+    :type backend: str
+    :return: writer usable as a context manager
+    :rtype: ReportWriter
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown report format '{backend}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[backend](file_name)
@@ -0,0 +1,67 @@
+"""
+Import time breakdown of the job start-up
+"""
+import builtins
+import sys
+import time
+
+
+class ImportProfiler:
+    """
+    Context manager timing every module imported for the first time while active;
+    cumulative time includes the module's own imports, self time excludes them
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.total = 0.0
+        self._original_import = None
+        self._stack = []
+        self._start = 0.0
+
+    def __enter__(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total = time.perf_counter() - self._start
+        builtins.__import__ = self._original_import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):  # pylint: disable=redefined-builtin
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.records[name] = (elapsed, elapsed - children)
+
+    def report(self, budget=None, top=25):
+        """
+        Return a printable breakdown of the slowest imports
+        :param budget: allowed total seconds, flagged when exceeded
+        :type budget: float
+        :param top: number of modules listed
+        :type top: int
+        :return:
+        :rtype: str
+        """
+        lines = [f"{'cumulative':>12} {'self':>10}  module"]
+        slowest = sorted(self.records.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        for name, (cumulative, own) in slowest:
+            lines.append(f"{cumulative * 1000:10.1f}ms {own * 1000:8.1f}ms  {name}")
+        lines.append(f"Total start-up: {self.total * 1000:.1f}ms over {len(self.records)} modules")
+        if budget is not None and self.total > budget:
+            lines.append(f"Start-up exceeds the budget of {budget * 1000:.0f}ms")
+        return '\n'.join(lines)
+
+    def within(self, budget):
+        """True when the profiled start-up fits in budget seconds."""
+        return self.total <= budget
@@ -0,0 +1,123 @@
+"""
+Local HTTP API server serving a FakeCluster, for the async client
+
+Lists are paginated with limit/continue, watch=true streams the queued watch
+events as JSON lines, pod logs honour limitBytes and exec answers on the v4
+channel websocket protocol. Requires aiohttp.
+"""
+import asyncio
+import json
+import threading
+
+from aiohttp import web
+
+# URL plural -> FakeCluster resource type
+PLURALS = {'deployments': 'deployments', 'statefulsets': 'statefulsets', 'daemonsets': 'daemonsets',
+           'cronjobs': 'cronjobs', 'persistentvolumeclaims': 'pvc', 'pods': 'pods', 'events': 'events'}
+
+
+class FakeApiServer:
+    """
+    Serve a FakeCluster on 127.0.0.1 from a background event loop while the context is active
+    :param cluster:
+    :type cluster: FakeCluster
+    :param delay: seconds every request takes, to observe concurrency
+    :type delay: float
+    """
+
+    def __init__(self, cluster, delay=0.0):
+        self.cluster = cluster
+        self.delay = delay
+        self.events = {}
+        self.watch_events = {}
+        self.logs = {}
+        self.exec_results = {}
+        self.requests = []
+        self.authorization = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner = None
+
+    @web.middleware
+    async def _track(self, request, handler):
+        self.requests.append(request.path_qs)
+        self.authorization = request.headers.get('Authorization')
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    def _items(self, namespace, plural):
+        if plural == 'events':
+            return self.events.get(namespace, [])
+        return self.cluster.items(namespace, PLURALS[plural])
+
+    async def _list(self, request):
+        namespace, plural = request.match_info['namespace'], request.match_info['plural']
+        if plural not in PLURALS or namespace not in self.cluster.objects:
+            raise web.HTTPNotFound()
+        if request.query.get('watch') == 'true':
+            response = web.StreamResponse()
+            await response.prepare(request)
+            for event in self.watch_events.get(namespace, []):
+                await response.write(json.dumps(event).encode() + b'\n')
+            await response.write_eof()
+            return response
+        items = self._items(namespace, plural)
+        start = int(request.query.get('continue') or 0)
+        limit = int(request.query.get('limit') or len(items) or 1)
+        metadata = {'resourceVersion': '1'}
+        if start + limit < len(items):
+            metadata['continue'] = str(start + limit)
+        return web.json_response({'items': items[start:start + limit], 'metadata': metadata})
+
+    async def _log(self, request):
+        key = (request.match_info['pod'], request.query.get('container'))
+        if key not in self.logs or request.query.get('previous') != 'true':
+            raise web.HTTPBadRequest(reason='previous terminated container not found')
+        limit = int(request.query.get('limitBytes') or 0)
+        data = self.logs[key].encode()
+        return web.Response(body=data[:limit] if limit else data)
+
+    async def _exec(self, request):
+        socket = web.WebSocketResponse(protocols=('v4.channel.k8s.io',))
+        await socket.prepare(request)
+        command = ' '.join(request.query.getall('command'))
+        stdout, exit_code = self.exec_results.get(command, (f'ran {command}\n', 0))
+        await socket.send_bytes(b'\x01' + stdout.encode())
+        status = {'status': 'Success'} if exit_code == 0 else {
+            'status': 'Failure', 'details': {'causes': [{'reason': 'ExitCode', 'message': str(exit_code)}]}}
+        await socket.send_bytes(b'\x03' + json.dumps(status).encode())
+        await socket.close()
+        return socket
+
+    async def _start(self):
+        app = web.Application(middlewares=[self._track])
+        app.router.add_get('/api/v1/namespaces/{namespace}/pods/{pod}/log', self._log)
+        app.router.add_get('/api/v1/namespaces/{namespace}/pods/{pod}/exec', self._exec)
+        app.router.add_get('/api/v1/namespaces/{namespace}/{plural}', self._list)
+        app.router.add_get('/apis/{group}/{version}/namespaces/{namespace}/{plural}', self._list)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # pylint: disable=protected-access
+        self.url = f'http://127.0.0.1:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,211 @@
+"""
+Synthetic cluster fixtures scaled up from the shape of the resource baseline
+
+Objects are kept as the JSON the API server sends. The fake list calls serve them
+page by page either raw (_preload_content=False) or deserialized into the
+kubernetes client model objects, as the real client does.
+"""
+import contextlib
+import json
+import random
+from unittest import mock
+
+from kubernetes import client
+
+BASELINE_FILE = 'config/jobs/monitor_resources/eo_resources_details_baseline.json'
+WORKLOAD_TYPES = ('deployments', 'statefulsets', 'cronjobs', 'daemonsets')
+OWNER_KINDS = {'deployments': 'ReplicaSet', 'statefulsets': 'StatefulSet', 'cronjobs': 'Job',
+               'daemonsets': 'DaemonSet'}
+# kubernetes client list method -> (resource type, list model)
+LIST_METHODS = {
+    'list_namespaced_deployment': ('deployments', 'V1DeploymentList'),
+    'list_namespaced_stateful_set': ('statefulsets', 'V1StatefulSetList'),
+    'list_namespaced_daemon_set': ('daemonsets', 'V1DaemonSetList'),
+    'list_namespaced_cron_job': ('cronjobs', 'V1CronJobList'),
+    'list_namespaced_persistent_volume_claim': ('pvc', 'V1PersistentVolumeClaimList'),
+    'list_namespaced_pod': ('pods', 'V1PodList'),
+}
+
+
+def baseline_templates(baseline_file=BASELINE_FILE):
+    """
+    Return the container specs and claim capacities of the baseline, used as building blocks
+    :param baseline_file:
+    :type baseline_file: str
+    :return: list of {'limits': ..., 'requests': ...} and list of capacities
+    :rtype: tuple
+    """
+    with open(baseline_file) as file:
+        baseline = json.load(file)
+    specs = [spec for category in WORKLOAD_TYPES for items in baseline.get(category, {}).values()
+             for details in items.values() for spec in details.get('data', {}).values()]
+    capacities = [details['capacity'] for items in baseline.get('pvc', {}).values() for details in items.values()
+                  if isinstance(details.get('capacity'), str)]
+    return specs, capacities
+
+
+def _drifted(spec):
+    """Return a copy of a container spec with its cpu limit doubled."""
+    limits = dict(spec.get('limits', {}))
+    limits['cpu'] = '4' if limits.get('cpu') in (None, '2') else '2'
+    return {**spec, 'limits': limits}
+
+
+class RawResponse:
+    """The parts of a urllib3 response used by the raw list path."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def release_conn(self):
+        pass
+
+
+class FakeApi:
+    """Serve the list_namespaced_* calls of the kubernetes client APIs from a FakeCluster, page by page."""
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.api_client = client.ApiClient()
+
+    def __getattr__(self, method):
+        if method not in LIST_METHODS:
+            raise AttributeError(method)
+        resource_type, list_model = LIST_METHODS[method]
+
+        def list_namespaced(namespace, limit=None, _continue=None, _preload_content=True, **kwargs):
+            items = self.cluster.items(namespace, resource_type)
+            start = int(_continue or 0)
+            end = start + limit if limit else len(items)
+            metadata = {'resourceVersion': '1'}
+            if end < len(items):
+                metadata['continue'] = str(end)
+            body = json.dumps({'items': items[start:end], 'metadata': metadata})
+            if not _preload_content:
+                return RawResponse(body.encode())
+            return self.api_client.deserialize(body, list_model, 'application/json')
+        list_namespaced.__name__ = method
+        return list_namespaced
+
+
+class FakeCluster:
+    """
+    N namespaces x M workloads x K containers, with one claim per workload and
+    one pod per replica. Container specs and capacities are drawn from the
+    baseline, so the generated cluster has the same shape at any scale.
+    A drift share of the containers deviates from the generated baseline.
+    """
+
+    def __init__(self, namespaces=1, workloads=50, containers=2, replicas=2, drift=0.05, seed=0,
+                 baseline_file=BASELINE_FILE):
+        specs, capacities = baseline_templates(baseline_file)
+        rng = random.Random(seed)
+        self.namespaces = [f'ns-{index}' for index in range(namespaces)]
+        self.objects = {namespace: {resource_type: [] for resource_type, _ in LIST_METHODS.values()}
+                        for namespace in self.namespaces}
+        # Every namespace is compared against the baseline profile 'cm'
+        self.baseline = {resource_type: {'cm': {}} for resource_type in WORKLOAD_TYPES + ('pvc',)}
+
+        for namespace in self.namespaces:
+            for index in range(workloads):
+                resource_type = WORKLOAD_TYPES[index % len(WORKLOAD_TYPES)]
+                name = f'{resource_type[:-1]}-{index}'
+                approved = [rng.choice(specs) for _ in range(containers)]
+                deployed = [_drifted(spec) if rng.random() < drift else spec for spec in approved]
+                self.objects[namespace][resource_type].append(
+                    self._workload(namespace, name, resource_type, deployed, replicas))
+                self.baseline[resource_type]['cm'][name] = {
+                    'data': {f'c{position}': spec for position, spec in enumerate(approved)},
+                    'replica_count': str(replicas)}
+
+                capacity = rng.choice(capacities)
+                self.objects[namespace]['pvc'].append(self._claim(namespace, f'data-{name}', capacity))
+                self.baseline['pvc']['cm'][f'data-{name}'] = {'capacity': capacity}
+
+                for replica in range(replicas if resource_type != 'cronjobs' else 1):
+                    self.objects[namespace]['pods'].append(
+                        self._pod(namespace, f'{name}-{replica}', name, OWNER_KINDS[resource_type], containers, rng))
+
+    @staticmethod
+    def _workload(namespace, name, resource_type, specs, replicas):
+        containers = [{'name': f'c{position}', 'image': 'registry/app:1.0',
+                       'resources': {key: spec[key] for key in ('limits', 'requests') if key in spec}}
+                      for position, spec in enumerate(specs)]
+        template = {'metadata': {'labels': {'app': name}}, 'spec': {'containers': containers}}
+        spec = {'selector': {'matchLabels': {'app': name}}, 'template': template}
+        if resource_type in ('deployments', 'statefulsets'):
+            spec['replicas'] = replicas
+        if resource_type == 'statefulsets':
+            spec['serviceName'] = name
+        if resource_type == 'cronjobs':
+            spec = {'schedule': '0 * * * *', 'jobTemplate': {'spec': {'template': template}}}
+        return {'metadata': {'name': name, 'namespace': namespace, 'uid': f'{namespace}/{name}'}, 'spec': spec}
+
+    @staticmethod
+    def _claim(namespace, name, capacity):
+        return {'metadata': {'name': name, 'namespace': namespace},
+                'spec': {'accessModes': ['ReadWriteOnce'], 'resources': {'requests': {'storage': capacity}}},
+                'status': {'phase': 'Bound', 'capacity': {'storage': capacity}}}
+
+    @staticmethod
+    def _pod(namespace, name, owner, kind, containers, rng):
+        statuses = [{'name': f'c{position}', 'restartCount': rng.randint(0, 3), 'image': 'registry/app:1.0',
+                     'imageID': '', 'ready': True, 'lastState': {}}
+                    for position in range(containers)]
+        return {
+            'metadata': {'name': name, 'namespace': namespace, 'uid': f'{namespace}/{name}', 'labels': {},
+                         'ownerReferences': [{'apiVersion': 'apps/v1', 'kind': kind, 'name': owner,
+                                              'uid': f'{namespace}/{owner}', 'controller': True}]},
+            'spec': {'nodeName': f'node-{rng.randint(0, 9)}',
+                     'containers': [{'name': f'c{position}'} for position in range(containers)]},
+            'status': {'phase': 'Running', 'containerStatuses': statuses},
+        }
+
+    def items(self, namespace, resource_type):
+        """Return the objects of a resource type in a namespace."""
+        return self.objects[namespace][resource_type]
+
+    def pod_states(self, restart_share=0.05, seed=0):
+        """
+        Return an initial and a final pod state, as built by create_pod_state,
+        where a share of the containers restarted in between
+        :return: two lists of container records
+        :rtype: tuple
+        """
+        rng = random.Random(seed)
+        initial = []
+        for namespace in self.namespaces:
+            for pod in self.objects[namespace]['pods']:
+                metadata = pod['metadata']
+                owner_reference = metadata['ownerReferences'][0]
+                for status in pod['status']['containerStatuses']:
+                    initial.append({'Pod': metadata['name'], 'Container': status['name'],
+                                    'Restarts': status['restartCount'],
+                                    'Owner': f"{owner_reference['kind']}/{owner_reference['name']}",
+                                    'Uid': metadata['uid'], 'Node': pod['spec']['nodeName'],
+                                    'Image': status['image'], 'Reason': ''})
+        final = [{**record, 'Restarts': record['Restarts'] + 1, 'Reason': 'OOMKilled'}
+                 if rng.random() < restart_share else record for record in initial]
+        return initial, final
+
+    @contextlib.contextmanager
+    def serve(self):
+        """Route the kubernetes client API classes to this cluster while the context is active."""
+        api = FakeApi(self)
+        with mock.patch('kubernetes.client.CoreV1Api', return_value=api), \
+                mock.patch('kubernetes.client.AppsV1Api', return_value=api), \
+                mock.patch('kubernetes.client.BatchV1Api', return_value=api):
+            yield api
+
+    def size(self):
+        """Number of workload containers, claims and pod containers."""
+        def containers(obj):
+            spec = obj['spec'].get('jobTemplate', {}).get('spec', obj['spec'])
+            return len(spec['template']['spec']['containers'])
+        return {
+            'containers': sum(containers(obj) for objects in self.objects.values()
+                              for resource_type in WORKLOAD_TYPES for obj in objects[resource_type]),
+            'claims': sum(len(objects['pvc']) for objects in self.objects.values()),
+            'pod_containers': sum(len(pod['status']['containerStatuses']) for objects in self.objects.values()
+                                  for pod in objects['pods']),
+        }
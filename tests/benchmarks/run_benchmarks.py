@@ -0,0 +1,277 @@
+"""
+Benchmarks of the monitoring jobs against synthetic clusters of increasing size
+
+    python -m tests.benchmarks.run_benchmarks [--scales small,medium] [--memory] [--output results.json]
+                                             [--reference tests/benchmarks/reference.json] [--threshold 1.5]
+                                             [--update-reference]
+
+Every benchmark is timed as the best of --repeat runs per scale. Results are
+written as JSON; the exit code is 1 when a benchmark is slower than its
+reference by more than the threshold factor. A missing reference file is an
+error unless --update-reference creates it.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from tests.benchmarks.fake_cluster import WORKLOAD_TYPES, FakeCluster
+
+# name -> (namespaces, workloads per namespace, containers per workload)
+SCALES = {
+    'small': (1, 50, 2),
+    'medium': (4, 200, 2),
+    'large': (8, 500, 3),
+}
+REFERENCE_FILE = os.path.join(os.path.dirname(__file__), 'reference.json')
+DEFAULT_THRESHOLD = 1.5
+# Timings below this many seconds are treated as equal, they are mostly noise
+MIN_SECONDS = 0.005
+RESOURCE_TYPES = list(WORKLOAD_TYPES) + ['pvc']
+TOLERANCES = {'cpu': 0.0, 'memory': 0.0, 'ephemeral-storage': 0.0, 'storage': 0.0}
+
+
+def bench_collect_resources(cluster):
+    from src.jobs.monitor_resources.monitor_resources import ResourceMonitor
+    monitor = ResourceMonitor(None)
+    monitor.resource_types = RESOURCE_TYPES
+    return lambda: monitor.collect_resources(cluster.namespaces)
+
+
+def _bench_resource_rows(raw):
+    def bench(cluster):
+        from src.utils.k8s_resources import iter_resource_rows
+
+        def collect():
+            with mock.patch.dict(os.environ, {'K8S_RAW_LISTS': '1' if raw else '0'}):
+                return {namespace: {resource_type: list(iter_resource_rows(namespace, resource_type))
+                                    for resource_type in RESOURCE_TYPES}
+                        for namespace in cluster.namespaces}
+        return collect
+    return bench
+
+
+def _collected(cluster):
+    from src.utils.k8s_resources import raw_resource_rows
+    return {namespace: {resource_type: [row for obj in cluster.items(namespace, resource_type)
+                                        for row in raw_resource_rows(obj, resource_type)]
+                        for resource_type in RESOURCE_TYPES}
+            for namespace in cluster.namespaces}
+
+
+def bench_compare_rows(cluster):
+    from src.jobs.monitor_resources.baseline import CompiledBaseline, compare_rows
+    resources = _collected(cluster)
+    baseline = CompiledBaseline.compile(cluster.baseline)
+    return lambda: [compare_rows(rows, baseline, resource_type, 'cm', TOLERANCES)
+                    for types in resources.values() for resource_type, rows in types.items()]
+
+
+def bench_capacity_rollup(cluster):
+    from src.jobs.monitor_resources.baseline import CompiledBaseline
+    from src.jobs.monitor_resources.capacity import baseline_totals, deployed_totals, namespace_rows
+    resources = _collected(cluster)
+    baseline = CompiledBaseline.compile(cluster.baseline)
+    namespace_map = {namespace: 'cm' for namespace in cluster.namespaces}
+    return lambda: list(namespace_rows(deployed_totals(resources, 10), baseline_totals(baseline, namespace_map, 10),
+                                       namespace_map))
+
+
+def _bench_report(backend):
+    def bench(cluster):
+        from src.utils.report_writer import open_report
+        resources = _collected(cluster)
+
+        def write():
+            # Creating and removing the directory is negligible next to writing the report
+            with tempfile.TemporaryDirectory() as workdir, \
+                    open_report(os.path.join(workdir, f'Resources.{backend}'), backend) as writer:
+                for namespace, types in resources.items():
+                    for resource_type, rows in types.items():
+                        writer.write_sheet(f'{namespace}_{resource_type}', rows)
+        return write
+    return bench
+
+
+def bench_create_pod_state(cluster):
+    from kubernetes import client
+    from src.jobs.pod_monitor.records import raw_pod_records
+    from src.utils.k8s_pager import paginate_pages, raw_list_func
+    return lambda: [raw_pod_records(page.items) for namespace in cluster.namespaces
+                    for page in paginate_pages(raw_list_func(client.CoreV1Api().list_namespaced_pod), namespace)]
+
+
+def bench_create_pod_state_models(cluster):
+    from src.jobs.pod_monitor.records import pod_records
+    from src.utils.k8s_pager import list_namespaced_pods
+    return lambda: [pod_records(list_namespaced_pods(namespace)) for namespace in cluster.namespaces]
+
+
+def bench_compare_pod_states(cluster):
+    from src.jobs.pod_monitor.restart_index import compare_pod_states
+    initial, final = cluster.pod_states()
+    return lambda: compare_pod_states(initial, final)
+
+
+BENCHMARKS = {
+    'collect_resources': bench_collect_resources,
+    'resource_rows': _bench_resource_rows(raw=True),
+    'resource_rows_models': _bench_resource_rows(raw=False),
+    'compare_rows': bench_compare_rows,
+    'capacity_rollup': bench_capacity_rollup,
+    'write_report_xlsx': _bench_report('xlsx'),
+    'write_report_csv': _bench_report('csv'),
+    'create_pod_state': bench_create_pod_state,
+    'create_pod_state_models': bench_create_pod_state_models,
+    'compare_pod_states': bench_compare_pod_states,
+}
+
+
+def time_call(func, repeat):
+    """
+    Return the best wall time of repeated calls, with garbage collection paused
+    :param func:
+    :type func: callable
+    :param repeat:
+    :type repeat: int
+    :return: seconds
+    :rtype: float
+    """
+    best = float('inf')
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+    finally:
+        if enabled:
+            gc.enable()
+    return best
+
+
+def peak_memory(func):
+    """
+    Return the peak of memory allocated by Python during one call
+    :param func:
+    :type func: callable
+    :return: bytes
+    :rtype: int
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(scales, benchmarks=None, repeat=3, memory=False):
+    """
+    Run the benchmarks on a synthetic cluster per scale
+    :param scales: scale name -> (namespaces, workloads, containers)
+    :type scales: dict
+    :param benchmarks: benchmark names, all when omitted
+    :type benchmarks: list
+    :param repeat: runs per benchmark, the fastest counts
+    :type repeat: int
+    :param memory: add the peak allocated bytes of an extra, traced run
+    :type memory: bool
+    :return: one result per benchmark and scale
+    :rtype: list
+    """
+    results = []
+    for scale, (namespaces, workloads, containers) in scales.items():
+        cluster = FakeCluster(namespaces=namespaces, workloads=workloads, containers=containers)
+        with cluster.serve():
+            for name in benchmarks or BENCHMARKS:
+                result = {'benchmark': name, 'scale': scale, 'shape': [namespaces, workloads, containers],
+                          **cluster.size()}
+                try:
+                    func = BENCHMARKS[name](cluster)
+                except ImportError as err:
+                    # Jobs whose dependencies are not installed are reported, not failed
+                    results.append({**result, 'status': 'skipped', 'reason': str(err)})
+                    continue
+                result.update(status='ok', seconds=round(time_call(func, repeat), 6))
+                if memory:
+                    result['peak_bytes'] = peak_memory(func)
+                results.append(result)
+    return results
+
+
+def regressions(results, reference, threshold=DEFAULT_THRESHOLD):
+    """
+    Return the results slower than their reference by more than the threshold factor
+    :param results: as returned by run
+    :type results: list
+    :param reference: "benchmark/scale" -> seconds
+    :type reference: dict
+    :param threshold: allowed slowdown factor
+    :type threshold: float
+    :return: results extended with reference and ratio
+    :rtype: list
+    """
+    slower = []
+    for result in results:
+        expected = reference.get(f"{result['benchmark']}/{result['scale']}")
+        if result['status'] != 'ok' or expected is None:
+            continue
+        if result['seconds'] > max(expected, MIN_SECONDS) * threshold:
+            slower.append({**result, 'reference': expected, 'ratio': round(result['seconds'] / expected, 2)})
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the monitoring jobs on synthetic clusters')
+    parser.add_argument('--scales', default='small,medium', help=f"Comma separated, from {', '.join(SCALES)}")
+    parser.add_argument('--benchmarks', default='', help=f"Comma separated, from {', '.join(BENCHMARKS)}")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--memory', action='store_true', help='Also record the peak allocated memory')
+    parser.add_argument('--output', help='Write the results JSON here instead of stdout')
+    parser.add_argument('--reference', default=REFERENCE_FILE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Fail when slower than the reference by more than this factor')
+    parser.add_argument('--update-reference', action='store_true', help='Store these timings as the reference')
+    args = parser.parse_args(argv)
+    if not args.update_reference and not os.path.isfile(args.reference):
+        parser.error(f"reference {args.reference} not found, create it on this machine with --update-reference")
+
+    scales = {scale: SCALES[scale] for scale in args.scales.split(',')}
+    results = run(scales, [name for name in args.benchmarks.split(',') if name], args.repeat, args.memory)
+
+    reference = {}
+    if os.path.isfile(args.reference):
+        with open(args.reference) as file:
+            reference = json.load(file)
+    if args.update_reference:
+        reference.update({f"{result['benchmark']}/{result['scale']}": result['seconds']
+                          for result in results if result['status'] == 'ok'})
+        with open(args.reference, 'w') as file:
+            json.dump(reference, file, indent=2, sort_keys=True)
+            file.write('\n')
+
+    slower = regressions(results, reference, args.threshold)
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'threshold': args.threshold,
+              'results': results, 'regressions': slower}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    for result in slower:
+        print(f"{result['benchmark']}/{result['scale']}: {result['seconds']:.4f}s, "
+              f"{result['ratio']}x the reference of {result['reference']:.4f}s", file=sys.stderr)
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
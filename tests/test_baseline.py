@@ -0,0 +1,117 @@
+import os
+
+from src.jobs.monitor_resources.baseline import CompiledBaseline, compare_rows, kind_schemas, load_compiled_baseline
+from src.utils.quantity import canonical, parse_quantity
+
+BASELINE_FILE = 'config/jobs/monitor_resources/eo_resources_details_baseline.json'
+BASELINE = {
+    'deployments': {'cm': {'web': {'data': {'app': {
+        'limits': {'cpu': '1', 'memory': '1Gi'},
+        'requests': {'cpu': '500m', 'memory': '512Mi', 'ephemeral-storage': '1Gi'}}}, 'replica_count': '2'}}},
+    'pvc': {'cm': {'data-web-0': {'capacity': '20Gi'}}},
+}
+NO_TOLERANCE = {}
+
+
+def _row(**values):
+    row = {'Name': 'web', 'Namespace': 'ns', 'Container Name': 'app',
+           'CPU Limits': '1000m', 'Memory Limits': '1024Mi',
+           'CPU Requests': '0.5', 'Memory Requests': '512Mi', 'Ephemeral-storage Requests': '1Gi'}
+    row.update(values)
+    return row
+
+
+class TestQuantity:
+
+    def test_units(self):
+        assert canonical('cpu', '1') == canonical('cpu', '1000m') == 1000
+        assert canonical('memory', '1Gi') == canonical('memory', '1024Mi') == 2 ** 30
+        assert canonical('memory', '1G') == 10 ** 9
+        assert canonical('cpu', '2e-1') == 200
+
+    def test_not_a_quantity(self):
+        assert parse_quantity('Not specified') is None
+        assert parse_quantity('') is None
+        assert parse_quantity(None) is None
+
+
+class TestCompareRows:
+
+    def test_equivalent_quantities_match(self):
+        baseline = CompiledBaseline.compile(BASELINE)
+        assert compare_rows([_row()], baseline, 'deployments', 'cm', NO_TOLERANCE) == ({}, {})
+
+    def test_difference_and_tolerance(self):
+        baseline = CompiledBaseline.compile(BASELINE)
+        differences, _ = compare_rows([_row(**{'CPU Limits': '1050m'})], baseline, 'deployments', 'cm', NO_TOLERANCE)
+        assert differences['web']['app']['limits'] == {
+            'deployed': {'cpu': '1050m', 'memory': '1024Mi'},
+            'baseline': {'cpu': '1', 'memory': '1Gi'}}
+        assert compare_rows([_row(**{'CPU Limits': '1050m'})], baseline, 'deployments', 'cm', {'cpu': 0.05}) == ({}, {})
+
+    def test_not_specified_and_missing(self):
+        baseline = CompiledBaseline.compile(BASELINE)
+        differences, not_in_baseline = compare_rows(
+            [_row(**{'Memory Limits': 'Not specified'}), _row(Name='other')], baseline, 'deployments', 'cm', {})
+        assert 'limits' in differences['web']['app']
+        assert list(not_in_baseline) == ['other']
+
+    def test_pvc_capacity(self):
+        baseline = CompiledBaseline.compile(BASELINE)
+        rows = [{'Name': 'data-web-0', 'Capacity': '20480Mi'}]
+        assert compare_rows(rows, baseline, 'pvc', 'cm', {}) == ({}, {})
+        rows = [{'Name': 'data-web-0', 'Capacity': '10Gi'}]
+        assert compare_rows(rows, baseline, 'pvc', 'cm', {})[0] == {
+            'data-web-0': {'Capacity': {'deployed': '10Gi', 'baseline': '20Gi'}}}
+
+    def test_field_missing_from_the_baseline(self):
+        baseline = CompiledBaseline.compile({'deployments': {'cm': {'web': {'data': {'app': {
+            'limits': {'cpu': '1'},
+            'requests': {'cpu': '500m', 'ephemeral-storage': '1Gi'}}}}}},
+            'pvc': {'cm': {'data-web-0': {}}}})
+        row = _row(**{'Memory Limits': 'Not specified', 'Memory Requests': 'Not specified'})
+        differences, _ = compare_rows([row], baseline, 'deployments', 'cm', {})
+        # Unset fields differ from 'Not specified' and are not reported as baseline values
+        assert differences['web']['app'] == {'limits': {'deployed': {'cpu': '1000m', 'memory': 'Not specified'},
+                                                        'baseline': {'cpu': '1'}}}
+        differences, _ = compare_rows([{'Name': 'data-web-0', 'Capacity': '10Gi'}], baseline, 'pvc', 'cm', {})
+        assert differences == {'data-web-0': {'Capacity': {'deployed': '10Gi', 'baseline': None}}}
+
+    def test_unsorted_rows_and_unknown_container(self):
+        baseline = CompiledBaseline.compile({**BASELINE, 'deployments': {'cm': {
+            **BASELINE['deployments']['cm'], 'api': {'data': {'app': {'limits': {'cpu': '1'}}}}}}})
+        rows = [_row(), {'Name': 'api', 'Container Name': 'app', 'CPU Limits': '2'}, _row(**{'Container Name': 'x'})]
+        differences, _ = compare_rows(rows, baseline, 'deployments', 'cm', {})
+        assert list(differences) == ['api', 'web']
+        assert differences['api']['app']['limits']['deployed'] == {'cpu': '2', 'memory': 'Not specified'}
+        assert list(differences['web']) == ['x']
+
+    def test_custom_presence_only(self):
+        kinds = {'rediscluster': {'label': 'rediscluster', 'groups': {}}}
+        baseline = CompiledBaseline.compile({'rediscluster': {'evnfm': {'kvdb': {'data': ['kvdb-a', 'kvdb-b']}}}},
+                                            kinds)
+        rows = [{'Name': 'kvdb', 'Namespace': 'ns'}, {'Name': 'other', 'Namespace': 'ns'}]
+        differences, not_in_baseline = compare_rows(rows, baseline, 'rediscluster', 'evnfm', {},
+                                                    kind_schemas(kinds))
+        assert differences == {}
+        assert not_in_baseline['other']['type'] == 'rediscluster'
+
+    def test_declared_kind(self):
+        kinds = {'services': {'label': 'Service', 'groups': {
+            'Type': {'scalar': True, 'fields': [{'column': 'Type', 'name': 'type'}]},
+            'Ports': {'path': 'spec', 'fields': [{'column': 'Port', 'name': 'port', 'quantity': 'port'}]}}}}
+        baseline = CompiledBaseline.compile({'services': {'cm': {'web': {'type': 'ClusterIP',
+                                                                         'spec': {'port': '80'}}}}}, kinds)
+        rows = [{'Name': 'web', 'Type': 'NodePort', 'Port': '80.0'}]
+        differences, _ = compare_rows(rows, baseline, 'services', 'cm', {}, kind_schemas(kinds))
+        assert differences == {'web': {'Type': {'deployed': 'NodePort', 'baseline': 'ClusterIP'}}}
+
+
+class TestLoadCompiledBaseline:
+
+    def test_cache_is_reused(self, tmp_path):
+        compiled = load_compiled_baseline(BASELINE_FILE, str(tmp_path))
+        assert len(os.listdir(tmp_path)) == 1
+        cached = load_compiled_baseline(BASELINE_FILE, str(tmp_path))
+        assert cached.entries == compiled.entries
+        assert cached.contains('pvc', 'cm', 'backup-data-eric-ctrl-bro-0')
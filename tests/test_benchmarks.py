@@ -0,0 +1,45 @@
+import pytest
+
+from src.jobs.pod_monitor.restart_index import compare_pod_states
+from src.utils.k8s_resources import iter_resource_rows
+from tests.benchmarks.fake_cluster import FakeCluster
+from tests.benchmarks.run_benchmarks import main, regressions, run
+
+
+class TestFakeCluster:
+
+    def test_shape(self):
+        cluster = FakeCluster(namespaces=2, workloads=8, containers=3, replicas=2)
+        assert cluster.size() == {'containers': 48, 'claims': 16, 'pod_containers': 84}
+        assert len(cluster.baseline['deployments']['cm']) == 2
+
+    def test_serves_paginated_lists(self):
+        cluster = FakeCluster(workloads=12, containers=1)
+        with cluster.serve():
+            rows = list(iter_resource_rows('ns-0', 'deployments', page_size=2))
+        assert [row['Name'] for row in rows] == ['deployment-0', 'deployment-4', 'deployment-8']
+
+    def test_pod_states_contain_restarts(self):
+        initial, final = FakeCluster(workloads=40).pod_states(restart_share=0.5)
+        restarts, changes = compare_pod_states(initial, final)
+        assert restarts and not changes
+
+
+class TestRunBenchmarks:
+
+    def test_run_and_regressions(self):
+        results = run({'tiny': (1, 4, 1)}, ['resource_rows', 'compare_pod_states'], repeat=1)
+        assert [(result['benchmark'], result['status']) for result in results] == [
+            ('resource_rows', 'ok'), ('compare_pod_states', 'ok')]
+        results[0]['seconds'] = 1.0
+        slower = regressions(results, {'resource_rows/tiny': 0.1, 'compare_pod_states/tiny': 10.0}, threshold=1.5)
+        assert [(result['benchmark'], result['ratio']) for result in slower] == [('resource_rows', 10.0)]
+
+    def test_missing_reference_is_an_error(self, tmp_path):
+        reference = tmp_path / 'reference.json'
+        with pytest.raises(SystemExit) as error:
+            main(['--reference', str(reference), '--scales', 'small'])
+        assert error.value.code == 2
+        assert main(['--reference', str(reference), '--scales', 'small', '--benchmarks', 'compare_pod_states',
+                     '--repeat', '1', '--update-reference', '--output', str(tmp_path / 'results.json')]) == 0
+        assert 'compare_pod_states/small' in reference.read_text()
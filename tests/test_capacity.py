@@ -0,0 +1,80 @@
+from kubernetes.client.rest import ApiException
+from unittest import mock
+
+from src.jobs.monitor_resources.baseline import CompiledBaseline
+from src.jobs.monitor_resources.capacity import (NAMESPACE_COLUMNS, WORKLOAD_COLUMNS, baseline_totals, cluster_rows,
+                                                 deployed_totals, namespace_rows, node_allocatable, workload_rows)
+from tests.benchmarks.fake_cluster import RawResponse
+
+
+def _container(name, container, replicas='', cpu='500m', memory='1Gi'):
+    return {'Name': name, 'Container Name': container, 'Replicas': replicas,
+            'CPU Requests': cpu, 'Memory Requests': memory, 'CPU Limits': '1', 'Memory Limits': '2Gi'}
+
+
+RESOURCES = {'ns': {
+    'deployments': [_container('api', 'app', '3'), _container('api', 'sidecar', '3', cpu='100m', memory='128Mi')],
+    'daemonsets': [_container('agent', 'agent')],
+    'pvc': [{'Name': 'data', 'Capacity': '1Gi'}],
+}}
+
+
+class TestTotals:
+
+    def test_containers_are_summed_per_workload_and_multiplied_by_replicas(self):
+        totals = deployed_totals(RESOURCES, nodes=2)
+        rows = {row['Resource Name']: row for row in workload_rows(totals)}
+        assert rows['api']['Replicas'] == 3
+        assert rows['api']['CPU Requests (m)'] == 1800.0
+        assert rows['api']['Memory Requests (Mi)'] == 3456.0
+        # One daemonset pod per schedulable node
+        assert rows['agent']['Replicas'] == 2 and rows['agent']['CPU Limits (m)'] == 2000.0
+        assert 'data' not in rows
+        assert list(rows['api']) == WORKLOAD_COLUMNS
+
+    def test_namespace_delta_against_the_baseline(self):
+        baseline = CompiledBaseline.compile({'deployments': {'cm': {'api': {
+            'replica_count': '2',
+            'data': {'app': {'requests': {'cpu': '500m', 'memory': '1Gi'}, 'limits': {'cpu': '1', 'memory': '2Gi'}},
+                     'sidecar': {'requests': {'cpu': '100m', 'memory': '128Mi'},
+                                 'limits': {'cpu': '1', 'memory': '2Gi'}}}}}}})
+        approved = baseline_totals(baseline, {'ns': 'cm'}, nodes=2)
+        [row] = namespace_rows(deployed_totals(RESOURCES, nodes=2), approved, {'ns': 'cm'})
+        assert list(row) == NAMESPACE_COLUMNS
+        assert row['Profile'] == 'cm'
+        assert row['CPU Requests (m) Baseline'] == 1200.0
+        # One more api replica and the daemonset, which the baseline does not have
+        assert row['CPU Requests (m)'] == 2800.0 and row['CPU Requests (m) Delta'] == 1600.0
+
+
+class TestClusterHeadroom:
+
+    def test_headroom_of_schedulable_nodes(self):
+        body = (b'{"items": [{"spec": {}, "status": {"allocatable": {"cpu": "4", "memory": "8Gi"}}},'
+                b'{"spec": {}, "status": {"allocatable": {"cpu": "4", "memory": "8Gi"}}},'
+                b'{"spec": {"unschedulable": true}, "status": {"allocatable": {"cpu": "4"}}}], "metadata": {}}')
+        api = mock.Mock()
+        api.list_node.return_value = RawResponse(body)
+        with mock.patch('kubernetes.client.CoreV1Api', return_value=api):
+            nodes, allocatable = node_allocatable()
+        assert nodes == 2
+
+        rows = {row['Resource']: row for row in cluster_rows(deployed_totals(RESOURCES, nodes), nodes, allocatable)}
+        cpu = rows['CPU (m)']
+        assert (cpu['Allocatable'], cpu['Requests'], cpu['Headroom']) == (8000.0, 2800.0, 5200.0)
+        assert cpu['Headroom %'] == 65.0 and cpu['Limits / Allocatable %'] == 100.0
+        assert rows['Ephemeral-storage (Mi)']['Headroom %'] == ''
+
+    def test_nodes_not_listable(self):
+        api = mock.Mock()
+        api.list_node.side_effect = ApiException(status=403)
+        with mock.patch('kubernetes.client.CoreV1Api', return_value=api):
+            nodes, allocatable = node_allocatable()
+        assert nodes is None and not allocatable.any()
+        deployed = deployed_totals(RESOURCES, nodes)
+        rows = list(cluster_rows(deployed, nodes, allocatable))
+        assert all(row['Headroom %'] == '' and row['Nodes'] == '' for row in rows)
+        # The daemonset is counted as one pod and flagged
+        workloads = {row['Resource Name']: row for row in workload_rows(deployed)}
+        assert workloads['agent']['Replicas'] == 1 and workloads['agent']['Note']
+        assert workloads['api']['Note'] == ''
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from src.utils.concurrency import run_bounded
+
+
+class TestRunBounded:
+
+    def test_results_keep_call_order(self):
+        calls = {key: (lambda k=key: k * 2) for key in range(10)}
+        results = run_bounded(calls, max_workers=3)
+        assert list(results) == list(range(10))
+        assert [result.value for result in results.values()] == [key * 2 for key in range(10)]
+        assert all(result.ok for result in results.values())
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def call():
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+
+        run_bounded({key: call for key in range(8)}, max_workers=2)
+        assert state['peak'] == 2
+
+    def test_error_is_captured(self):
+        def fail():
+            raise ValueError('boom')
+
+        results = run_bounded({'bad': fail, 'good': lambda: 1}, max_workers=2)
+        assert isinstance(results['bad'].error, ValueError)
+        assert not results['bad'].ok
+        assert results['good'].value == 1
+
+    def test_slow_call_times_out(self):
+        release = threading.Event()
+        results = run_bounded({'slow': lambda: release.wait(5), 'fast': lambda: 1},
+                              max_workers=2, call_timeout=0.2)
+        release.set()
+        assert results['slow'].timed_out
+        assert results['slow'].latency >= 0.2
+        assert results['fast'].ok
@@ -0,0 +1,59 @@
+from unittest import mock
+
+from src.jobs.monitor_resources import drift
+from src.jobs.monitor_resources.baseline import CompiledBaseline
+from src.jobs.monitor_resources.drift import ADDED, CHANGED, REMOVED, RunStore, compare_incremental
+
+BASELINE = CompiledBaseline.compile({'pvc': {'cm': {'data-a': {'capacity': '1Gi'}, 'data-b': {'capacity': '2Gi'}}}})
+NAMESPACES = {'ns': 'cm'}
+
+
+def _resources(**capacities):
+    return {'ns': {'pvc': [{'Name': name, 'Namespace': 'ns', 'Capacity': capacity}
+                           for name, capacity in capacities.items()]}}
+
+
+def _run(store, resources, fingerprint='f1', label=''):
+    return compare_incremental(resources, NAMESPACES, BASELINE, ['pvc'], store, fingerprint, {}, label)
+
+
+class TestCompareIncremental:
+
+    def test_only_changed_resources_are_compared(self, tmp_path):
+        with RunStore(str(tmp_path / 'runs.sqlite')) as store:
+            differences, _, changes = _run(store, _resources(**{'data-a': '1Gi', 'data-b': '3Gi'}), label='install')
+            assert list(differences['ns/pvc']) == ['data-b'] and changes == []
+
+            with mock.patch.object(drift, 'compare_rows', wraps=drift.compare_rows) as compare:
+                differences, not_in_baseline, changes = _run(
+                    store, _resources(**{'data-b': '3Gi', 'data-c': '1Gi'}), label='upgrade')
+            assert [row['Name'] for row in compare.call_args.args[0]] == ['data-c']
+            assert list(differences['ns/pvc']) == ['data-b']
+            assert list(not_in_baseline['ns/pvc']) == ['data-c']
+            assert {(row['Resource Name'], row['Change']) for row in changes} == {('data-c', ADDED),
+                                                                                  ('data-a', REMOVED)}
+
+            _run(store, _resources(**{'data-b': '2Gi', 'data-c': '1Gi'}), label='rollback')
+            trend = store.trend()
+            assert [(row['Label'], row['Compared'], row['Changed'], row['Differing']) for row in trend] == [
+                ('install', 2, 0, 1), ('upgrade', 1, 0, 1), ('rollback', 1, 1, 0)]
+            assert [(row['Label'], row['Change']) for row in store.history('ns', 'pvc', 'data-b')] == [
+                ('install', ADDED), ('rollback', CHANGED)]
+            assert [row['Change'] for row in store.history('ns', 'pvc', 'data-a')] == [ADDED, REMOVED]
+
+    def test_new_fingerprint_compares_everything(self, tmp_path):
+        with RunStore(str(tmp_path / 'runs.sqlite')) as store:
+            _run(store, _resources(**{'data-a': '1Gi'}))
+            _run(store, _resources(**{'data-a': '1Gi'}), fingerprint='f2')
+            assert [row['Compared'] for row in store.trend()] == [1, 1]
+
+    def test_only_the_latest_runs_are_kept(self, tmp_path):
+        with RunStore(str(tmp_path / 'runs.sqlite'), keep_runs=2) as store:
+            for label in ('install', 'upgrade', 'rollback'):
+                _run(store, _resources(**{'data-a': '1Gi'}), label=label)
+            assert [row['Label'] for row in store.trend()] == ['upgrade', 'rollback']
+            run_ids = {row[0] for row in store.connection.execute("SELECT DISTINCT run_id FROM resources")}
+            assert run_ids == {row['Run'] for row in store.trend()}
+            # The latest run still serves as the previous one
+            _, _, changes = _run(store, _resources(**{'data-a': '1Gi'}))
+            assert changes == [] and store.latest_run()['id'] == 4
@@ -0,0 +1,87 @@
+import http.server
+import json
+import threading
+from unittest import mock
+
+import pytest
+from kubernetes import client
+from kubernetes.client import rest
+
+from src.utils.instrumentation import STAGES, export_metrics, install_api_counter, instrumented
+
+BODY = json.dumps({'items': [{'metadata': {'name': 'a', 'namespace': 'ns'}}], 'metadata': {}}).encode()
+
+
+@pytest.fixture
+def api():
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    configuration = client.Configuration()
+    configuration.host = f'http://127.0.0.1:{server.server_port}'
+    # The counter patches the REST client class, restored after the test
+    with mock.patch.object(rest.RESTClientObject, 'request', rest.RESTClientObject.request):
+        assert install_api_counter() and not install_api_counter()
+        yield client.CoreV1Api(client.ApiClient(configuration))
+    server.shutdown()
+
+
+class TestInstrumented:
+
+    def test_calls_errors_and_nested_stages(self):
+        @instrumented(stage='test.inner')
+        def inner(fail=False):
+            if fail:
+                raise ValueError('boom')
+            return 'ok'
+
+        @instrumented
+        def outer():
+            return inner()
+
+        assert outer() == 'ok'
+        with pytest.raises(ValueError):
+            inner(fail=True)
+        assert (STAGES['test.inner'].calls, STAGES['test.inner'].errors) == (2, 1)
+        assert STAGES[outer.__qualname__].calls == 1 and outer.__name__ == 'outer'
+        assert STAGES[outer.__qualname__].wall_seconds >= 0 and STAGES['test.inner'].peak_rss_bytes > 0
+
+    def test_api_calls_and_bytes_per_stage(self, api):
+        @instrumented(stage='test.list')
+        def list_pods():
+            api.list_namespaced_pod('ns')
+            response = api.list_namespaced_pod('ns', _preload_content=False)
+            response.data
+            response.release_conn()
+
+        list_pods()
+        metrics = STAGES['test.list']
+        assert (metrics.api_calls, metrics.bytes_received) == (2, 2 * len(BODY))
+
+
+class TestExport:
+
+    def test_prometheus_textfile_and_json_summary(self, tmp_path):
+        instrumented(stage='test "export"')(lambda: None)()
+        textfile, json_file = tmp_path / 'job.prom', tmp_path / 'job_metrics.json'
+        run = export_metrics('pod_restart_monitor', started=1.0, textfile=str(textfile), json_file=str(json_file))
+
+        text = textfile.read_text()
+        assert '# TYPE eo_nf_job_stage_wall_seconds_total counter' in text
+        assert 'eo_nf_job_stage_calls_total{job="pod_restart_monitor",stage="test \\"export\\""} 1' in text
+        assert json.loads(json_file.read_text())['stages'] == run['stages']
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['job.prom', 'job_metrics.json']
+
+    def test_nothing_written_without_configuration(self):
+        with mock.patch.dict('os.environ', {}, clear=True):
+            assert export_metrics('job') is None
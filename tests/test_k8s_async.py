@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+pytest.importorskip('aiohttp')
+
+from src.jobs.pod_monitor.correlation import TRUNCATED, async_events_and_logs  # noqa: E402
+from src.utils.k8s_async import RESOURCE_PATHS, RateLimiter, async_enabled, run_with_client  # noqa: E402
+from src.utils.k8s_resources import async_resource_rows, raw_resource_rows  # noqa: E402
+from tests.benchmarks.fake_api_server import FakeApiServer  # noqa: E402
+from tests.benchmarks.fake_cluster import FakeCluster  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def cluster():
+    return FakeCluster(namespaces=2, workloads=12, containers=2)
+
+
+@pytest.fixture
+def server(cluster):
+    with FakeApiServer(cluster) as fake:
+        yield fake
+
+
+def _run(server, func, **kwargs):
+    configuration = client.Configuration()
+    configuration.host = server.url
+    configuration.api_key = {'authorization': 'Bearer token'}
+    return run_with_client(func, configuration, **kwargs)
+
+
+class TestAsyncList:
+
+    def test_pages_follow_continue_tokens(self, server, cluster):
+        pods = _run(server, lambda api: api.list_items(RESOURCE_PATHS['pods'], 'ns-0', page_size=5))
+        assert pods == cluster.items('ns-0', 'pods')
+        assert server.authorization == 'Bearer token'
+        assert sum('/pods?' in request for request in server.requests) == -(-len(pods) // 5)
+
+    def test_resource_rows_match_the_raw_list_path(self, server, cluster):
+        async def collect(api):
+            return await asyncio.gather(*(async_resource_rows(api, namespace, 'statefulsets', page_size=2)
+                                          for namespace in cluster.namespaces))
+        expected = [[row for obj in cluster.items(namespace, 'statefulsets')
+                     for row in raw_resource_rows(obj, 'statefulsets')] for namespace in cluster.namespaces]
+        assert _run(server, collect) == expected
+
+    def test_missing_custom_resource_lists_nothing(self, server):
+        custom = {'group': 'kvdbrd.gs.ericsson.com', 'version': 'v1beta1', 'plural': 'redisclusters', 'columns': {}}
+        assert _run(server, lambda api: async_resource_rows(api, 'ns-0', 'rediscluster', custom)) == []
+        with pytest.raises(ApiException) as error:
+            _run(server, lambda api: async_resource_rows(api, 'missing', 'pvc'))
+        assert error.value.status == 404
+
+
+class TestSocketBudget:
+
+    def test_connections_are_bounded_by_the_pool(self, cluster):
+        async def collect(api):
+            return await asyncio.gather(*(api.list_items(RESOURCE_PATHS['pvc'], 'ns-0') for _ in range(12)))
+        with FakeApiServer(cluster, delay=0.02) as server:
+            _run(server, collect, max_connections=3, rate=0)
+        assert server.peak_in_flight == 3
+
+    def test_stalled_response_times_out(self, cluster):
+        with FakeApiServer(cluster, delay=0.5) as server:
+            with pytest.raises(asyncio.TimeoutError):
+                _run(server, lambda api: api.list_items(RESOURCE_PATHS['pvc'], 'ns-0'), call_timeout=0.1)
+
+    def test_async_is_opt_in(self, monkeypatch):
+        monkeypatch.delenv('K8S_ASYNC', raising=False)
+        assert not async_enabled()
+        monkeypatch.setenv('K8S_ASYNC', '1')
+        assert async_enabled()
+
+    def test_rate_limiter_spaces_requests(self):
+        async def acquire(limiter, count):
+            started = time.monotonic()
+            await asyncio.gather(*(limiter.acquire() for _ in range(count)))
+            return time.monotonic() - started
+        # One token up front, then one every 20ms
+        assert asyncio.run(acquire(RateLimiter(rate=50, burst=1), 6)) >= 0.09
+
+
+class TestAsyncWatchExecAndLogs:
+
+    def test_watch_streams_events(self, server, cluster):
+        pod = cluster.items('ns-0', 'pods')[0]
+        server.watch_events['ns-0'] = [{'type': 'MODIFIED', 'object': pod},
+                                       {'type': 'BOOKMARK', 'object': {'metadata': {'resourceVersion': '2'}}}]
+
+        async def watch(api):
+            return [event async for event in api.watch(RESOURCE_PATHS['pods'], 'ns-0', resource_version='1')]
+        events = _run(server, watch)
+        assert [event['type'] for event in events] == ['MODIFIED', 'BOOKMARK']
+        assert events[0]['object']['metadata']['name'] == pod['metadata']['name']
+        assert 'allowWatchBookmarks=true' in server.requests[-1]
+
+    def test_exec_returns_exit_code_and_output(self, server):
+        server.exec_results['false'] = ('', 1)
+        results = _run(server, lambda api: asyncio.gather(api.exec('ns-0', 'p', ['df', '-h'], container='c'),
+                                                          api.exec('ns-0', 'p', ['false'])))
+        assert results == [(0, 'ran df -h\n', ''), (1, '', '')]
+
+    def test_events_and_previous_logs_on_one_loop(self, server):
+        server.events['ns-0'] = [{'involvedObject': {'kind': 'Pod', 'name': 'a'}, 'reason': 'BackOff', 'count': 2}]
+        server.logs[('a', 'main')] = 'x' * 100 + '\nlast words\n'
+        server.logs[('b', 'main')] = 'panic\n'
+        events, logs = _run(server, lambda api: async_events_and_logs(
+            api, 'ns-0', [('a', 'main'), ('b', 'main'), ('c', 'main')], tail_lines=10, limit_bytes=16))
+        assert events[('Pod', 'a')][0]['Reason'] == 'BackOff'
+        assert logs[('a', 'main')] == TRUNCATED + '\nlast words\n'
+        assert not any('limitBytes' in request for request in server.requests)
+        assert logs[('b', 'main')] == 'panic\n'
+        assert logs[('c', 'main')].startswith('Previous log not available: 400')
@@ -0,0 +1,121 @@
+import json
+import time
+
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError
+
+from src.utils.k8s_cache import REVALIDATE_IDLE, ResponseCache, unchanged_since
+
+KEY = ('ctx', 'ns', 'deployments', '')
+
+
+class Fetcher:
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [{'Name': f'web-{self.calls}'}], str(self.calls)
+
+
+class WatchResponse:
+    """Streams watch events as JSON lines, then raises the idle read timeout unless closed by the server."""
+
+    status = 200
+
+    def __init__(self, events, idle=True):
+        self.events = events
+        self.idle = idle
+
+    def stream(self, amt=None, decode_content=False):
+        for event in self.events:
+            yield json.dumps(event).encode() + b'\n'
+        if self.idle:
+            raise ReadTimeoutError(None, '/api/v1/namespaces/ns/pods', 'Read timed out.')
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+def watch_list(events, calls):
+    def list_func(namespace, **kwargs):
+        calls.append(kwargs)
+        return WatchResponse(events)
+    return list_func
+
+
+class TestUnchangedSince:
+
+    def test_idle_watch_is_unchanged(self):
+        calls = []
+        assert unchanged_since(watch_list([], calls), 'ns', resource_version='7')
+        assert calls[0]['resource_version'] == '7' and calls[0]['_request_timeout'][1] == REVALIDATE_IDLE
+
+    def test_bookmark_ends_the_watch(self):
+        calls = []
+        events = [{'type': 'BOOKMARK', 'object': {'metadata': {'resourceVersion': '9'}}},
+                  {'type': 'MODIFIED', 'object': {}}]
+        assert unchanged_since(watch_list(events, calls), 'ns', resource_version='7')
+
+    def test_closed_without_events_is_unchanged(self):
+        def list_func(namespace, **kwargs):
+            return WatchResponse([], idle=False)
+        assert unchanged_since(list_func, 'ns', resource_version='7')
+
+    def test_failures_refetch(self):
+        def unreachable(namespace, **kwargs):
+            raise MaxRetryError(None, '/api/v1/namespaces/ns/pods', 'connection refused')
+
+        def slow(namespace, **kwargs):
+            raise ReadTimeoutError(None, '/api/v1/namespaces/ns/pods', 'Read timed out.')
+        assert not unchanged_since(unreachable, 'ns', resource_version='7')
+        assert not unchanged_since(slow, 'ns', resource_version='7')
+
+    def test_replayed_change(self):
+        assert not unchanged_since(watch_list([{'type': 'MODIFIED', 'object': {}}], []), 'ns', resource_version='7')
+
+
+class TestResponseCache:
+
+    def test_hit_within_ttl(self):
+        cache = ResponseCache(ttl=60)
+        fetch = Fetcher()
+        assert cache.get_or_fetch(KEY, fetch) == cache.get_or_fetch(KEY, fetch)
+        assert fetch.calls == 1
+        assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+    def test_revalidation(self):
+        cache = ResponseCache(ttl=0)
+        fetch = Fetcher()
+        cache.get_or_fetch(KEY, fetch)
+        versions = []
+        value = cache.get_or_fetch(KEY, fetch, revalidate=lambda version: versions.append(version) or True)
+        assert value == [{'Name': 'web-1'}] and versions == ['1']
+        assert cache.stats['revalidated'] == 1
+        cache.get_or_fetch(KEY, fetch, revalidate=lambda version: False)
+        assert fetch.calls == 2
+
+    def test_expired_without_revalidation_refetches(self):
+        cache = ResponseCache(ttl=0.01)
+        fetch = Fetcher()
+        cache.get_or_fetch(KEY, fetch)
+        time.sleep(0.02)
+        cache.get_or_fetch(KEY, fetch)
+        assert fetch.calls == 2
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(ttl=60, max_entries=2)
+        for namespace in ['a', 'b', 'c']:
+            cache.get_or_fetch(('ctx', namespace, 'pods', ''), Fetcher())
+        assert [key[1] for key in cache.entries] == ['b', 'c']
+        assert cache.stats['evictions'] == 1
+
+    def test_disk_cache_shared_between_instances(self, tmp_path):
+        fetch = Fetcher()
+        ResponseCache(cache_dir=str(tmp_path), ttl=60).get_or_fetch(KEY, fetch)
+        other = ResponseCache(cache_dir=str(tmp_path), ttl=60)
+        assert other.get_or_fetch(KEY, fetch) == [{'Name': 'web-1'}]
+        assert fetch.calls == 1 and other.stats['hits'] == 1
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from kubernetes.client.rest import ApiException
+
+from src.utils.k8s_pager import paginate
+from src.utils.k8s_resources import iter_resource_rows, resource_rows
+
+
+def _page(items, token=None):
+    return SimpleNamespace(items=items, metadata=SimpleNamespace(_continue=token))
+
+
+class TestPaginate:
+
+    def test_follows_continue_tokens(self):
+        pages = {None: _page([1, 2], 'a'), 'a': _page([3, 4], 'b'), 'b': _page([5])}
+        calls = []
+
+        def list_func(namespace, **kwargs):
+            calls.append(kwargs)
+            return pages[kwargs.get('_continue')]
+
+        items = list(paginate(list_func, 'ns', page_size=2, label_selector='app=x'))
+        assert items == [1, 2, 3, 4, 5]
+        assert len(calls) == 3
+        assert all(call['limit'] == 2 and call['label_selector'] == 'app=x' for call in calls)
+        assert 'field_selector' not in calls[0]
+
+    def test_is_lazy(self):
+        calls = []
+
+        def list_func(**kwargs):
+            calls.append(kwargs)
+            return _page([1], 'next')
+
+        items = paginate(list_func)
+        assert next(items) == 1
+        assert len(calls) == 1
+
+
+class TestResourceRows:
+
+    def test_deployment_rows(self):
+        container = SimpleNamespace(name='app', resources=SimpleNamespace(
+            limits={'cpu': '1', 'memory': '1Gi'}, requests={'cpu': '500m'}))
+        obj = SimpleNamespace(
+            metadata=SimpleNamespace(name='dep', namespace='ns'),
+            spec=SimpleNamespace(replicas=2, template=SimpleNamespace(spec=SimpleNamespace(containers=[container]))))
+        rows = resource_rows(obj, 'deployments')
+        assert rows == [{
+            'Name': 'dep', 'Namespace': 'ns', 'Container Name': 'app', 'Replicas': '2',
+            'CPU Limits': '1', 'Memory Limits': '1Gi', 'Ephemeral-storage Limits': 'Not specified',
+            'CPU Requests': '500m', 'Memory Requests': 'Not specified',
+            'Ephemeral-storage Requests': 'Not specified',
+        }]
+
+    def test_pvc_row(self):
+        obj = SimpleNamespace(
+            metadata=SimpleNamespace(name='data', namespace='ns'),
+            spec=SimpleNamespace(resources=SimpleNamespace(requests={'storage': '10Gi'})),
+            status=SimpleNamespace(capacity={'storage': '20Gi'}))
+        assert resource_rows(obj, 'pvc') == [{'Name': 'data', 'Namespace': 'ns', 'Capacity': '20Gi'}]
+
+
+class TestCustomObjects:
+    CUSTOM = {'group': 'example.com', 'version': 'v1', 'plural': 'clusters', 'columns': {'Replicas': 'spec.replicas'}}
+
+    def test_rows_follow_continue(self):
+        pages = {
+            None: {'items': [{'metadata': {'name': 'a', 'namespace': 'ns'}, 'spec': {'replicas': 3}}],
+                   'metadata': {'continue': 'x'}},
+            'x': {'items': [{'metadata': {'name': 'b', 'namespace': 'ns'}}], 'metadata': {}},
+        }
+        api = mock.Mock()
+        api.list_namespaced_custom_object.side_effect = lambda *args, **kwargs: pages[kwargs.get('_continue')]
+        with mock.patch('kubernetes.client.CustomObjectsApi', return_value=api):
+            rows = list(iter_resource_rows('ns', 'clusters', self.CUSTOM, page_size=1))
+        assert rows == [{'Name': 'a', 'Namespace': 'ns', 'Replicas': 3},
+                        {'Name': 'b', 'Namespace': 'ns', 'Replicas': 'Not specified'}]
+        assert api.list_namespaced_custom_object.call_args.args == ('example.com', 'v1', 'ns', 'clusters')
+
+    def test_not_installed(self):
+        api = mock.Mock()
+        api.list_namespaced_custom_object.side_effect = ApiException(status=404)
+        with mock.patch('kubernetes.client.CustomObjectsApi', return_value=api):
+            assert list(iter_resource_rows('ns', 'clusters', self.CUSTOM)) == []
+
+
+class TestRawLists:
+
+    def test_raw_rows_match_model_rows(self, monkeypatch):
+        from tests.benchmarks.fake_cluster import FakeCluster
+        cluster = FakeCluster(workloads=8, containers=2)
+        with cluster.serve():
+            for resource_type in ('deployments', 'statefulsets', 'cronjobs', 'daemonsets', 'pvc'):
+                monkeypatch.setenv('K8S_RAW_LISTS', '0')
+                models = list(iter_resource_rows('ns-0', resource_type, page_size=3))
+                monkeypatch.setenv('K8S_RAW_LISTS', '1')
+                assert list(iter_resource_rows('ns-0', resource_type, page_size=3)) == models
+                assert models
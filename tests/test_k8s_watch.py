@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from kubernetes.client.rest import ApiException
+
+from src.utils import k8s_watch
+
+
+def _list_func(**kwargs):
+    return SimpleNamespace(items=['pod'], metadata=SimpleNamespace(_continue=None, resource_version='10'))
+
+
+class FakeWatch:
+    streams = []
+
+    def __init__(self):
+        self.resource_version = None
+
+    def stream(self, func, *args, **kwargs):
+        FakeWatch.streams.append(kwargs['resource_version'])
+        if len(FakeWatch.streams) == 1:
+            raise ApiException(status=410)
+        self.resource_version = '12'
+        yield {'type': 'MODIFIED', 'object': 'pod'}
+
+    def stop(self):
+        pass
+
+
+class TestWatchEvents:
+
+    @patch.object(k8s_watch.watch, 'Watch', FakeWatch)
+    def test_relists_after_gone(self):
+        events = k8s_watch.watch_events(_list_func, resource_version='5')
+        received = [next(events) for _ in range(2)]
+        assert FakeWatch.streams == ['5', '10']
+        assert received == [{'type': 'SYNC', 'object': 'pod'}, {'type': 'MODIFIED', 'object': 'pod'}]
+
+    def test_backoff_when_closed_without_events(self):
+        class EmptyWatch(FakeWatch):
+            def stream(self, func, *args, **kwargs):
+                return iter(())
+
+        with patch.object(k8s_watch.watch, 'Watch', EmptyWatch), \
+                patch.object(k8s_watch.time, 'sleep') as sleep:
+            events = k8s_watch.watch_events(_list_func, resource_version='5', duration=0.05)
+            assert list(events) == []
+        delays = [call.args[0] for call in sleep.call_args_list]
+        assert delays[:3] == [1, 2, 4]
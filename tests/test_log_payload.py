@@ -0,0 +1,52 @@
+import json
+import logging
+import sys
+
+from src.utils.log_payload import JsonLinesFormatter, LazyJson, Summary, enable_json_lines_log
+
+
+class TestLazyPayload:
+
+    def test_not_rendered_when_level_disabled(self):
+        logger = logging.getLogger('test_log_payload.disabled')
+        logger.setLevel(logging.WARNING)
+        payload = LazyJson({'rows': list(range(1000))})
+        logger.info("payload %s", payload)
+        assert payload._text is None
+
+    def test_truncated(self):
+        text = str(LazyJson(list(range(1000)), max_chars=20))
+        assert text.startswith('[0, 1, 2')
+        assert text.endswith('more chars)')
+
+    def test_summary(self):
+        summary = str(Summary({'ns': {'deployments': [1, 2], 'pvc': []}, 'other': [1]}))
+        assert summary == '{ns: 2 keys, other: 1 items}'
+
+
+class TestJsonLinesLog:
+
+    def test_side_file(self, tmp_path):
+        file_name = tmp_path / 'log.jsonl'
+        handler = enable_json_lines_log(str(file_name), level='DEBUG', max_chars=50)
+        logger = logging.getLogger('test_log_payload.side_file')
+        logger.setLevel(logging.DEBUG)
+        try:
+            logger.debug("collected %s", Summary({'a': [1]}), extra={'payload': {'a': 'x' * 100}})
+        finally:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+        entry = json.loads(file_name.read_text())
+        assert entry['level'] == 'DEBUG' and entry['message'] == 'collected {a: 1 items}'
+        assert len(entry['payload']) < 100
+
+    def test_disabled_without_file(self, monkeypatch):
+        monkeypatch.delenv('LOG_JSON_FILE', raising=False)
+        assert enable_json_lines_log() is None
+
+    def test_formatter_exception(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = logging.LogRecord('x', logging.ERROR, __file__, 1, 'failed', None, sys.exc_info())
+        assert 'ValueError' in json.loads(JsonLinesFormatter().format(record))['exception']
@@ -1,4 +1,12 @@
+import json
 import logging
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from src.jobs.pod_monitor.restart_index import compare_pod_states, pod_lineage
+from src.jobs.pod_monitor.timeline import RestartTimeline
+from tests.benchmarks.fake_cluster import RawResponse
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -18,5 +26,158 @@ def test_u():
     logger.info("testing>>>>>>>>>>>>>>>>>>>>>>>>>>>>>")
 
 
+def _record(pod, container='main', restarts=0, owner='', uid=None):
+    return {'Pod': pod, 'Container': container, 'Restarts': restarts, 'Owner': owner, 'Uid': uid or pod}
+
+
+class TestComparePodStates:
+
+    def test_restart_delta(self):
+        initial = [_record('a', restarts=1), _record('b')]
+        final = [_record('b'), _record('a', restarts=3)]
+        restarts, changes = compare_pod_states(initial, final)
+        assert restarts == [['a', 'main', 2]]
+        assert changes == []
+
+    def test_deployment_pod_recreated_under_new_name(self):
+        initial = [_record('web-1-aaa', owner='Deployment/web'), _record('job-x', owner='Job/job-x')]
+        final = [_record('web-1-bbb', owner='Deployment/web'), _record('job-y', owner='Job/job-y')]
+        restarts, changes = compare_pod_states(initial, final)
+        assert restarts == []
+        assert ['web-1-aaa', 'Deployment/web', 'Recreated', 'web-1-bbb'] in changes
+        assert ['job-x', 'Job/job-x', 'Deleted', ''] in changes
+        assert ['job-y', 'Job/job-y', 'Added', ''] in changes
+
+    def test_statefulset_pod_recreated_in_place(self):
+        initial = [_record('db-0', restarts=4, owner='StatefulSet/db', uid='1')]
+        final = [_record('db-0', restarts=0, owner='StatefulSet/db', uid='2')]
+        restarts, changes = compare_pod_states(initial, final)
+        assert restarts == []
+        assert changes == [['db-0', 'StatefulSet/db', 'Recreated', 'db-0']]
+
+    def test_legacy_snapshot_without_owner(self):
+        initial = [{'Pod': 'a', 'Container': 'c', 'Restarts': 0}]
+        final = [{'Pod': 'a', 'Container': 'c', 'Restarts': 1}]
+        assert compare_pod_states(initial, final) == ([['a', 'c', 1]], [])
+
+    def test_linear_scaling(self):
+        initial = [_record(f'pod-{i // 4}', f'c{i % 4}') for i in range(40000)]
+        final = [_record(f'pod-{i // 4}', f'c{i % 4}', restarts=i % 2) for i in range(40000)]
+        start = time.perf_counter()
+        restarts, _ = compare_pod_states(initial, final)
+        assert time.perf_counter() - start < 1
+        assert len(restarts) == 20000
+
+
+class TestPodLineage:
+
+    def test_replicaset_resolves_to_deployment(self):
+        refs = [SimpleNamespace(kind='ReplicaSet', name='web-5d9f8', controller=True)]
+        assert pod_lineage(refs, {'pod-template-hash': '5d9f8'}) == 'Deployment/web'
+
+    def test_bare_pod(self):
+        assert pod_lineage(None, None) == ''
+
+
+
+def _pod(name, restarts, reason=None):
+    terminated = SimpleNamespace(reason=reason, exit_code=137, finished_at=None) if reason else None
+    status = SimpleNamespace(name='main', restart_count=restarts, last_state=SimpleNamespace(terminated=terminated))
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, owner_references=None, labels=None),
+                           status=SimpleNamespace(container_statuses=[status]))
+
+
+class TestRestartTimeline:
+
+    def test_records_restarts_after_sync(self, tmp_path):
+        file_name = tmp_path / 'timeline.jsonl'
+        timeline = RestartTimeline(str(file_name), flush_every=1)
+        timeline.observe('SYNC', _pod('a', 2))
+        timeline.observe('MODIFIED', _pod('a', 2))
+        timeline.observe('MODIFIED', _pod('a', 3, reason='OOMKilled'))
+        timeline.observe('DELETED', _pod('a', 3))
+        timeline.flush()
+
+        assert [entry['Event'] for entry in timeline.events] == ['OOMKilled', 'Deleted']
+        assert timeline.restarts()[0]['Delta'] == 1
+        assert len(file_name.read_text().splitlines()) == 2
+
+
+class TestRawPodRecords:
+
+    def test_raw_records_match_model_records(self):
+        from kubernetes import client
+        from src.jobs.pod_monitor.records import pod_records, raw_pod_records
+        from tests.benchmarks.fake_cluster import FakeCluster
+        cluster = FakeCluster(workloads=8)
+        pods = cluster.items('ns-0', 'pods')
+        pods[0]['status']['containerStatuses'][0]['lastState'] = {
+            'terminated': {'reason': 'OOMKilled', 'exitCode': 137}}
+        pods[1]['metadata']['labels'] = {'pod-template-hash': 'abc'}
+        pods[1]['metadata']['ownerReferences'][0].update(kind='ReplicaSet', name='web-abc')
+        with cluster.serve():
+            models = client.CoreV1Api().list_namespaced_pod('ns-0').items
+        assert raw_pod_records(pods) == pod_records(models)
+        assert raw_pod_records(pods)[0]['Reason'] == 'OOMKilled'
+        assert raw_pod_records(pods[1:2])[0]['Owner'] == 'Deployment/web'
+
+
+class TestRestartContext:
+
+    EVENTS = [
+        {'involvedObject': {'kind': 'Pod', 'name': 'a'}, 'reason': 'BackOff', 'type': 'Warning', 'count': 3,
+         'lastTimestamp': '2024-01-01T00:02:00Z', 'message': 'Back-off restarting failed container'},
+        {'involvedObject': {'kind': 'Pod', 'name': 'a'}, 'reason': 'Killing', 'type': 'Normal',
+         'lastTimestamp': '2024-01-01T00:01:00Z', 'message': 'Stopping container main'},
+        {'involvedObject': {'kind': 'StatefulSet', 'name': 'db'}, 'reason': 'SuccessfulCreate',
+         'type': 'Normal', 'eventTime': '2024-01-01T00:03:00Z', 'series': {'count': 2}},
+    ]
+
+    def test_events_are_indexed_by_involved_object(self):
+        from src.jobs.pod_monitor.correlation import event_summary, index_events
+        index = index_events(self.EVENTS)
+        assert [record['Reason'] for record in index[('Pod', 'a')]] == ['Killing', 'BackOff']
+        assert event_summary(index[('Pod', 'a')]) == 'Killing, BackOff x3'
+        assert index[('StatefulSet', 'db')][0]['Count'] == 2
+        assert len(index_events(self.EVENTS * 5, max_events=4)[('Pod', 'a')]) == 4
+
+    def test_events_are_listed_once_per_namespace(self):
+        from src.jobs.pod_monitor.correlation import list_events
+        body = json.dumps({'items': self.EVENTS, 'metadata': {}}).encode()
+        api = mock.Mock()
+        api.list_namespaced_event.return_value = RawResponse(body)
+        with mock.patch('kubernetes.client.CoreV1Api', return_value=api):
+            assert len(list(list_events('ns'))) == 3
+        assert api.list_namespaced_event.call_count == 1
+
+    def test_previous_logs_are_capped_and_failures_reported(self):
+        from kubernetes.client.rest import ApiException
+        from src.jobs.pod_monitor.correlation import TRUNCATED, fetch_previous_logs
+
+        def read_log(pod, namespace, container, previous, tail_lines, _preload_content):
+            assert previous and tail_lines == 10
+            if pod == 'gone':
+                raise ApiException(status=400, reason='Bad Request')
+            return RawResponse(b'x' * 100 + b'\npanic: oom\n' if pod == 'big' else b'panic: oom\n')
+
+        api = mock.Mock()
+        api.read_namespaced_pod_log.side_effect = read_log
+        with mock.patch('kubernetes.client.CoreV1Api', return_value=api):
+            logs = fetch_previous_logs('ns', [('a', 'main'), ('big', 'main'), ('gone', 'main'), ('a', 'main')],
+                                       tail_lines=10, limit_bytes=16)
+        assert api.read_namespaced_pod_log.call_count == 3
+        assert logs[('a', 'main')] == 'panic: oom\n'
+        assert logs[('big', 'main')] == TRUNCATED + '\npanic: oom\n'
+        assert logs[('gone', 'main')].startswith('Previous log not available: 400')
+
+    def test_context_is_attached_to_restarts_and_changes(self):
+        from src.jobs.pod_monitor.correlation import index_events, restart_context
+        context = restart_context(index_events(self.EVENTS), {('a', 'main'): 'panic'},
+                                  [['a', 'main', 2]], [['db-0', 'StatefulSet/db', 'Recreated', 'db-0']])
+        assert context['restarts'][0]['Previous Log'] == 'panic'
+        assert len(context['restarts'][0]['Events']) == 2
+        assert [record['Reason'] for record in context['changes'][0]['Events']] == ['SuccessfulCreate']
+
+
 if __name__ == "__main__":
     test_u()
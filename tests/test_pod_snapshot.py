@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from src.jobs.pod_monitor.restart_index import interval_restarts
+from src.jobs.pod_monitor.snapshot import SnapshotReader, SnapshotWriter
+
+
+def _records(restarts, pods=50):
+    return [{'Pod': f'pod-{i}', 'Container': 'main', 'Restarts': restarts.get(i, 0), 'Owner': 'Deployment/web',
+             'Uid': f'uid-{i}', 'Node': 'node-1', 'Image': 'registry/web:1.0', 'Reason': ''}
+            for i in range(pods)]
+
+
+class TestPodSnapshot:
+
+    def test_round_trip_with_deltas(self, tmp_path):
+        file_name = str(tmp_path / 'pods.snap')
+        writer = SnapshotWriter(file_name)
+        writer.append(_records({}), timestamp=100)
+        writer.append(_records({3: 1, 4: 2}, pods=49), timestamp=160)
+
+        reader = SnapshotReader(file_name)
+        assert reader.timestamps() == [100, 160]
+        initial, final = reader.load(0), reader.load()
+        assert len(initial) == 50 and len(final) == 49
+        assert {record['Pod']: record['Restarts'] for record in final}['pod-4'] == 2
+        assert final[0]['Image'] == 'registry/web:1.0'
+
+    def test_unchanged_snapshot_is_tiny(self, tmp_path):
+        file_name = str(tmp_path / 'pods.snap')
+        writer = SnapshotWriter(file_name)
+        writer.append(_records({}), timestamp=100)
+        size = os.path.getsize(file_name)
+        writer.append(_records({}), timestamp=160)
+        assert os.path.getsize(file_name) - size < 16
+
+    def test_resume_existing_file(self, tmp_path):
+        file_name = str(tmp_path / 'pods.snap')
+        SnapshotWriter(file_name).append(_records({}), timestamp=100)
+        SnapshotWriter(file_name).append(_records({1: 5}), timestamp=160)
+        final = SnapshotReader(file_name).load()
+        assert {record['Pod']: record['Restarts'] for record in final}['pod-1'] == 5
+
+    def test_periodic_full_snapshot(self, tmp_path):
+        file_name = str(tmp_path / 'pods.snap')
+        writer = SnapshotWriter(file_name, full_every=1)
+        for second in range(4):
+            writer.append(_records({0: second}), timestamp=second)
+        states = [state for _, state in SnapshotReader(file_name).snapshots()]
+        assert [state[('pod-0', 'main')]['Restarts'] for state in states] == [0, 1, 2, 3]
+
+    def test_interval_restarts(self, tmp_path):
+        file_name = str(tmp_path / 'pods.snap')
+        writer = SnapshotWriter(file_name)
+        writer.append(_records({}), timestamp=100)
+        writer.append(_records({3: 1}), timestamp=160)
+        writer.append(_records({3: 1}), timestamp=220)
+        writer.append(_records({3: 2, 7: 1}), timestamp=280)
+
+        assert interval_restarts(SnapshotReader(file_name).snapshots()) == [
+            [160, 'pod-3', 'main', 1], [280, 'pod-3', 'main', 1], [280, 'pod-7', 'main', 1]]
+
+    def test_rejects_foreign_file(self, tmp_path):
+        file_name = tmp_path / 'pods.json'
+        file_name.write_text('[]')
+        with pytest.raises(ValueError):
+            SnapshotReader(str(file_name)).load()
@@ -0,0 +1,125 @@
+from unittest.mock import patch
+
+from src.utils import k8s_exec
+from src.utils.instrumentation import STAGES, instrumented
+from src.utils.probe_parsers import parser_for
+
+DF_OUTPUT = """Filesystem      Size  Used Avail Use% Mounted on
+overlay          97G   41G   56G  43% /
+/dev/mapper/very-long-volume-name
+                 20G  1.5G   18G   8% /var/lib/data
+"""
+FREE_OUTPUT = """              total        used        free      shared  buff/cache   available
+Mem:           7953        2104        3120          12        2728        5560
+Swap:             0           0           0
+"""
+
+
+class TestProbeParsers:
+
+    def test_df_in_chunks(self):
+        parser = parser_for('df -h')
+        for start in range(0, len(DF_OUTPUT), 7):
+            parser.feed(DF_OUTPUT[start:start + 7])
+        mounts = parser.close()['mounts']
+        assert [mount['mount'] for mount in mounts] == ['/', '/var/lib/data']
+        assert mounts[1]['filesystem'] == '/dev/mapper/very-long-volume-name'
+        assert mounts[1]['used'] == int(1.5 * 2 ** 30)
+        assert mounts[0]['use_percent'] == 43
+
+    def test_df_blocks(self):
+        parser = parser_for('df -k')
+        parser.feed("Filesystem 1K-blocks Used Available Use% Mounted on\noverlay 100 40 60 40% /")
+        assert parser.close()['mounts'][0]['size'] == 100 * 1024
+
+    def test_free_mebibytes(self):
+        parser = parser_for('free -m')
+        parser.feed(FREE_OUTPUT)
+        memory = parser.close()
+        assert memory['mem']['total'] == 7953 * 2 ** 20
+        assert memory['swap']['used'] == 0
+
+    def test_unknown_command_keeps_lines(self):
+        parser = parser_for('uptime')
+        parser.feed('up 3 days')
+        assert parser.close() == {'lines': ['up 3 days']}
+
+
+class TestRunProbes:
+
+    @patch.object(k8s_exec, 'exec_streaming')
+    def test_runs_every_command_in_every_target(self, mock_exec):
+        def fake_exec(pod, container, namespace, command, timeout, on_stdout):
+            if pod == 'broken':
+                raise ConnectionError('handshake failed')
+            on_stdout(DF_OUTPUT if command.startswith('df') else FREE_OUTPUT)
+            return 0, '', False
+
+        mock_exec.side_effect = fake_exec
+        probes = k8s_exec.run_probes([('a', 'c'), ('broken', 'c')], ['df -h', 'free -m'], 'ns', max_streams=2)
+        assert len(probes) == 4
+        assert probes[0]['result']['mounts'][0]['mount'] == '/'
+        assert probes[1]['result']['mem']['total'] == 7953 * 2 ** 20
+        assert probes[2]['error'] == 'handshake failed'
+
+    def test_probes_that_cannot_run_are_skipped(self):
+        assert k8s_exec.probe_skipped({'exit_code': 127, 'timed_out': False, 'stderr': 'sh: df: not found'})
+        assert k8s_exec.probe_skipped({'exit_code': None, 'timed_out': False, 'stderr': (
+            'OCI runtime exec failed: exec: "/bin/sh": stat /bin/sh: no such file or directory')})
+        assert not k8s_exec.probe_skipped({'exit_code': 1, 'timed_out': False,
+                                           'stderr': 'df: /data: No such file or directory'})
+        assert not k8s_exec.probe_skipped({'exit_code': None, 'timed_out': True, 'stderr': ''})
+        assert not k8s_exec.probe_skipped({'error': 'handshake failed'})
+
+    def test_exec_status_channel(self):
+        class Response:
+            def __init__(self, status):
+                self.status = status
+
+            def read_channel(self, channel):
+                assert channel == k8s_exec.ERROR_CHANNEL
+                return self.status
+
+        failure = '{"status": "Failure", "message": "executable file not found in $PATH"}'
+        exit_code = ('{"status": "Failure", "reason": "NonZeroExitCode", '
+                     '"details": {"causes": [{"reason": "ExitCode", "message": "2"}]}}')
+        assert k8s_exec._exec_status(Response('{"status": "Success"}')) == (0, '')
+        assert k8s_exec._exec_status(Response(exit_code)) == (2, '')
+        assert k8s_exec._exec_status(Response(failure)) == (None, 'executable file not found in $PATH')
+
+    @patch.object(k8s_exec.client, 'CoreV1Api')
+    @patch.object(k8s_exec, 'stream')
+    def test_exec_websocket_is_counted(self, mock_stream, _):
+        class Response:
+            def __init__(self):
+                self.frames = [('out', 'Filesystem\n'), ('err', 'df: warning\n')]
+
+            def is_open(self):
+                return bool(self.frames)
+
+            def update(self, timeout):
+                self.frame = self.frames.pop(0)
+
+            def peek_stdout(self):
+                return self.frame[0] == 'out'
+
+            def read_stdout(self):
+                return self.frame[1]
+
+            def peek_stderr(self):
+                return self.frame[0] == 'err'
+
+            def read_stderr(self):
+                return self.frame[1]
+
+            def read_channel(self, channel):
+                return '{"status": "Success"}'
+
+            def close(self):
+                pass
+
+        mock_stream.return_value = Response()
+        chunks = []
+        instrumented(stage='test.exec')(k8s_exec.exec_streaming)('a', 'c', 'ns', 'df', 5, chunks.append)
+        assert chunks == ['Filesystem\n']
+        assert (STAGES['test.exec'].api_calls, STAGES['test.exec'].bytes_received) == (1, 23)
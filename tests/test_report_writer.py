@@ -0,0 +1,70 @@
+import csv
+import json
+
+import pytest
+
+from src.utils.report_writer import open_report
+
+ROWS = [{'Name': 'a', 'Limits': {'cpu': '1'}}, {'Name': 'b', 'Limits': 'Not specified'}]
+
+
+class TestReportWriter:
+
+    def test_xlsx(self, tmp_path):
+        openpyxl = pytest.importorskip('openpyxl')
+        with open_report(str(tmp_path / 'report.xlsx'), 'xlsx') as writer:
+            writer.write_sheet('details', iter(ROWS))
+            writer.write_sheet('empty', [])
+        workbook = openpyxl.load_workbook(writer.file_name)
+        assert workbook.sheetnames == ['details', 'empty']
+        assert list(workbook['details'].values) == [('Name', 'Limits'), ('a', '{"cpu": "1"}'), ('b', 'Not specified')]
+
+    def test_csv_file_per_sheet(self, tmp_path):
+        with open_report(str(tmp_path / 'report.xlsx'), 'csv') as writer:
+            writer.write_sheet('details', ROWS)
+        with open(tmp_path / 'report_details.csv', newline='') as file:
+            assert list(csv.reader(file))[1] == ['a', '{"cpu": "1"}']
+
+    def test_jsonl(self, tmp_path):
+        with open_report(str(tmp_path / 'report.xlsx'), 'jsonl') as writer:
+            writer.write_sheet('details', ROWS)
+        assert writer.file_name.endswith('report.jsonl')
+        with open(writer.file_name) as file:
+            lines = [json.loads(line) for line in file]
+        assert lines[1] == {'sheet': 'details', 'Name': 'b', 'Limits': 'Not specified'}
+
+    def test_headers_of_first_row(self, tmp_path):
+        rows = [{'Name': 'a', 'Owner': ''}, {'Name': 'b', 'Owner': 'web', 'Ignored': 'x'}]
+        with open_report(str(tmp_path / 'report.xlsx'), 'csv') as writer:
+            writer.write_sheet('details', iter(rows))
+            writer.write_sheet('declared', iter(rows), headers=['Owner'])
+        assert writer.files_written == [str(tmp_path / 'report_details.csv'), str(tmp_path / 'report_declared.csv')]
+        with open(writer.files_written[0], newline='') as file:
+            assert list(csv.reader(file)) == [['Name', 'Owner'], ['a', ''], ['b', 'web']]
+        with open(writer.files_written[1], newline='') as file:
+            assert list(csv.reader(file)) == [['Owner'], [''], ['web']]
+
+    def test_csv_closed_on_error(self, tmp_path):
+        def rows():
+            yield {'Name': 'a'}
+            raise RuntimeError('collection failed')
+
+        writer = open_report(str(tmp_path / 'report.xlsx'), 'csv')
+        with pytest.raises(RuntimeError):
+            writer.write_sheet('details', rows(), headers=['Name'])
+        assert writer.file.closed
+
+    def test_unknown_backend(self, tmp_path):
+        with pytest.raises(ValueError):
+            open_report(str(tmp_path / 'report.xlsx'), 'ods')
+
+    def test_xlsx_sheet_names_are_sanitized(self, tmp_path):
+        openpyxl = pytest.importorskip('openpyxl')
+        context = 'arn:aws:eks:eu-west-1:123456789012:cluster/eo-prod'
+        with open_report(str(tmp_path / 'fleet.xlsx'), 'xlsx') as writer:
+            writer.write_sheet(f"{context}:eric-eo-evnfm", ROWS)
+            writer.write_sheet(f"{context}:eric-eo-cm", ROWS)
+            writer.write_sheet('statefulsets_T12', ROWS)
+        workbook = openpyxl.load_workbook(writer.file_name)
+        assert workbook.sheetnames == ['arn_aws_eks_eu-west-1_123456789', 'arn_aws_eks_eu-west-1_1234567~2',
+                                       'statefulsets_T12']
@@ -0,0 +1,37 @@
+import sys
+
+from src.jobs import registry
+from src.jobs.registry import JOBS
+from src.utils.startup_profile import ImportProfiler
+
+
+class TestImportProfiler:
+
+    def test_records_first_imports_only(self):
+        sys.modules.pop('colorsys', None)
+        with ImportProfiler() as profiler:
+            import colorsys  # pylint: disable=import-outside-toplevel,unused-import
+            import json  # pylint: disable=import-outside-toplevel,unused-import
+        assert 'colorsys' in profiler.records
+        assert 'json' not in profiler.records
+        assert profiler.total >= profiler.records['colorsys'][0]
+        assert 'colorsys' in profiler.report(budget=0)
+        assert 'exceeds the budget' in profiler.report(budget=0)
+
+
+class TestRegistry:
+
+    def test_entries_are_import_paths(self):
+        for target in JOBS.values():
+            module_path, func_name = target.split(':')
+            assert module_path.startswith('src.jobs.') and func_name
+
+    def test_one_job_name_per_function(self):
+        assert len(set(JOBS.values())) == len(JOBS)
+
+    def test_legacy_jobs_imported_on_miss_only(self, monkeypatch):
+        def legacy_jobs():
+            raise AssertionError('lib.jobs imported for a registered job')
+        monkeypatch.setattr(registry, '_legacy_jobs', legacy_jobs)
+        monkeypatch.setitem(JOBS, 'dump_json', 'json:dumps')
+        assert registry.load_job('dump_json')(1) == '1'
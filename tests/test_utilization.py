@@ -0,0 +1,81 @@
+import numpy as np
+
+from src.jobs.monitor_resources.utilization import Utilization, workload_usage
+from src.utils.k8s_metrics import UsageRing, pod_usage, sample_usage
+
+
+class StubMetricsServer:
+    """Serves metrics.k8s.io pod metrics from a list of prepared samples."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.calls = 0
+
+    def list_namespaced_custom_object(self, group, version, namespace, plural):
+        assert (group, version, plural) == ('metrics.k8s.io', 'v1beta1', 'pods')
+        cpu, memory = self.samples[min(self.calls, len(self.samples) - 1)]
+        self.calls += 1
+        return {'items': [{'metadata': {'name': 'web-abc-1', 'namespace': namespace},
+                           'containers': [{'name': 'app', 'usage': {'cpu': cpu, 'memory': memory}}]}]}
+
+
+class TestUsageSampling:
+
+    def test_pod_usage_is_canonical(self):
+        server = StubMetricsServer([('250000000n', '512Mi')])
+        assert pod_usage(server, 'ns') == {('web-abc-1', 'app'): (250, 512 * 2 ** 20)}
+
+    def test_sample_and_aggregate(self):
+        server = StubMetricsServer([(f'{cpu}m', '100Mi') for cpu in range(100, 1100, 100)])
+        ring = UsageRing(capacity=10, max_series=4)
+        for _ in range(10):
+            ring.add({('ns',) + key: value for key, value in pod_usage(server, 'ns').items()})
+        p50, p95, peak = ring.stats()[('ns', 'web-abc-1', 'app')]['cpu']
+        assert (p50, peak) == (550, 1000)
+        assert 900 < p95 < 1000
+
+    def test_ring_keeps_fixed_memory(self):
+        ring = UsageRing(capacity=3, max_series=1)
+        for value in range(10):
+            ring.add({'a': (value, value), 'b': (1, 1)})
+        assert ring.samples.shape == (1, 3, 2)
+        assert ring.stats()['a']['cpu'][2] == 9
+        assert ring.dropped == {'b'}
+
+    def test_long_window_is_bucketed(self):
+        # 24h at 15s would be 5761 columns per series
+        ring = UsageRing.for_window(24 * 3600, 15, max_series=4096)
+        assert ring.capacity == 720 and ring.bucket == 9
+        assert ring.samples.shape == (64, 720, 2)
+        for value in range(18):
+            ring.add({'a': (value, 2 * value)})
+        p50, _, peak = ring.stats()['a']['cpu']
+        # Two buckets with means 4 and 13, the peak is the largest sample
+        assert (p50, peak) == (8.5, 17)
+
+    def test_rows_grow_with_observed_series(self):
+        ring = UsageRing(capacity=2, max_series=100)
+        ring.add({key: (1, 1) for key in range(70)})
+        assert ring.samples.shape == (100, 2, 2)
+        assert ring.stats()[69]['memory'][2] == 1
+
+    def test_sample_usage_window(self):
+        server = StubMetricsServer([('100m', '1Mi')])
+        ring = sample_usage(['ns'], duration=0.05, interval=0.02, api=server)
+        assert ring.count == server.calls >= 2
+
+
+class TestUtilization:
+
+    def test_columns_against_requests_and_limits(self):
+        stats = {('ns', 'web-abc-1', 'app'): {'cpu': (200.0, 400.0, 500.0), 'memory': (np.nan, np.nan, np.nan)},
+                 ('ns', 'web-abc-2', 'app'): {'cpu': (300.0, 350.0, 900.0), 'memory': (np.nan, np.nan, np.nan)}}
+        usage = workload_usage(stats, {'ns': {'web-abc-1': 'web', 'web-abc-2': 'web'}})
+        resources = {'ns': {'deployments': [{'Name': 'web', 'Container Name': 'app',
+                                             'CPU Requests': '500m', 'CPU Limits': '1',
+                                             'Memory Requests': '1Gi', 'Memory Limits': 'Not specified'}]}}
+        columns = Utilization(usage, resources).columns('ns', 'web', 'app')
+        assert columns['CPU p95 (m)'] == 400.0 and columns['CPU max (m)'] == 900.0
+        assert columns['CPU p95 / Request %'] == 80.0
+        assert columns['CPU p95 / Limit %'] == 40.0
+        assert columns['Memory p95 / Limit %'] == ''